@@ -0,0 +1,16 @@
+"""
+Command line entry point: runs Amalthea's batch operations without the UI.
+
+Usage: python amalthea.py --help
+"""
+import os
+import sys
+import runpy
+
+# Add the project root to the Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+# Run the command line module
+if __name__ == "__main__":
+    runpy.run_module("src.cli", run_name="__main__")
@@ -0,0 +1,5 @@
+"""
+Amalthea benchmark suite
+
+Run from the project root: python -m benchmarks.run --help
+"""
@@ -0,0 +1,62 @@
+"""
+Compare two benchmark result files.
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+import json
+
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold=0.10):
+    """
+    Compare the median times of the benchmarks two runs have in common.
+
+    Args:
+        baseline (dict): Results of the earlier run
+        current (dict): Results of the later run
+        threshold (float): Relative change reported as a regression or improvement
+
+    Returns:
+        tuple: (report lines, number of regressions)
+    """
+    lines = [f"{'benchmark':20s} {'baseline ms':>12s} {'current ms':>12s} {'change':>8s}"]
+    regressions = 0
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None or not before["median"]:
+            lines.append(f"{name:20s} {'-':>12s} {result['median'] * 1000:12.1f} {'new':>8s}")
+            continue
+        change = result["median"] / before["median"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  slower"
+            regressions += 1
+        elif change < -threshold:
+            flag = "  faster"
+        lines.append(f"{name:20s} {before['median'] * 1000:12.1f} {result['median'] * 1000:12.1f} "
+                     f"{change * 100:+7.1f}%{flag}")
+    if baseline.get("workspace", {}).get("params") != current.get("workspace", {}).get("params"):
+        lines.append("Warning: the runs used different workspaces, the numbers aren't comparable.")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two Amalthea benchmark runs.")
+    parser.add_argument("baseline", help="Results of the earlier run")
+    parser.add_argument("current", help="Results of the later run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change to flag (default 0.10)")
+    args = parser.parse_args(argv)
+    baseline, current = load(args.baseline), load(args.current)
+    print(f"{baseline.get('commit')} -> {current.get('commit')}")
+    lines, regressions = compare(baseline, current, args.threshold)
+    print("\n".join(lines))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
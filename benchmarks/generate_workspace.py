@@ -0,0 +1,163 @@
+"""
+Generate synthetic Amalthea workspaces for benchmarking.
+
+Images are encoded once per (format, size) template and then written with a
+small unique block (a PNG text chunk, a JPEG comment, or trailing bytes), so
+every file has distinct content without encoding a million images. The
+generator is seeded, so the same arguments always produce the same
+workspace.
+
+    python -m benchmarks.generate_workspace /tmp/bench-ws --images 10000
+"""
+import argparse
+import io
+import json
+import os
+import random
+import struct
+import zlib
+
+from PIL import Image
+
+# (format, extension, weight)
+FORMATS = [("PNG", ".png", 6), ("JPEG", ".jpg", 3), ("GIF", ".gif", 0.5), ("BMP", ".bmp", 0.5)]
+# ((width, height), weight): mostly thumbnails and generator-sized images, some large ones
+SIZES = [((64, 64), 3), ((512, 512), 4), ((832, 1216), 2), ((2048, 1536), 1)]
+
+WORDS = ("cat dog tree castle river mountain portrait landscape night sunset city forest girl boy "
+         "red blue green smile hat sword armor flower sky cloud snow beach ocean street car").split()
+
+# Written into the workspace folder, so an existing workspace can be reused
+PARAMS_NAME = "bench-workspace.json"
+
+
+def _png_chunk(chunk_type, data):
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def _template(pil_format, size, rng):
+    """Encode a noisy image of one format and size."""
+    width, height = size
+    # Low-resolution noise scaled up: compresses like a real picture, not like a flat color
+    noise = Image.frombytes("RGB", (max(1, width // 16), max(1, height // 16)),
+                            bytes(rng.getrandbits(8) for _ in range(3 * max(1, width // 16) * max(1, height // 16))))
+    image = noise.resize(size, Image.BILINEAR)
+    if pil_format == "GIF":
+        image = image.convert("P")
+    out = io.BytesIO()
+    if pil_format == "JPEG":
+        image.save(out, pil_format, quality=90)
+    else:
+        image.save(out, pil_format)
+    return out.getvalue()
+
+
+def _prompt(rng):
+    tags = rng.sample(WORDS, rng.randint(4, 12))
+    return (", ".join(tags) + "\nNegative prompt: blurry, lowres\n"
+            f"Steps: {rng.randint(20, 40)}, Sampler: Euler a, CFG scale: 7, Seed: {rng.getrandbits(32)}")
+
+
+def _unique(data, pil_format, number, prompt):
+    """Give a template a unique block (and optionally a prompt) without re-encoding it."""
+    if pil_format == "PNG":
+        # Text chunks go right after the IHDR chunk (8 byte signature + 25 byte IHDR)
+        chunks = _png_chunk(b"tEXt", b"amalthea-bench\0" + str(number).encode())
+        if prompt is not None:
+            chunks += _png_chunk(b"tEXt", b"parameters\0" + prompt.encode("latin-1", "replace"))
+        return data[:33] + chunks + data[33:]
+    if pil_format == "JPEG":
+        comment = f"amalthea-bench {number}".encode()
+        return data[:2] + b"\xff\xfe" + struct.pack(">H", len(comment) + 2) + comment + data[2:]
+    # GIF and BMP readers ignore bytes after the image data
+    return data + f"amalthea-bench {number}".encode()
+
+
+def _weighted(rng, choices):
+    return rng.choices([choice for choice, _ in choices], weights=[weight for _, weight in choices])[0]
+
+
+def generate_workspace(dest, count, seed=0, sidecar_ratio=0.5, prompt_ratio=0.5, formats=None, sizes=None):
+    """
+    Write a synthetic workspace.
+
+    Args:
+        dest (str): Folder to write the images (and .txt sidecars) to
+        count (int): Number of images
+        seed (int): Random seed; the same seed gives the same workspace
+        sidecar_ratio (float): Share of images that get a .txt tag file
+        prompt_ratio (float): Share of PNG images that get a "parameters" text chunk
+        formats (list): (PIL format, extension, weight) tuples, defaults to FORMATS
+        sizes (list): ((width, height), weight) tuples, defaults to SIZES
+
+    Returns:
+        dict: The parameters and the number of files of each kind written
+    """
+    rng = random.Random(seed)
+    formats = formats or FORMATS
+    sizes = sizes or SIZES
+    os.makedirs(dest, exist_ok=True)
+
+    templates = {}
+    stats = {"images": 0, "bytes": 0, "sidecars": 0, "prompts": 0, "formats": {}}
+    for number in range(count):
+        pil_format, ext = _weighted(rng, [((f, e), w) for f, e, w in formats])
+        size = _weighted(rng, sizes)
+        if (pil_format, size) not in templates:
+            templates[(pil_format, size)] = _template(pil_format, size, random.Random(f"{seed}-{pil_format}-{size}"))
+
+        prompt = _prompt(rng) if pil_format == "PNG" and rng.random() < prompt_ratio else None
+        data = _unique(templates[(pil_format, size)], pil_format, number, prompt)
+        name = f"img_{number:07d}"
+        with open(os.path.join(dest, name + ext), 'wb') as f:
+            f.write(data)
+
+        stats["images"] += 1
+        stats["bytes"] += len(data)
+        stats["prompts"] += prompt is not None
+        stats["formats"][ext] = stats["formats"].get(ext, 0) + 1
+        if rng.random() < sidecar_ratio:
+            with open(os.path.join(dest, name + ".txt"), 'w', encoding='utf-8') as f:
+                f.write(", ".join(rng.sample(WORDS, rng.randint(1, 8))))
+            stats["sidecars"] += 1
+
+    params = {"count": count, "seed": seed, "sidecar_ratio": sidecar_ratio, "prompt_ratio": prompt_ratio}
+    with open(os.path.join(dest, PARAMS_NAME), 'w', encoding='utf-8') as f:
+        json.dump({"params": params, "stats": stats}, f, indent=1)
+    return {"params": params, "stats": stats}
+
+
+def ensure_workspace(dest, count, seed=0, sidecar_ratio=0.5, prompt_ratio=0.5):
+    """
+    Reuse the workspace in dest if it was generated with the same parameters, else generate it.
+
+    Returns:
+        dict: The parameters and statistics of the workspace
+    """
+    params = {"count": count, "seed": seed, "sidecar_ratio": sidecar_ratio, "prompt_ratio": prompt_ratio}
+    try:
+        with open(os.path.join(dest, PARAMS_NAME), 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+        if existing["params"] == params:
+            return existing
+    except (OSError, ValueError, KeyError):
+        pass
+    if os.path.isdir(dest) and os.listdir(dest):
+        raise ValueError(f"{dest} is not empty and wasn't generated with these parameters")
+    return generate_workspace(dest, count, seed, sidecar_ratio, prompt_ratio)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic Amalthea workspace.")
+    parser.add_argument("dest", help="Folder to create")
+    parser.add_argument("--images", type=int, default=1000, help="Number of images")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sidecars", type=float, default=0.5, help="Share of images with a .txt tag file")
+    parser.add_argument("--prompts", type=float, default=0.5, help="Share of PNGs with a parameters chunk")
+    args = parser.parse_args(argv)
+    result = generate_workspace(args.dest, args.images, args.seed, args.sidecars, args.prompts)
+    print(json.dumps(result["stats"], indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""
+Benchmarks of Amalthea's hot paths on a synthetic workspace.
+
+Every benchmark runs on a fresh hard-linked copy of a generated workspace
+(tag writes replace files instead of changing them in place, so the
+generated workspace is never modified) and is repeated a few times. The
+results are written as JSON together with the commit and machine they were
+measured on; compare two runs with benchmarks.compare.
+
+    python -m benchmarks.run --images 10000 --repeat 3
+    python -m benchmarks.run --only load_images_cold,tags_load
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.generate_workspace import ensure_workspace, PARAMS_NAME
+from src.image_loader import ImageLoader, VALID_EXTENSIONS
+from src.preview import load_preview
+from src.tag_manager import TagManager, SidecarBackend, join_tags
+from src.tag_index import TagIndex
+from src.bulk_tagger import BulkTagJob, add_tag
+from src.tag_edit import TagEditJob, build_tag_edit
+from src.importer import ImportJob, ContentHashCache
+from src.folder_export import FolderExportJob
+from src.shard_export import ShardExportJob
+from src.training_export import TrainingExportJob
+from src.workspace import open_tag_manager
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (function, slow); see benchmark()
+BENCHMARKS = {}
+
+
+def benchmark(name, slow=False):
+    """
+    Register a benchmark.
+
+    The function is called with a Context and returns (seconds, items,
+    extra): the measured time, the number of items processed in it and a
+    dict of additional numbers. Setup that shouldn't count is done before
+    starting the clock.
+
+    Args:
+        name (str): Name used in the results and with --only
+        slow (bool): Only run with --slow or when selected with --only
+    """
+    def register(function):
+        BENCHMARKS[name] = (function, slow)
+        return function
+    return register
+
+
+class Context:
+    """The generated workspace and scratch space shared by the benchmarks."""
+
+    def __init__(self, source, work_dir, sample_size, workers):
+        self.source = source
+        self.work_dir = work_dir
+        self.sample_size = sample_size
+        self.workers = workers
+        self.images = ImageLoader(source).load_images()
+
+    def fresh_workspace(self, name):
+        """
+        Make a new copy of the generated workspace.
+
+        Returns:
+            str: The copy's image folder; its state folder starts empty
+        """
+        dest = os.path.join(self.work_dir, "runs", name, "images")
+        self.scratch(name)
+        os.makedirs(dest)
+        for entry in os.scandir(self.source):
+            if entry.is_file() and entry.name != PARAMS_NAME:
+                try:
+                    os.link(entry.path, os.path.join(dest, entry.name))
+                except OSError:
+                    shutil.copy2(entry.path, os.path.join(dest, entry.name))
+        return dest
+
+    def scratch(self, name):
+        """
+        Get an empty scratch folder.
+
+        Returns:
+            str: Full path of the (empty) folder
+        """
+        path = os.path.join(self.work_dir, "runs", name)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        return path
+
+    def sample(self, images):
+        """Evenly spaced images, at most sample_size of them."""
+        step = max(1, len(images) // self.sample_size)
+        return images[::step][:self.sample_size]
+
+
+def timed(function):
+    """Call function and return (seconds, its result)."""
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def workspace_images(folder):
+    """List a workspace copy (this also writes its folder manifest)."""
+    return ImageLoader(folder).load_images()
+
+
+@benchmark("load_images_cold")
+def bench_load_images_cold(ctx):
+    folder = ctx.fresh_workspace("load_images_cold")
+    seconds, images = timed(lambda: ImageLoader(folder).load_images())
+    return seconds, len(images), {}
+
+
+@benchmark("load_images_warm")
+def bench_load_images_warm(ctx):
+    folder = ctx.fresh_workspace("load_images_warm")
+    ImageLoader(folder).load_images()
+    # A folder changed within the mtime safety window is always rescanned
+    time.sleep(2.1)
+    ImageLoader(folder).load_images()
+    seconds, images = timed(lambda: ImageLoader(folder).load_images())
+    return seconds, len(images), {}
+
+
+@benchmark("show_image_decode")
+def bench_show_image_decode(ctx):
+    # The decode, metadata read and resize show_image waits for on a cache miss
+    latencies = []
+    for image_path in ctx.sample(ctx.images):
+        seconds, _ = timed(lambda: load_preview(image_path))
+        latencies.append(seconds * 1000)
+    return sum(latencies) / 1000, len(latencies), {
+        "p50_ms": round(percentile(latencies, 0.5), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "max_ms": round(max(latencies), 3),
+    }
+
+
+@benchmark("tags_load")
+def bench_tags_load(ctx):
+    tag_manager = TagManager(SidecarBackend())
+    seconds, _ = timed(lambda: [tag_manager.load_tags(image_path) for image_path in ctx.images])
+    return seconds, len(ctx.images), {}
+
+
+TAG_QUERIES = ["cat AND dog", "cat OR dog OR tree", "NOT cat", "(cat OR dog) AND NOT (tree OR sky)"]
+
+
+@benchmark("tag_query")
+def bench_tag_query(ctx):
+    tag_index = TagIndex(TagManager(SidecarBackend()))
+    build_seconds, _ = timed(lambda: tag_index.build(ctx.images))
+    # First run builds the bitsets of the tags, the second one reuses them
+    cold, _ = timed(lambda: [tag_index.query_count(query) for query in TAG_QUERIES])
+    warm, _ = timed(lambda: [tag_index.query_count(query) for query in TAG_QUERIES])
+    seconds, matches = timed(lambda: [tag_index.query(query, ctx.images) for query in TAG_QUERIES])
+    return seconds, len(ctx.images) * len(TAG_QUERIES), {
+        "build_s": round(build_seconds, 4),
+        "cold_ms": round(cold * 1000, 3),
+        "warm_ms": round(warm * 1000, 3),
+        "matches": sum(len(found) for found in matches),
+    }
+
+
+def _save_all(folder, backend):
+    images = workspace_images(folder)
+    tag_manager = open_tag_manager(folder, backend)
+
+    def run():
+        for number, image_path in enumerate(images):
+            tag_manager.save_tags(image_path, f"benchmark, tag_{number % 97}")
+        # Closing writes whatever the backend still buffers
+        tag_manager.close()
+    seconds, _ = timed(run)
+    return seconds, len(images), {}
+
+
+@benchmark("tags_save_sidecar")
+def bench_tags_save_sidecar(ctx):
+    return _save_all(ctx.fresh_workspace("tags_save_sidecar"), "sidecar")
+
+
+@benchmark("tags_save_sqlite")
+def bench_tags_save_sqlite(ctx):
+    return _save_all(ctx.fresh_workspace("tags_save_sqlite"), "sqlite")
+
+
+@benchmark("apply_auto_tag")
+def bench_apply_auto_tag(ctx):
+    # Same setup as MainWindow.apply_auto_tag: the index picks the images
+    folder = ctx.fresh_workspace("apply_auto_tag")
+    images = workspace_images(folder)
+    tag_manager = open_tag_manager(folder, "sidecar")
+    tag_index = TagIndex(tag_manager)
+    tag_index.build(images)
+    job = BulkTagJob(tag_index.images_without("benchmark", images), add_tag("benchmark"), tag_manager.backend)
+
+    def run():
+        job.run()
+        tag_manager.close()
+    seconds, _ = timed(run)
+    return seconds, job.total, {"changed": job.changed, "errors": len(job.errors)}
+
+
+@benchmark("tag_rename")
+def bench_tag_rename(ctx):
+    # Same setup as MainWindow.edit_tags: the index picks the affected images
+    folder = ctx.fresh_workspace("tag_rename")
+    images = workspace_images(folder)
+    tag_manager = open_tag_manager(folder, "sidecar")
+    tag_index = TagIndex(tag_manager)
+    tag_index.build(images)
+    with_tag = tag_index.images_with_any(["cat"])
+    job = TagEditJob([image_path for image_path in images if image_path in with_tag],
+                     build_tag_edit("rename", ["cat"], ["kitten"]), tag_manager.backend,
+                     read_tags=lambda image_path: join_tags(tag_index.get_tags(image_path)))
+
+    def run():
+        job.run()
+        tag_manager.close()
+    seconds, _ = timed(run)
+    return seconds, job.total, {"changed": job.changed, "errors": len(job.errors)}
+
+
+@benchmark("tag_folder")
+def bench_tag_folder(ctx):
+    folder = ctx.fresh_workspace("tag_folder")
+    images = workspace_images(folder)
+    job = BulkTagJob(images, add_tag("benchmark"), SidecarBackend())
+    seconds, _ = timed(job.run)
+    return seconds, job.total, {"changed": job.changed, "errors": len(job.errors)}
+
+
+@benchmark("add_folder")
+def bench_add_folder(ctx):
+    dest = os.path.join(ctx.scratch("add_folder"), "images")
+    os.makedirs(dest)
+    hash_cache = ContentHashCache(os.path.join(ctx.scratch("add_folder_state"), "hashes.json"))
+    job = ImportJob(ctx.source, dest, VALID_EXTENSIONS, hash_cache, max_workers=ctx.workers or 4)
+    seconds, _ = timed(job.run)
+    return seconds, len(job.imported), {"tag_files": job.imported_tags, "errors": len(job.errors)}
+
+
+def _export_setup(ctx, name):
+    folder = ctx.fresh_workspace(name)
+    images = workspace_images(folder)
+    tag_index = TagIndex(TagManager(SidecarBackend()))
+    tag_index.build(images)
+    dest = os.path.join(ctx.scratch(name + "_out"), "dataset")
+    return folder, images, dest, lambda image_path: join_tags(tag_index.get_tags(image_path))
+
+
+@benchmark("export_folder")
+def bench_export_folder(ctx):
+    folder, images, dest, read_tags = _export_setup(ctx, "export_folder")
+    job = FolderExportJob(images, folder, dest, read_tags, max_workers=ctx.workers or 4)
+    seconds, _ = timed(job.run)
+    # Exporting again only checks the manifest
+    again = FolderExportJob(images, folder, dest, read_tags, max_workers=ctx.workers or 4)
+    incremental, _ = timed(again.run)
+    return seconds, job.total, {"incremental_seconds": round(incremental, 4), "errors": len(job.errors)}
+
+
+@benchmark("export_shards")
+def bench_export_shards(ctx):
+    _, images, dest, read_tags = _export_setup(ctx, "export_shards")
+    job = ShardExportJob(images, dest, read_tags, max_workers=ctx.workers or 4)
+    seconds, _ = timed(job.run)
+    return seconds, job.total, {"shards": len(job.shards), "errors": len(job.errors)}
+
+
+@benchmark("export_training", slow=True)
+def bench_export_training(ctx):
+    _, images, dest, read_tags = _export_setup(ctx, "export_training")
+    job = TrainingExportJob(images, dest, read_tags, resolution=512, max_workers=ctx.workers)
+    seconds, _ = timed(job.run)
+    return seconds, job.total, {"buckets": len(job.buckets), "errors": len(job.errors)}
+
+
+def git_commit():
+    """Get the current commit (with a "+dirty" suffix for uncommitted changes), or None."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("+dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(ctx, names, repeat):
+    """
+    Run benchmarks and summarize their timings.
+
+    Returns:
+        dict: Benchmark name -> result summary
+    """
+    results = {}
+    for name in names:
+        function, _ = BENCHMARKS[name]
+        runs = []
+        for _ in range(repeat):
+            # The jobs print progress and errors of their own
+            with contextlib.redirect_stdout(io.StringIO()):
+                runs.append(function(ctx))
+        seconds = [run[0] for run in runs]
+        median = statistics.median(seconds)
+        items = runs[0][1]
+        results[name] = {
+            "seconds": [round(value, 4) for value in seconds],
+            "median": round(median, 4),
+            "min": round(min(seconds), 4),
+            "items": items,
+            "items_per_second": round(items / median, 1) if median > 0 else None,
+            "extra": runs[-1][2],
+        }
+        print(f"{name:20s} {median * 1000:10.1f} ms  {results[name]['items_per_second'] or 0:12.1f} items/s")
+        sys.stdout.flush()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Amalthea on a synthetic workspace.")
+    parser.add_argument("--images", type=int, default=1000, help="Number of images in the workspace")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sidecars", type=float, default=0.5, help="Share of images with a .txt tag file")
+    parser.add_argument("--prompts", type=float, default=0.5, help="Share of PNGs with a parameters chunk")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of every benchmark")
+    parser.add_argument("--sample", type=int, default=200, help="Images decoded by show_image_decode")
+    parser.add_argument("--workers", type=int, default=None, help="Worker threads/processes of the jobs")
+    parser.add_argument("--only", help="Comma separated benchmarks to run")
+    parser.add_argument("--slow", action="store_true", help="Also run the slow benchmarks")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "amalthea-bench"),
+                        help="Where workspaces are generated (reused across runs)")
+    parser.add_argument("--output", help="JSON results file (default: benchmarks/results/<time>-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    if args.only:
+        names = [name.strip() for name in args.only.split(",") if name.strip()]
+        unknown = [name for name in names if name not in BENCHMARKS]
+        if unknown:
+            parser.error(f"unknown benchmarks: {', '.join(unknown)} (available: {', '.join(BENCHMARKS)})")
+    else:
+        names = [name for name, (_, slow) in BENCHMARKS.items() if args.slow or not slow]
+
+    source = os.path.join(args.work_dir, f"workspace-{args.images}-{args.seed}-{args.sidecars}-{args.prompts}")
+    print(f"Preparing a workspace of {args.images} images in {source}...")
+    seconds, workspace = timed(lambda: ensure_workspace(source, args.images, args.seed,
+                                                        args.sidecars, args.prompts))
+    print(f"Workspace ready after {seconds:.1f}s")
+    ctx = Context(source, args.work_dir, args.sample, args.workers)
+
+    results = run_benchmarks(ctx, names, args.repeat)
+    shutil.rmtree(os.path.join(args.work_dir, "runs"), ignore_errors=True)
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "workspace": workspace,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        results_dir = os.path.join(PROJECT_ROOT, "benchmarks", "results")
+        os.makedirs(results_dir, exist_ok=True)
+        output = os.path.join(results_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{commit or 'unknown'}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
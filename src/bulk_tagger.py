@@ -0,0 +1,217 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.tag_manager import parse_tags, join_tags
+from src.instrumentation import traced
+
+
+def add_tag(tag):
+    """
+    Build a mutation that appends a tag to images that don't have it yet.
+
+    Args:
+        tag (str): The tag to add
+
+    Returns:
+        function: Mutation for BulkTagJob
+    """
+    def mutate(tags_list):
+        if tag in tags_list:
+            return None
+        return tags_list + [tag]
+    return mutate
+
+
+def substitute_tags(mapping):
+    """
+    Build a mutation that replaces tags with other tags, keeping the tag order.
+
+    Each replaced tag is swapped for its replacements where it stood; a
+    replacement the image already has is not added a second time.
+
+    Args:
+        mapping (dict): Tag to the list of tags that replace it (an empty
+            list removes the tag)
+
+    Returns:
+        function: Mutation for BulkTagJob or TagEditJob
+    """
+    def mutate(tags_list):
+        if not any(tag in mapping for tag in tags_list):
+            return None
+        # Tags the image keeps can't be added again as a replacement
+        seen = {tag for tag in tags_list if tag not in mapping}
+        new_list = []
+        for tag in tags_list:
+            for new_tag in mapping.get(tag, (tag,)):
+                if new_tag not in seen or new_tag == tag:
+                    seen.add(new_tag)
+                    new_list.append(new_tag)
+        return new_list if new_list != tags_list else None
+    return mutate
+
+
+def rename_tag(old_tag, new_tag):
+    """Build a mutation that renames a tag (merging it into new_tag if the image has both)."""
+    return substitute_tags({old_tag: [new_tag]})
+
+
+def merge_tags_into(tags, target):
+    """Build a mutation that replaces several synonymous tags with one target tag."""
+    return substitute_tags({tag: [target] for tag in tags if tag != target})
+
+
+def remove_tags(tags):
+    """Build a mutation that removes tags."""
+    return substitute_tags({tag: [] for tag in tags})
+
+
+def replace_tag(old_tag, new_tags):
+    """Build a mutation that replaces one tag with a list of tags."""
+    return substitute_tags({old_tag: list(new_tags)})
+
+
+class BulkTagJob:
+    """
+    Applies a tag mutation to many images on a thread pool.
+
+    Each image costs a read, a mutation and (if something changed) a write.
+    At most max_in_flight images are being processed at any time, so memory
+    stays bounded on huge folders. The job runs in the background; callers
+    poll done/total and finished (for example from Tk's after()) and can
+    cancel it at any time. Failures are collected per file instead of
+    stopping the job.
+
+    I/O goes straight to the storage backend rather than through TagManager,
+    whose wrappers hide read errors behind an empty tag string: a failed read
+    would look like an untagged image and its tags would be overwritten.
+    Callers may use a TagIndex to pick the images, but the tags that get
+    rewritten should be read from the backend: index contents can be older
+    than the tag files and would undo edits made outside Amalthea.
+    """
+
+    def __init__(self, image_paths, mutate, backend, read_tags=None, max_workers=8, max_in_flight=64):
+        """
+        Initialize the job.
+
+        Args:
+            image_paths (list): Full paths of the images to process
+            mutate (function): Called with the image's tag list, returns the new
+                tag list or None to leave the image unchanged
+            backend: Tag storage backend used to read and write the tags
+            read_tags (function): Optional replacement for backend.read that
+                returns the tag string stored for an image
+            max_workers (int): Number of worker threads
+            max_in_flight (int): Maximum number of images being processed at once
+        """
+        self.image_paths = image_paths
+        self.mutate = mutate
+        self.backend = backend
+        self.read_tags = read_tags if read_tags is not None else backend.read
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight
+
+        self.total = len(image_paths)
+        self.done = 0
+        self.unchanged = 0
+        # (image_path, new tags string) for every image that was rewritten
+        self.changes = []
+        # (image_path, error message) for every image that failed
+        self.errors = []
+        self.finished = False
+
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def changed(self):
+        return len(self.changes)
+
+    def start(self):
+        """Start processing in the background and return immediately."""
+        self._thread = threading.Thread(target=self._run, name="amalthea-bulk-tags", daemon=True)
+        self._thread.start()
+        return self
+
+    def run(self):
+        """Process every image and return when done (or cancelled)."""
+        self._run()
+        return self
+
+    def cancel(self):
+        """Stop after the images that are already in flight."""
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Wait for a job started with start() to finish."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.finished
+
+    @traced("bulk_tag.run")
+    def _run(self):
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers,
+                                    thread_name_prefix="amalthea-bulk-worker") as executor:
+                for image_path in self.image_paths:
+                    in_flight.acquire()
+                    if self._cancel.is_set():
+                        in_flight.release()
+                        break
+                    future = executor.submit(self._process, image_path)
+                    future.add_done_callback(lambda _: in_flight.release())
+        finally:
+            self.finished = True
+
+    @traced("bulk_tag.image")
+    def _process(self, image_path):
+        """Worker: read, mutate and write the tags of one image."""
+        if self._cancel.is_set():
+            return
+        try:
+            tags_list = parse_tags(self.read_tags(image_path))
+            new_list = self.mutate(tags_list)
+            if new_list is None:
+                with self._lock:
+                    self.unchanged += 1
+            else:
+                new_tags = join_tags(new_list)
+                self.backend.write(image_path, new_tags)
+                with self._lock:
+                    self.changes.append((image_path, new_tags))
+        except Exception as e:
+            with self._lock:
+                self.errors.append((image_path, str(e)))
+        finally:
+            with self._lock:
+                self.done += 1
+
+    def summary(self, max_errors=10):
+        """
+        Build a human readable summary of the job.
+
+        Args:
+            max_errors (int): Maximum number of individual errors to list
+
+        Returns:
+            str: Summary text
+        """
+        lines = [f"Processed {self.done} of {self.total} images: "
+                 f"{self.changed} updated, {self.unchanged} unchanged, {len(self.errors)} failed."]
+        if self.cancelled:
+            lines.append("The operation was cancelled.")
+        if self.errors:
+            lines.append("")
+            lines.append("Errors:")
+            for image_path, message in self.errors[:max_errors]:
+                lines.append(f"{os.path.basename(image_path)}: {message}")
+            if len(self.errors) > max_errors:
+                lines.append(f"... and {len(self.errors) - max_errors} more")
+        return "\n".join(lines)
@@ -0,0 +1,361 @@
+"""
+Amalthea - Image Tagging Software
+Headless command line interface for batch jobs
+
+Runs the same background jobs as the application window, without Tk, so
+large datasets can be processed on servers and in scripts:
+
+    python -m src.cli --images /data/images stats
+    python -m src.cli --images /data/images export /data/out --format shards
+"""
+import argparse
+import os
+import sys
+import time
+
+from src.image_loader import ImageLoader, VALID_EXTENSIONS
+from src.tag_manager import SidecarBackend, parse_tags, join_tags
+from src.tag_index import TagIndex
+from src.bulk_tagger import BulkTagJob, add_tag
+from src.importer import ImportJob, ContentHashCache
+from src.shard_export import ShardExportJob
+from src.folder_export import FolderExportJob
+from src.training_export import TrainingExportJob
+from src.prompt_tags import PromptTagJob, MERGE_RULES
+from src.tag_edit import TagEditJob, TAG_EDITS, build_tag_edit
+from src.image_metadata import MetadataCache
+from src.search_index import SearchIndex
+from src.workspace import get_state_dir, open_tag_manager
+from src.instrumentation import tracer
+
+
+class Workspace:
+    """The images, tags and caches of one image folder, opened without any UI."""
+
+    def __init__(self, image_folder=None, recursive=False, backend=None):
+        """
+        Open a workspace.
+
+        Args:
+            image_folder (str): Image folder, defaults to the project's images folder
+            recursive (bool): Also load images from sub-folders
+            backend (str): Tag backend ("sidecar" or "sqlite"), see open_tag_manager()
+        """
+        self.image_loader = ImageLoader(image_folder)
+        self.image_folder = self.image_loader.image_folder
+        self.state_dir = get_state_dir(self.image_folder)
+        self.tag_manager = open_tag_manager(self.image_folder, backend)
+        self.tag_index = TagIndex(self.tag_manager)
+        self.recursive = recursive
+        self._images = None
+
+    @property
+    def images(self):
+        """Ordered list of the workspace image paths (loaded on first use)."""
+        if self._images is None:
+            if self.recursive:
+                self._images = list(self.image_loader.iter_images())
+            else:
+                self._images = self.image_loader.load_images()
+            self.tag_index.build(self._images)
+        return self._images
+
+    def read_tags(self, image_path):
+        """Get the tag string of an image from the tag index."""
+        return join_tags(self.tag_index.get_tags(image_path))
+
+    def close(self):
+        """Write pending tags and release the tag storage."""
+        self.tag_manager.close()
+
+
+def run_job(job, description, out=None, interval=0.2):
+    """
+    Run a background job to completion, streaming its progress.
+
+    On a terminal the progress line is updated in place; otherwise (for
+    example in a log file) a line is printed at most every few seconds.
+    Ctrl+C cancels the job and waits for it to stop.
+
+    Args:
+        job: Any job with start(), cancel(), wait(), done, total and finished
+        description (str): Short description shown with the progress
+        out (file): Where progress is written, defaults to stdout
+        interval (float): Seconds between progress checks
+
+    Returns:
+        job: The finished job
+    """
+    out = out if out is not None else sys.stdout
+    interactive = out.isatty()
+    log_interval = 5.0
+    started = time.monotonic()
+    last_line = 0.0
+
+    job.start()
+    try:
+        while not job.finished:
+            time.sleep(interval)
+            now = time.monotonic()
+            if interactive:
+                out.write(f"\r{description}... {job.done} of {job.total} images")
+                out.flush()
+            elif now - last_line >= log_interval:
+                out.write(f"{description}... {job.done} of {job.total} images\n")
+                out.flush()
+                last_line = now
+    except KeyboardInterrupt:
+        out.write("\nCancelling...\n")
+        job.cancel()
+        job.wait()
+
+    elapsed = time.monotonic() - started
+    if interactive:
+        out.write("\r")
+    out.write(f"{description}: {job.done} of {job.total} images in {elapsed:.1f}s\n")
+    out.flush()
+    return job
+
+
+def finish(job, out=None):
+    """Print a job's summary and turn it into an exit code."""
+    out = out if out is not None else sys.stdout
+    out.write(job.summary() + "\n")
+    return 1 if job.errors or job.cancelled else 0
+
+
+def cmd_import(workspace, args):
+    """Copy the images (and tag files) of a folder into the workspace."""
+    if not os.path.isdir(args.source):
+        print(f"Not a folder: {args.source}")
+        return 2
+    hash_cache = ContentHashCache(os.path.join(workspace.state_dir, "hashes.json"))
+    job = ImportJob(args.source, workspace.image_folder, VALID_EXTENSIONS, hash_cache,
+                    link=args.link, max_workers=args.workers or 4)
+    folder_mtime = workspace.image_loader.folder_mtime()
+    run_job(job, "Importing")
+    if job.imported:
+        workspace.image_loader.update_manifest(added=job.imported, folder_mtime_ns=folder_mtime)
+    return finish(job)
+
+
+def cmd_auto_tag(workspace, args):
+    """Add a tag to every workspace image that doesn't have it."""
+    images = workspace.images
+    job = BulkTagJob(workspace.tag_index.images_without(args.tag, images), add_tag(args.tag),
+                     workspace.tag_manager.backend, max_workers=args.workers or 8)
+    run_job(job, f"Applying '{args.tag}'")
+    return finish(job)
+
+
+def cmd_tag_folder(workspace, args):
+    """Add a tag to the images of an external folder, without importing them."""
+    try:
+        image_paths = sorted(entry.path for entry in os.scandir(args.folder)
+                             if entry.is_file() and os.path.splitext(entry.name)[1].lower() in VALID_EXTENSIONS)
+    except OSError as e:
+        print(f"Error reading {args.folder}: {str(e)}")
+        return 2
+    # External folders always use .txt tag files, whatever the workspace backend
+    job = BulkTagJob(image_paths, add_tag(args.tag), SidecarBackend(), max_workers=args.workers or 8)
+    run_job(job, f"Tagging folder with '{args.tag}'")
+    return finish(job)
+
+
+def cmd_prompts(workspace, args):
+    """Turn the prompts embedded in the workspace images into tags."""
+    job = PromptTagJob(workspace.images, workspace.tag_manager.backend, read_tags=workspace.read_tags,
+                       merge_rule=args.merge, ignore=parse_tags(args.ignore), max_workers=args.workers)
+    run_job(job, "Reading prompts")
+    return finish(job)
+
+
+def cmd_edit_tags(workspace, args):
+    """Rename, merge, remove or replace tags in every workspace image that has them."""
+    tags = parse_tags(args.tags)
+    try:
+        mutate = build_tag_edit(args.operation, tags, parse_tags(args.to))
+    except ValueError as e:
+        print(str(e))
+        return 2
+    images = workspace.images
+    # Only the images that have one of the tags are read and rewritten
+    with_tags = workspace.tag_index.images_with_any(tags)
+    affected = [image_path for image_path in images if image_path in with_tags]
+    job = TagEditJob(affected, mutate, workspace.tag_manager.backend, read_tags=workspace.read_tags,
+                     max_workers=args.workers or 4, dry_run=args.dry_run)
+    run_job(job, "Editing tags")
+    sys.stdout.write(job.summary(max_changes=args.show) + "\n")
+    return 1 if job.errors or job.cancelled else 0
+
+
+def cmd_export(workspace, args):
+    """Export the workspace as a folder, archive shards or a training set."""
+    images = workspace.images
+    if not images:
+        print("No images to export.")
+        return 2
+    if args.format == "training":
+        job = TrainingExportJob(images, args.dest, workspace.read_tags, resolution=args.resolution,
+                                image_format=args.image_format, quality=args.quality,
+                                max_workers=args.workers)
+    elif args.format in ("tar", "zip"):
+        job = ShardExportJob(images, args.dest, workspace.read_tags, archive_format=args.format,
+                             shard_bytes=args.shard_size * 1024 * 1024, max_workers=args.workers or 4)
+    else:
+        job = FolderExportJob(images, workspace.image_folder, args.dest, workspace.read_tags,
+                              max_workers=args.workers or 4, mirror=args.mirror)
+    run_job(job, "Exporting")
+    return finish(job)
+
+
+def cmd_stats(workspace, args):
+    """Print image and tag counts of the workspace."""
+    images = workspace.images
+    counts = workspace.tag_index.tag_counts()
+    if args.tag:
+        # Tags used together with one tag instead of the whole workspace
+        print(f"Images with '{args.tag}': {counts.get(args.tag, 0)} of {len(images)}")
+        for tag, count in workspace.tag_index.co_occurrence(args.tag, args.top):
+            print(f"{count:8d}  {tag}")
+        return 0
+    tagged = sum(1 for image_path in images if workspace.tag_index.get_tags(image_path))
+    print(f"Workspace: {workspace.image_folder}")
+    print(f"Images: {len(images)} ({tagged} tagged, {len(images) - tagged} untagged)")
+    print(f"Distinct tags: {len(counts)}")
+    if counts and args.top > 0:
+        print("")
+        print(f"Top {min(args.top, len(counts))} tags:")
+        for tag, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:args.top]:
+            print(f"{count:8d}  {tag}")
+    return 0
+
+
+def cmd_search(workspace, args):
+    """Print the workspace images whose embedded metadata or tags match a query."""
+    images = workspace.images
+    metadata_cache = MetadataCache(workspace.state_dir)
+    search_index = SearchIndex(workspace.state_dir, metadata_cache, workspace.tag_index)
+    try:
+        metadata_cache.extract_all(images)
+        search_index.update(images)
+        matches = search_index.search(args.query, images)
+    finally:
+        search_index.close()
+        metadata_cache.close()
+    if matches is None:
+        print("Empty search query.")
+        return 2
+    found = [image_path for image_path in images if image_path in matches]
+    for image_path in found[:args.limit] if args.limit else found:
+        print(image_path)
+    sys.stderr.write(f"{len(found)} of {len(images)} images match '{args.query}'\n")
+    return 0 if found else 1
+
+
+def cmd_query(workspace, args):
+    """Print the workspace images that match a boolean tag query."""
+    images = workspace.images
+    try:
+        found = workspace.tag_index.query(args.expression, images)
+    except ValueError as e:
+        print(str(e))
+        return 2
+    if not args.count:
+        for image_path in found[:args.limit] if args.limit else found:
+            print(image_path)
+    else:
+        print(len(found))
+    sys.stderr.write(f"{len(found)} of {len(images)} images match '{args.expression}'\n")
+    return 0 if found else 1
+
+
+def build_parser():
+    """Build the argument parser with one subcommand per operation."""
+    parser = argparse.ArgumentParser(prog="amalthea", description="Amalthea batch operations without the UI.")
+    parser.add_argument("--images", help="Workspace image folder (default: the project's images folder)")
+    parser.add_argument("--recursive", action="store_true", help="Also load images from sub-folders")
+    parser.add_argument("--backend", choices=("sidecar", "sqlite"),
+                        help="Tag storage (default: AMALTHEA_TAG_BACKEND or sidecar)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker threads or processes")
+    parser.add_argument("--trace", metavar="FILE", help="Write a Chrome trace of the operation to FILE")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    command = commands.add_parser("import", help="Import images and tag files from a folder")
+    command.add_argument("source", help="Folder to import from")
+    command.add_argument("--link", action="store_true", help="Hard link instead of copying when possible")
+    command.set_defaults(run=cmd_import)
+
+    command = commands.add_parser("auto-tag", help="Add a tag to every workspace image")
+    command.add_argument("tag")
+    command.set_defaults(run=cmd_auto_tag)
+
+    command = commands.add_parser("tag-folder", help="Add a tag to the images of another folder")
+    command.add_argument("folder")
+    command.add_argument("tag")
+    command.set_defaults(run=cmd_tag_folder)
+
+    command = commands.add_parser("prompts", help="Turn embedded generation prompts into tags")
+    command.add_argument("--merge", choices=sorted(MERGE_RULES), default="append",
+                         help="How prompt tags combine with existing tags (default: append)")
+    command.add_argument("--ignore", default="", help="Comma separated tags to leave out")
+    command.set_defaults(run=cmd_prompts)
+
+    command = commands.add_parser("edit-tags", help="Rename, merge, remove or replace tags in every image")
+    command.add_argument("operation", choices=list(TAG_EDITS))
+    command.add_argument("tags", help="Comma separated tags to change")
+    command.add_argument("--to", default="", help="New tag (rename, merge) or comma separated tags (replace)")
+    command.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    command.add_argument("--show", type=int, default=20, help="Number of changed images to list")
+    command.set_defaults(run=cmd_edit_tags)
+
+    command = commands.add_parser("export", help="Export the workspace as a dataset")
+    command.add_argument("dest", help="Destination folder")
+    command.add_argument("--format", choices=("folder", "tar", "zip", "training"), default="folder")
+    command.add_argument("--mirror", action="store_true",
+                         help="Folder format: delete exported images that are no longer in the workspace")
+    command.add_argument("--shard-size", type=int, default=512, help="Target shard size in MB")
+    command.add_argument("--resolution", type=int, default=1024, help="Training bucket resolution")
+    command.add_argument("--image-format", choices=("jpeg", "webp"), default="jpeg",
+                         help="Training image format")
+    command.add_argument("--quality", type=int, default=90, help="Training image quality")
+    command.set_defaults(run=cmd_export)
+
+    command = commands.add_parser("stats", help="Show image and tag counts")
+    command.add_argument("--top", type=int, default=20, help="Number of most used tags to list")
+    command.add_argument("--tag", help="List the tags used most often together with this tag")
+    command.set_defaults(run=cmd_stats)
+
+    command = commands.add_parser("search", help="List the images matching a search query")
+    command.add_argument("query", help='Words to find; prefix a word with "-" to exclude it')
+    command.add_argument("--limit", type=int, default=0, help="Print at most this many paths")
+    command.set_defaults(run=cmd_search)
+
+    command = commands.add_parser("query", help="List the images matching a boolean tag query")
+    command.add_argument("expression", help='Tags combined with AND, OR, NOT and parentheses, '
+                                            'e.g. "cat AND NOT (dog OR sketch)"')
+    command.add_argument("--count", action="store_true", help="Only print the number of matches")
+    command.add_argument("--limit", type=int, default=0, help="Print at most this many paths")
+    command.set_defaults(run=cmd_query)
+    return parser
+
+
+def main(argv=None):
+    """Run one command line operation and return its exit code."""
+    args = build_parser().parse_args(argv)
+    if args.trace:
+        tracer.enable()
+    workspace = Workspace(args.images, recursive=args.recursive, backend=args.backend)
+    try:
+        with tracer.span(f"cli.{args.command}"):
+            return args.run(workspace, args)
+    finally:
+        workspace.close()
+        if args.trace:
+            count = tracer.export_chrome_trace(args.trace)
+            sys.stderr.write(f"Wrote {count} spans to {args.trace}\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
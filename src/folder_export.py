@@ -0,0 +1,309 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.importer import fast_copy, unique_name, stem_key
+from src.instrumentation import traced
+from src.workspace import workspace_generation
+
+# Bump when the manifest layout changes
+EXPORT_MANIFEST_VERSION = 1
+
+MANIFEST_NAME = ".amalthea-export.json"
+# Entries finished since the manifest was last written, one JSON line each
+MANIFEST_LOG_NAME = ".amalthea-export.log"
+
+
+def tags_hash(tags):
+    """Hash a tag string, so changed tags can be detected without reading the exported file."""
+    return hashlib.blake2b(tags.encode('utf-8'), digest_size=12).hexdigest()
+
+
+class FolderExportJob:
+    """
+    Exports the workspace into a folder of image and .txt files, incrementally.
+
+    A manifest in the destination records, for every exported image, the
+    name it was exported as, the size and mtime of the source, a hash of its
+    tags and the workspace generation it was exported from. A later export to
+    the same folder copies only images that are new or changed (overwriting
+    their earlier export) and rewrites only tag files whose tags changed.
+
+    Files of earlier batches are never overwritten or deleted: the usual
+    workflow is to export, clear the workspace and export the next batch into
+    the same folder. Clearing the workspace starts a new generation, so an
+    image of the next batch that has the same name as an exported one is a
+    different image and gets a name that isn't in the folder yet. With
+    mirror=True the folder instead follows the workspace: exported images
+    that left the workspace are deleted.
+
+    Every finished image is appended to a log next to the manifest. If an
+    export is interrupted the log is replayed on the next run, so the export
+    resumes where it stopped. Files are written under a temporary name and
+    renamed into place, so an interrupted export never leaves a partial file
+    under its final name.
+
+    Like BulkTagJob the job runs in the background; callers poll done/total
+    and finished and can cancel it at any time.
+    """
+
+    def __init__(self, image_paths, source_root, dest_dir, read_tags, max_workers=4, mirror=False):
+        """
+        Initialize the job.
+
+        Args:
+            image_paths (list): Full paths of the images to export
+            source_root (str): Workspace folder, manifest entries are relative to it
+            dest_dir (str): Folder to export to
+            read_tags (function): Returns the tag string of an image
+            max_workers (int): Number of worker threads
+            mirror (bool): Delete exported images that are no longer in the workspace
+        """
+        self.image_paths = list(image_paths)
+        self.source_root = source_root
+        self.dest_dir = dest_dir
+        self.read_tags = read_tags
+        self.max_workers = max_workers
+        self.mirror = mirror
+        self.generation = workspace_generation(source_root)
+
+        self.total = len(self.image_paths)
+        self.done = 0
+        self.copied = 0
+        self.tags_written = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.resumed = 0
+        # (image_path, error message) for every image that failed
+        self.errors = []
+        self.finished = False
+
+        self.manifest_path = os.path.join(dest_dir, MANIFEST_NAME)
+        self.log_path = os.path.join(dest_dir, MANIFEST_LOG_NAME)
+        # source path relative to source_root -> [dest name, size, mtime_ns, tags hash, generation]
+        self._entries = {}
+        self._log = None
+
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def start(self):
+        """Start exporting in the background and return immediately."""
+        self._thread = threading.Thread(target=self._run, name="amalthea-export", daemon=True)
+        self._thread.start()
+        return self
+
+    def run(self):
+        """Export every image and return when done (or cancelled)."""
+        self._run()
+        return self
+
+    def cancel(self):
+        """Stop after the images that are being exported; the next export resumes."""
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Wait for a job started with start() to finish."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.finished
+
+    def _load_manifest(self):
+        """Load the manifest and replay the log of an interrupted export."""
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                if manifest.get("version") == EXPORT_MANIFEST_VERSION:
+                    self._entries = manifest["files"]
+            except Exception as e:
+                print(f"Error reading export manifest, exporting everything: {str(e)}")
+
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'r', encoding='utf-8') as log:
+                for line in log:
+                    try:
+                        key, entry = json.loads(line)
+                    except ValueError:
+                        # The last line of an interrupted export can be incomplete
+                        break
+                    if entry is None:
+                        self._entries.pop(key, None)
+                    else:
+                        self._entries[key] = entry
+                    self.resumed += 1
+
+    def _record(self, key, entry):
+        """Remember a finished image in the log (entry None for a removed one)."""
+        with self._lock:
+            if entry is None:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = entry
+            self._log.write(json.dumps([key, entry]) + "\n")
+            self._log.flush()
+
+    def _save_manifest(self):
+        """Write the manifest and drop the log it now contains."""
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": EXPORT_MANIFEST_VERSION, "files": self._entries}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.manifest_path)
+        self._log.close()
+        self._log = None
+        os.remove(self.log_path)
+
+    @traced("folder_export.run")
+    def _run(self):
+        try:
+            os.makedirs(self.dest_dir, exist_ok=True)
+            self._load_manifest()
+            self._log = open(self.log_path, 'a', encoding='utf-8')
+
+            keys = [os.path.relpath(image_path, self.source_root) for image_path in self.image_paths]
+            current = set(keys)
+
+            if self.mirror:
+                # Images that left the workspace since the last export
+                for key in [key for key in self._entries if key not in current]:
+                    if self._cancel.is_set():
+                        break
+                    self._remove(key)
+
+            # Every name in the folder stays taken, whether the manifest knows it or not
+            taken = {stem_key(entry[0]) for entry in self._entries.values()}
+            taken.update(stem_key(name) for name in os.listdir(self.dest_dir)
+                         if name not in (MANIFEST_NAME, MANIFEST_LOG_NAME))
+            work = []
+            for key, image_path in zip(keys, self.image_paths):
+                entry = self._entries.get(key)
+                if entry is not None and not self.mirror and not self._same_image(entry, image_path):
+                    # An image of an earlier batch had the same name; keep its files
+                    entry = None
+                if entry is None:
+                    dest_name = unique_name(os.path.basename(image_path), taken)
+                    taken.add(stem_key(dest_name))
+                else:
+                    dest_name = entry[0]
+                work.append((key, image_path, dest_name, entry))
+
+            with ThreadPoolExecutor(max_workers=self.max_workers,
+                                    thread_name_prefix="amalthea-export-worker") as executor:
+                for _ in executor.map(self._export, work):
+                    if self._cancel.is_set():
+                        break
+
+            if not self._cancel.is_set() and not self.errors:
+                self._save_manifest()
+        except Exception as e:
+            self.errors.append((self.dest_dir, str(e)))
+        finally:
+            if self._log is not None:
+                self._log.close()
+            self.finished = True
+
+    def _same_image(self, entry, image_path):
+        """Check whether a manifest entry was exported from this image (possibly since changed)."""
+        if len(entry) > 4:
+            return entry[4] == self.generation
+        # Entries of older exports don't know their generation, only reuse them for the same file
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return False
+        return entry[1] == stat.st_size and entry[2] == stat.st_mtime_ns
+
+    def _remove(self, key):
+        """Delete the exported files of an image that is no longer in the workspace."""
+        dest_name = self._entries[key][0]
+        try:
+            for name in (dest_name, os.path.splitext(dest_name)[0] + ".txt"):
+                path = os.path.join(self.dest_dir, name)
+                if os.path.exists(path):
+                    os.remove(path)
+            self._record(key, None)
+            self.removed += 1
+        except Exception as e:
+            self.errors.append((dest_name, str(e)))
+
+    @traced("folder_export.image")
+    def _export(self, item):
+        """Worker: bring the exported image and tag file of one image up to date."""
+        key, image_path, dest_name, entry = item
+        if self._cancel.is_set():
+            return
+        try:
+            stat = os.stat(image_path)
+            tags = self.read_tags(image_path)
+            tag_digest = tags_hash(tags)
+            dest_path = os.path.join(self.dest_dir, dest_name)
+
+            image_current = (entry is not None and entry[1] == stat.st_size and entry[2] == stat.st_mtime_ns
+                             and os.path.exists(dest_path))
+            tags_current = image_current and entry[3] == tag_digest
+
+            if image_current and tags_current:
+                with self._lock:
+                    self.unchanged += 1
+                return
+
+            if not image_current:
+                temp_path = os.path.join(self.dest_dir, f".{dest_name}.exporting")
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                fast_copy(image_path, temp_path)
+                os.replace(temp_path, dest_path)
+
+            tag_path = os.path.splitext(dest_path)[0] + ".txt"
+            if tags:
+                temp_path = tag_path + ".tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(tags)
+                os.replace(temp_path, tag_path)
+            elif os.path.exists(tag_path):
+                os.remove(tag_path)
+
+            self._record(key, [dest_name, stat.st_size, stat.st_mtime_ns, tag_digest, self.generation])
+            with self._lock:
+                self.copied += not image_current
+                self.tags_written += bool(tags)
+        except Exception as e:
+            with self._lock:
+                self.errors.append((image_path, str(e)))
+        finally:
+            with self._lock:
+                self.done += 1
+
+    def summary(self, max_errors=10):
+        """
+        Build a human readable summary of the job.
+
+        Args:
+            max_errors (int): Maximum number of individual errors to list
+
+        Returns:
+            str: Summary text
+        """
+        lines = [f"Exported {self.total} images: {self.copied} copied, {self.unchanged} unchanged, "
+                 f"{self.tags_written} tag files written, {self.removed} removed, {len(self.errors)} failed."]
+        if self.resumed:
+            lines.append(f"Resumed an interrupted export ({self.resumed} images were already done).")
+        if self.cancelled:
+            lines.append("The export was cancelled; exporting again resumes it.")
+        if self.errors:
+            lines.append("")
+            lines.append("Errors:")
+            for image_path, message in self.errors[:max_errors]:
+                lines.append(f"{os.path.basename(image_path)}: {message}")
+            if len(self.errors) > max_errors:
+                lines.append(f"... and {len(self.errors) - max_errors} more")
+        return "\n".join(lines)
@@ -0,0 +1,228 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# inotify event flags (see inotify(7))
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_ONLYDIR = 0x01000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class FolderWatcher:
+    """
+    Watches a folder for files that are added, removed or rewritten by other
+    programs.
+
+    On Linux inotify is used; elsewhere (or if inotify isn't available) the
+    folder is polled, comparing the size and mtime of every file with the
+    previous scan so files rewritten in place are reported too. Events are coalesced: a burst of changes is reported once the
+    folder has been quiet for the debounce time, and every reported name is
+    checked against the file system so files that were created and deleted
+    within the burst aren't reported at all.
+
+    Changes are collected on a background thread; call get_changes() from
+    the UI thread (for example with Tk's after()) to pick them up.
+    """
+
+    def __init__(self, folder, extensions, debounce=0.3, poll_interval=1.0):
+        """
+        Initialize the watcher.
+
+        Args:
+            folder (str): The folder to watch
+            extensions (tuple): Lower-case file extensions to report
+            debounce (float): Seconds without events before a burst is reported
+            poll_interval (float): Seconds between scans when polling
+        """
+        self.folder = folder
+        self.extensions = extensions
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.mode = None
+
+        self._known = set()
+        self._dirty = set()
+        self._rescan_needed = False
+        self._last_event = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _wanted(self, name):
+        return os.path.splitext(name)[1].lower() in self.extensions
+
+    def _list_folder(self):
+        """Get the names of the wanted files currently in the folder."""
+        with os.scandir(self.folder) as scan:
+            return {entry.name for entry in scan if self._wanted(entry.name) and entry.is_file()}
+
+    def _stat_folder(self):
+        """Get the (size, mtime) of the wanted files currently in the folder, by name."""
+        files = {}
+        with os.scandir(self.folder) as scan:
+            for entry in scan:
+                if not self._wanted(entry.name):
+                    continue
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+                except OSError:
+                    # Removed while scanning
+                    continue
+        return files
+
+    def start(self):
+        """Take a snapshot of the folder and start watching it."""
+        inotify_fd = _open_inotify(self.folder)
+        if inotify_fd is not None:
+            self.mode = "inotify"
+            self._known = self._list_folder()
+            target, args = self._inotify_loop, (inotify_fd,)
+        else:
+            self.mode = "polling"
+            files = self._stat_folder()
+            self._known = set(files)
+            target, args = self._poll_loop, (files,)
+
+        self._thread = threading.Thread(target=target, args=args, name="amalthea-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop watching."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _mark(self, names=None):
+        """Record changed names (or that a full rescan is needed)."""
+        with self._lock:
+            if names is None:
+                self._rescan_needed = True
+            else:
+                self._dirty.update(names)
+            self._last_event = time.monotonic()
+
+    def _inotify_loop(self, fd):
+        """Background thread: read inotify events."""
+        try:
+            while not self._stop.is_set():
+                readable, _, _ = select.select([fd], [], [], 0.5)
+                if not readable:
+                    continue
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+
+                names = []
+                offset = 0
+                while offset + EVENT_HEADER.size <= len(data):
+                    _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                    offset += EVENT_HEADER.size
+                    name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                    offset += length
+
+                    if mask & (IN_Q_OVERFLOW | IN_DELETE_SELF | IN_MOVE_SELF):
+                        # Events were lost (or the folder itself went away)
+                        self._mark()
+                    elif name and self._wanted(name):
+                        names.append(name)
+                if names:
+                    self._mark(names)
+        finally:
+            os.close(fd)
+
+    def _poll_loop(self, last_files):
+        """Background thread: scan the folder and mark the files that changed."""
+        while not self._stop.wait(self.poll_interval):
+            try:
+                files = self._stat_folder()
+            except OSError:
+                continue
+            changed = [name for name in files.keys() | last_files.keys()
+                       if files.get(name) != last_files.get(name)]
+            if changed:
+                self._mark(changed)
+            last_files = files
+
+    def get_changes(self):
+        """
+        Get the coalesced changes since the last call.
+
+        Returns:
+            tuple: (added, removed, modified) sets of full paths, or None if
+                there are no changes or the current burst hasn't settled yet
+        """
+        with self._lock:
+            if not self._dirty and not self._rescan_needed:
+                return None
+            if time.monotonic() - self._last_event < self.debounce:
+                return None
+            dirty, self._dirty = self._dirty, set()
+            rescan, self._rescan_needed = self._rescan_needed, False
+
+        added, removed, modified = set(), set(), set()
+        if rescan:
+            try:
+                current = self._list_folder()
+            except OSError:
+                current = set()
+            added = current - self._known
+            removed = self._known - current
+            self._known = current
+        else:
+            for name in dirty:
+                exists = os.path.isfile(os.path.join(self.folder, name))
+                if exists and name not in self._known:
+                    added.add(name)
+                    self._known.add(name)
+                elif not exists and name in self._known:
+                    removed.add(name)
+                    self._known.discard(name)
+                elif exists:
+                    modified.add(name)
+
+        if not (added or removed or modified):
+            return None
+
+        def full_paths(names):
+            return {os.path.join(self.folder, name) for name in names}
+
+        return full_paths(added), full_paths(removed), full_paths(modified)
+
+
+def _open_inotify(folder):
+    """Set up an inotify watch on a folder, or return None if that isn't possible."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(folder), WATCH_MASK) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except Exception as e:
+        print(f"inotify unavailable, polling instead: {str(e)}")
+        return None
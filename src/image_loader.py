@@ -1,6 +1,22 @@
+import bisect
+import heapq
+import json
 import os
+import time
+from array import array
 from glob import glob
 
+from src.workspace import get_state_dir
+
+# Image file extensions shown in the workspace
+VALID_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+
+# Bump when the manifest layout changes
+MANIFEST_VERSION = 1
+
+# Folder changes closer than this to a scan may not have changed its mtime yet
+MTIME_SAFETY_NS = 2 * 1000 * 1000 * 1000
+
 class ImageLoader:
     def __init__(self, image_folder=None):
         # Default to 'images' folder in project root if no folder is specified
@@ -17,9 +33,12 @@ class ImageLoader:
         """
         Load all image files from the specified folder.
         Returns a list of full paths to the image files.
+        
+        The folder listing is kept in a manifest in the workspace state folder.
+        When the folder hasn't changed since the last scan the manifest is used
+        as is; otherwise the folder is listed once with os.scandir and only the
+        added and removed files are merged into the sorted manifest.
         """
-        # Define valid image extensions directly
-        valid_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
         images = []
         
         # Ensure the image directory exists
@@ -31,20 +50,17 @@ class ImageLoader:
                 print(f"Error creating image directory: {e}")
                 return images
         
-        # Get all files in the directory
         try:
-            all_files = os.listdir(self.image_folder)
+            manifest = self._load_manifest()
+            folder_mtime = os.stat(self.image_folder).st_mtime_ns
             
-            # Filter for image files based on extension
-            for filename in all_files:
-                ext = os.path.splitext(filename)[1].lower()
-                if ext in valid_extensions:
-                    full_path = os.path.join(self.image_folder, filename)
-                    if os.path.isfile(full_path):  # Double check it's a file
-                        images.append(full_path)
+            # Directory mtimes change whenever entries are added, removed or renamed.
+            # Scans that happened within the timestamp granularity can't be trusted.
+            if (manifest is None or manifest["folder_mtime_ns"] != folder_mtime
+                    or manifest["scanned_at_ns"] - folder_mtime < MTIME_SAFETY_NS):
+                manifest = self._rescan(manifest, folder_mtime)
             
-            # Sort images alphabetically for consistent navigation
-            images.sort()
+            images = [os.path.join(self.image_folder, entry[0]) for entry in manifest["entries"]]
             
             print(f"Found {len(images)} images in {self.image_folder}")
             
@@ -52,6 +68,219 @@ class ImageLoader:
             print(f"Error loading images: {e}")
         
         return images
+    
+    def iter_images(self, recursive=True):
+        """
+        Lazily walk the image folder, yielding full paths of image files.
+        
+        Folders are listed one at a time with os.scandir, so the first images
+        are available long before a big tree has been fully enumerated. Entries
+        are visited in the same order a full sort of all paths would give.
+        
+        Args:
+            recursive (bool): Also walk sub-folders
+            
+        Yields:
+            str: Full path of each image file
+        """
+        yield from self._walk(self.image_folder, recursive)
+        
+    def _walk(self, folder, recursive):
+        """Yield the image files of one folder, descending into sub-folders in order."""
+        try:
+            with os.scandir(folder) as scan:
+                entries = list(scan)
+        except Exception as e:
+            print(f"Error reading {folder}: {e}")
+            return
+            
+        # A folder sorts like its name followed by a separator
+        children = []
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if recursive and not entry.name.startswith('.'):
+                        children.append((entry.name + os.sep, entry.path, True))
+                elif os.path.splitext(entry.name)[1].lower() in VALID_EXTENSIONS:
+                    children.append((entry.name, entry.path, False))
+            except OSError:
+                continue
+        children.sort()
+        
+        for _, path, is_dir in children:
+            if is_dir:
+                yield from self._walk(path, recursive)
+            else:
+                yield path
+                    
+    def iter_pages(self, page_size=1000, recursive=True):
+        """
+        Walk the image folder lazily, yielding the image paths in pages.
+        
+        Args:
+            page_size (int): Number of paths per page
+            recursive (bool): Also walk sub-folders
+            
+        Yields:
+            CompactPathList: The next page of image paths
+        """
+        page = CompactPathList()
+        for path in self.iter_images(recursive):
+            page.append(path)
+            if len(page) >= page_size:
+                yield page
+                page = CompactPathList()
+        if len(page):
+            yield page
+    
+    def clear_images(self):
+        """
+        Delete every image of the workspace and its tag file.
+        
+        Everything directly in the image folder is deleted except .gitkeep;
+        in sub-folders (skipping hidden ones, like the scan does) the image
+        files and their .txt tag files are deleted.
+        
+        Returns:
+            int: Number of files deleted
+        """
+        deleted = 0
+        for entry in os.scandir(self.image_folder):
+            if entry.is_file() and entry.name != '.gitkeep':
+                os.remove(entry.path)
+                deleted += 1
+                
+        # The files directly in the folder are gone, so only sub-folders are left
+        for image_path in list(self.iter_images(recursive=True)):
+            for path in (image_path, os.path.splitext(image_path)[0] + ".txt"):
+                if os.path.isfile(path):
+                    os.remove(path)
+                    deleted += 1
+        return deleted
+    
+    def folder_mtime(self):
+        """Get the modification time of the image folder in nanoseconds, or None."""
+        try:
+            return os.stat(self.image_folder).st_mtime_ns
+        except OSError:
+            return None
+    
+    def update_manifest(self, added=(), removed=(), modified=(), folder_mtime_ns=None):
+        """
+        Record known additions, removals and changes in the saved folder manifest.
+        
+        The manifest only takes the folder's new mtime if the caller knows every
+        change since it was current: folder_mtime_ns must be the folder's mtime
+        from before the changes and match the manifest. Otherwise the manifest
+        keeps its old folder mtime, so the next load rescans the folder and
+        finds files other programs added meanwhile.
+        
+        Args:
+            added (list): Full paths of image files added to (or overwritten in) the folder
+            removed (list): Full paths of image files removed from the folder
+            modified (list): Full paths of image files that were rewritten
+            folder_mtime_ns (int): mtime of the folder before these changes, see folder_mtime()
+        """
+        if not added and not removed and not modified:
+            return
+        try:
+            manifest = self._load_manifest()
+            if manifest is None:
+                return
+                
+            removed_names = {os.path.basename(path) for path in removed}
+            if removed_names:
+                manifest["entries"] = [entry for entry in manifest["entries"]
+                                       if entry[0] not in removed_names]
+                
+            known = {entry[0]: entry for entry in manifest["entries"]}
+            for path in modified:
+                entry = known.get(os.path.basename(path))
+                if entry is not None:
+                    stat = os.stat(path)
+                    entry[1:] = [stat.st_size, stat.st_mtime_ns]
+            for path in added:
+                name = os.path.basename(path)
+                stat = os.stat(path)
+                if name in known:
+                    # An existing file was overwritten
+                    known[name][1:] = [stat.st_size, stat.st_mtime_ns]
+                else:
+                    entry = [name, stat.st_size, stat.st_mtime_ns]
+                    bisect.insort(manifest["entries"], entry)
+                    known[name] = entry
+                    
+            if folder_mtime_ns is not None and folder_mtime_ns == manifest["folder_mtime_ns"]:
+                manifest["folder_mtime_ns"] = os.stat(self.image_folder).st_mtime_ns
+                manifest["scanned_at_ns"] = time.time_ns()
+            self._save_manifest(manifest)
+        except Exception as e:
+            print(f"Error updating image manifest: {e}")
+    
+    @property
+    def manifest_path(self):
+        return os.path.join(get_state_dir(self.image_folder), "manifest.json")
+    
+    def _load_manifest(self):
+        """Load the saved folder manifest, or None if there is no usable one."""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get("version") != MANIFEST_VERSION:
+                return None
+            return manifest
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Ignoring image manifest: {e}")
+            return None
+    
+    def _rescan(self, manifest, folder_mtime):
+        """
+        List the image folder and merge the differences into the manifest.
+        
+        Only files that weren't in the manifest are stat'ed (files rewritten in
+        place are recorded through update_manifest(modified=...)), and the
+        sorted entry list is updated in place instead of being sorted again.
+        """
+        scanned_at = time.time_ns()
+        entries = manifest["entries"] if manifest is not None else []
+        known = {entry[0]: entry for entry in entries}
+        
+        current = {}
+        with os.scandir(self.image_folder) as scan:
+            for entry in scan:
+                if os.path.splitext(entry.name)[1].lower() in VALID_EXTENSIONS and entry.is_file():
+                    current[entry.name] = entry
+        
+        removed = known.keys() - current.keys()
+        added = current.keys() - known.keys()
+        
+        if removed:
+            entries = [entry for entry in entries if entry[0] not in removed]
+        for name in sorted(added):
+            stat = current[name].stat()
+            bisect.insort(entries, [name, stat.st_size, stat.st_mtime_ns])
+        
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "folder_mtime_ns": folder_mtime,
+            "scanned_at_ns": scanned_at,
+            "entries": entries,
+        }
+        
+        self._save_manifest(manifest)
+        return manifest
+    
+    def _save_manifest(self, manifest):
+        """Atomically write the folder manifest."""
+        try:
+            temp_path = self.manifest_path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as manifest_file:
+                json.dump(manifest, manifest_file, separators=(',', ':'))
+            os.replace(temp_path, self.manifest_path)
+        except Exception as e:
+            print(f"Error saving image manifest: {e}")
         
     def _is_image_file(self, filepath):
         """Check if the file is actually an image file based on extension."""
@@ -89,4 +318,371 @@ class ImageLoader:
             return images[prev_index]
         except ValueError:
             # If current image is not in the list, return the last image
-            return images[-1] if images else None
\ No newline at end of file
+            return images[-1] if images else None
+
+
+class CompactPathList:
+    """
+    Memory-efficient list of image paths.
+    
+    Every path is stored as a folder id plus its file name, with each folder
+    path kept only once, so a tree with millions of images in a few thousand
+    folders costs little more than the file names themselves. Indexing and
+    iteration hand out ordinary full path strings. When the paths are kept
+    sorted, find() locates one with a binary search.
+    """
+    
+    def __init__(self, paths=()):
+        self._folders = []
+        self._folder_ids = {}
+        self._ids = array('I')
+        self._names = []
+        self.extend(paths)
+        
+    def __len__(self):
+        return len(self._names)
+        
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._path(i) for i in range(*index.indices(len(self._names)))]
+        if index < 0:
+            index += len(self._names)
+        if not 0 <= index < len(self._names):
+            raise IndexError("path index out of range")
+        return self._path(index)
+        
+    def __iter__(self):
+        folders = self._folders
+        for folder_id, name in zip(self._ids, self._names):
+            yield os.path.join(folders[folder_id], name)
+            
+    def __contains__(self, image_path):
+        return self.find(image_path) is not None
+        
+    def _path(self, index):
+        return os.path.join(self._folders[self._ids[index]], self._names[index])
+        
+    def _split(self, image_path):
+        """Split a path into its interned folder id and file name."""
+        folder, name = os.path.split(image_path)
+        folder_id = self._folder_ids.get(folder)
+        if folder_id is None:
+            folder_id = self._folder_ids[folder] = len(self._folders)
+            self._folders.append(folder)
+        return folder_id, name
+        
+    def append(self, image_path):
+        folder_id, name = self._split(image_path)
+        self._ids.append(folder_id)
+        self._names.append(name)
+        
+    def extend(self, image_paths):
+        for image_path in image_paths:
+            self.append(image_path)
+            
+    def insert(self, index, image_path):
+        folder_id, name = self._split(image_path)
+        self._ids.insert(index, folder_id)
+        self._names.insert(index, name)
+        
+    def __delitem__(self, index):
+        del self._ids[index]
+        del self._names[index]
+        
+    def copy(self):
+        """Get an independent copy that shares the folder table's strings."""
+        other = CompactPathList()
+        other._folders = list(self._folders)
+        other._folder_ids = dict(self._folder_ids)
+        other._ids = array('I', self._ids)
+        other._names = list(self._names)
+        return other
+        
+    def find(self, image_path):
+        """
+        Binary search for a path (the list must be sorted).
+        
+        Returns:
+            int: The path's position, or None if it isn't in the list
+        """
+        if not isinstance(image_path, str):
+            return None
+        position = bisect.bisect_left(self, image_path)
+        if position < len(self._names) and self._path(position) == image_path:
+            return position
+        return None
+
+
+class ImageNavigator:
+    """
+    Ordered collection of workspace images with a current position.
+    
+    The images are kept sorted, so locating one is a binary search and
+    next/prev/jump only move an index: navigation cost barely depends on the
+    workspace size. Inserts and removals update the sorted list in place
+    (a handful of paths, like a folder watcher event, costs a binary search
+    and a move of the list's tail; a streaming scan page is appended) and
+    keep the current image selected (or, if it was removed, the image that
+    took its place).
+    
+    The lists handed out by images and all_images change with the
+    collection, so background workers should be given a snapshot().
+    
+    A filter (for example search results) narrows navigation to some of the
+    images; all_images still holds the whole workspace and keeps receiving
+    inserts and removals.
+    """
+    
+    def __init__(self, images=None):
+        self._all = _copy_paths(images) if images is not None else []
+        self._images = self._all
+        self._filter = None
+        self.index = 0
+        
+    def __len__(self):
+        return len(self._images)
+        
+    def __contains__(self, image_path):
+        return self.position(image_path) is not None
+        
+    def __getitem__(self, index):
+        return self._images[index]
+        
+    @property
+    def images(self):
+        """The ordered list of image paths that can be navigated (don't modify it)."""
+        return self._images
+        
+    @property
+    def all_images(self):
+        """Every image in the workspace, ignoring the filter (don't modify it)."""
+        return self._all
+        
+    @property
+    def filtered(self):
+        """True while a filter hides some of the images."""
+        return self._filter is not None
+        
+    @property
+    def current(self):
+        """Path of the current image, or None if there are no images."""
+        return self._images[self.index] if self._images else None
+        
+    def snapshot(self):
+        """Get a copy of all_images that later changes to the collection don't affect."""
+        return _copy_paths(self._all)
+        
+    def position(self, image_path):
+        """
+        Get the position of an image.
+        
+        Returns:
+            int: The image's position, or None if it isn't in the collection
+        """
+        return _find(self._images, image_path)
+        
+    def _position_by_name(self, name):
+        """Get the position of the first image with a file name."""
+        for position, path in enumerate(self._images):
+            if os.path.basename(path) == name:
+                return position
+        return None
+        
+    def set_images(self, images, keep_current=True):
+        """
+        Replace the whole collection.
+        
+        Args:
+            images (list): Sorted list (or CompactPathList) of image paths
+            keep_current (bool): Stay on the current image if it is still there
+        """
+        current = self.current
+        self._all = _copy_paths(images)
+        self._images = self._filtered(self._all)
+        self._reselect(current if keep_current else None, 0)
+        
+    def set_filter(self, image_paths):
+        """
+        Only navigate through some of the images.
+        
+        Args:
+            image_paths (iterable): The images to show, or None to show all of them
+        """
+        current = self.current
+        self._filter = set(image_paths) if image_paths is not None else None
+        self._images = self._filtered(self._all)
+        self._reselect(current, 0)
+        
+    def _filtered(self, images):
+        """Apply the filter to a full image list."""
+        if self._filter is None:
+            return images
+        return _copy_paths(images, (path for path in images if path in self._filter))
+        
+    def _known(self, image_paths):
+        """Get the given paths that are in the workspace (filtered or not)."""
+        return {path for path in image_paths if _find(self._all, path) is not None}
+        
+    def _reselect(self, previous_path, fallback_index):
+        """Point the index at previous_path, or at fallback_index if it's gone."""
+        position = self.position(previous_path) if previous_path is not None else None
+        if position is not None:
+            self.index = position
+        elif self._images:
+            self.index = min(max(fallback_index, 0), len(self._images) - 1)
+        else:
+            self.index = 0
+            
+    def next(self):
+        """Move to the next image (wrapping around) and return its path."""
+        if self._images:
+            self.index = (self.index + 1) % len(self._images)
+        return self.current
+        
+    def prev(self):
+        """Move to the previous image (wrapping around) and return its path."""
+        if self._images:
+            self.index = (self.index - 1) % len(self._images)
+        return self.current
+        
+    def jump(self, index):
+        """
+        Move to the image at a position.
+        
+        Returns:
+            bool: True if the position exists, False otherwise
+        """
+        if not 0 <= index < len(self._images):
+            return False
+        self.index = index
+        return True
+        
+    def jump_to(self, image_path_or_name):
+        """
+        Move to an image given its full path or its file name.
+        
+        Returns:
+            bool: True if the image was found, False otherwise
+        """
+        position = self.position(image_path_or_name)
+        if position is None:
+            position = self._position_by_name(image_path_or_name)
+        if position is None:
+            return False
+        self.index = position
+        return True
+        
+    def insert(self, image_paths):
+        """
+        Add images, keeping the collection sorted and the current image selected.
+        
+        Args:
+            image_paths (list): Full paths of the images to add
+            
+        Returns:
+            list: The paths that were actually added (not already present)
+        """
+        image_paths = set(image_paths)
+        added = sorted(image_paths - self._known(image_paths))
+        if not added:
+            return added
+            
+        current = self.current
+        self._all = _insert_sorted(self._all, added)
+        if self._filter is None:
+            self._images = self._all
+        else:
+            self._images = _insert_sorted(self._images, [path for path in added if path in self._filter])
+        self._reselect(current, self.index)
+        return added
+        
+    def remove(self, image_paths):
+        """
+        Remove images, keeping the current image (or its successor) selected.
+        
+        Args:
+            image_paths (list): Full paths of the images to remove
+            
+        Returns:
+            list: The paths that were actually removed
+        """
+        removed = self._known(set(image_paths))
+        if not removed:
+            return []
+            
+        current = self.current
+        # Shown images before the current one shift it back
+        positions = [self.position(path) for path in removed]
+        shift = sum(1 for position in positions if position is not None and position < self.index)
+        
+        self._all = _remove_sorted(self._all, removed)
+        if self._filter is None:
+            self._images = self._all
+        else:
+            self._filter -= removed
+            self._images = _remove_sorted(self._images, removed)
+        self._reselect(current, self.index - shift)
+        return list(removed)
+        
+    def extend(self, image_paths):
+        """
+        Append images that sort after every image already in the collection,
+        for example the next page of a streaming scan.
+        
+        Args:
+            image_paths (list): Sorted full paths of the images to append
+        """
+        if not len(image_paths):
+            return
+        if len(self._all) and image_paths[0] <= self._all[-1]:
+            # Something was inserted meanwhile (for example by the folder watcher)
+            self.insert(image_paths)
+            return
+        # Appending after the last image leaves every position as it was
+        self._all.extend(image_paths)
+        if self._filter is not None:
+            self._images.extend(path for path in image_paths if path in self._filter)
+
+
+def _find(images, image_path):
+    """
+    Binary search for a path in a sorted path list (or CompactPathList).
+    
+    Returns:
+        int: The path's position, or None if it isn't in the list
+    """
+    if not isinstance(image_path, str):
+        return None
+    if isinstance(images, CompactPathList):
+        return images.find(image_path)
+    position = bisect.bisect_left(images, image_path)
+    if position < len(images) and images[position] == image_path:
+        return position
+    return None
+
+
+def _insert_sorted(images, added):
+    """Insert sorted paths into a sorted path list, in place unless there are many of them."""
+    if len(added) < 16:
+        for path in added:
+            images.insert(bisect.bisect_left(images, path), path)
+        return images
+    return _copy_paths(images, heapq.merge(images, added))
+
+
+def _remove_sorted(images, removed):
+    """Remove paths from a sorted path list, in place unless there are many of them."""
+    if len(removed) < 16:
+        for path in removed:
+            position = _find(images, path)
+            if position is not None:
+                del images[position]
+        return images
+    return _copy_paths(images, (path for path in images if path not in removed))
+
+
+def _copy_paths(template, paths=None):
+    """Copy a path list (or build one from paths), keeping CompactPathList compact."""
+    if isinstance(template, CompactPathList):
+        return template.copy() if paths is None else CompactPathList(paths)
+    return list(template if paths is None else paths)
@@ -0,0 +1,342 @@
+import json
+import os
+import sqlite3
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from src.workspace import file_identity
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_TEXT_CHUNKS = (b"tEXt", b"zTXt", b"iTXt")
+
+# Largest text a compressed chunk may expand to (guards against zip bombs)
+MAX_TEXT_BYTES = 8 * 1024 * 1024
+
+# EXIF tags
+EXIF_IFD_POINTER = 0x8769
+EXIF_IMAGE_DESCRIPTION = 0x010E
+EXIF_USER_COMMENT = 0x9286
+
+
+def read_png_text(path):
+    """
+    Read the text chunks (tEXt, zTXt, iTXt) of a PNG file.
+
+    Only chunk headers are read while walking the file; every other chunk,
+    including the pixel data, is skipped with a seek.
+
+    Args:
+        path (str): Full path to the PNG file
+
+    Returns:
+        list: (keyword, text) pairs in file order, or None if it isn't a PNG
+    """
+    entries = []
+    with open(path, 'rb') as f:
+        if f.read(8) != PNG_SIGNATURE:
+            return None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            length, chunk_type = struct.unpack(">I4s", header)
+            if chunk_type == b"IEND":
+                break
+            if chunk_type in PNG_TEXT_CHUNKS:
+                entry = _parse_text_chunk(chunk_type, f.read(length))
+                if entry is not None:
+                    entries.append(entry)
+                f.seek(4, os.SEEK_CUR)  # CRC
+            else:
+                f.seek(length + 4, os.SEEK_CUR)
+    return entries
+
+
+def _parse_text_chunk(chunk_type, data):
+    """Decode one PNG text chunk into (keyword, text), or None if it is malformed."""
+    try:
+        keyword, _, rest = data.partition(b"\0")
+        keyword = keyword.decode('latin-1')
+        if chunk_type == b"tEXt":
+            return keyword, rest.decode('latin-1')
+        if chunk_type == b"zTXt":
+            # Compression method byte, then zlib data
+            return keyword, _inflate(rest[1:]).decode('latin-1')
+
+        # iTXt: compression flag, method, language tag, translated keyword, UTF-8 text
+        compressed = rest[0]
+        _, _, rest = rest[2:].partition(b"\0")
+        _, _, text = rest.partition(b"\0")
+        if compressed:
+            text = _inflate(text)
+        return keyword, text.decode('utf-8', 'replace')
+    except (IndexError, zlib.error):
+        return None
+
+
+def _inflate(data):
+    decompressor = zlib.decompressobj()
+    return decompressor.decompress(data, MAX_TEXT_BYTES)
+
+
+def read_jpeg_comments(path):
+    """
+    Read the EXIF ImageDescription and UserComment of a JPEG file.
+
+    Only the marker segments before the image data are read.
+
+    Args:
+        path (str): Full path to the JPEG file
+
+    Returns:
+        list: (name, text) pairs, or None if it isn't a JPEG
+    """
+    with open(path, 'rb') as f:
+        if f.read(2) != b"\xff\xd8":
+            return None
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return []
+            if marker[1] in (0xD9, 0xDA):
+                # End of image / start of scan: no EXIF before the pixels
+                return []
+            length_bytes = f.read(2)
+            if len(length_bytes) < 2:
+                return []
+            length = struct.unpack(">H", length_bytes)[0]
+            if marker[1] == 0xE1:
+                segment = f.read(length - 2)
+                if segment.startswith(b"Exif\0\0"):
+                    return _parse_exif(segment[6:])
+            else:
+                f.seek(length - 2, os.SEEK_CUR)
+
+
+def _parse_exif(tiff):
+    """Extract the comment fields from a TIFF-structured EXIF block."""
+    try:
+        endian = "<" if tiff[:2] == b"II" else ">"
+        entries = []
+
+        def read_ifd(offset):
+            count = struct.unpack_from(endian + "H", tiff, offset)[0]
+            tags = {}
+            for index in range(count):
+                tag, kind, number, value = struct.unpack_from(endian + "HHI4s", tiff, offset + 2 + index * 12)
+                tags[tag] = (kind, number, value)
+            return tags
+
+        def value_bytes(kind, number, value):
+            # ASCII (2) and UNDEFINED (7) are 1 byte per item; longer values live at an offset
+            if number <= 4:
+                return value[:number]
+            start = struct.unpack(endian + "I", value)[0]
+            return tiff[start:start + number]
+
+        ifd0 = read_ifd(struct.unpack_from(endian + "I", tiff, 4)[0])
+        if EXIF_IMAGE_DESCRIPTION in ifd0:
+            text = value_bytes(*ifd0[EXIF_IMAGE_DESCRIPTION]).rstrip(b"\0").decode('utf-8', 'replace')
+            if text.strip():
+                entries.append(("ImageDescription", text))
+
+        if EXIF_IFD_POINTER in ifd0:
+            exif_offset = struct.unpack(endian + "I", ifd0[EXIF_IFD_POINTER][2])[0]
+            exif_ifd = read_ifd(exif_offset)
+            if EXIF_USER_COMMENT in exif_ifd:
+                raw = value_bytes(*exif_ifd[EXIF_USER_COMMENT])
+                charset, data = raw[:8], raw[8:]
+                if charset.startswith(b"UNICODE"):
+                    text = data.decode("utf-16-le" if endian == "<" else "utf-16-be", 'replace')
+                else:
+                    text = data.decode('utf-8', 'replace')
+                text = text.rstrip("\0")
+                if text.strip():
+                    entries.append(("UserComment", text))
+        return entries
+    except (struct.error, IndexError):
+        return []
+
+
+def read_metadata(path):
+    """
+    Read the text metadata of an image without decoding it.
+
+    Returns:
+        tuple: (file kind, list of (name, text) pairs); kind is "png",
+            "jpeg" or None for other formats
+    """
+    entries = read_png_text(path)
+    if entries is not None:
+        return "png", entries
+    entries = read_jpeg_comments(path)
+    if entries is not None:
+        return "jpeg", entries
+    return None, []
+
+
+def format_metadata(kind, entries):
+    """
+    Build the text shown in the "PNG Metadata" box.
+
+    Args:
+        kind (str): File kind returned by read_metadata()
+        entries (list): (name, text) pairs
+
+    Returns:
+        str: Human readable metadata text
+    """
+    if not entries:
+        if kind == "png":
+            return "No PNG metadata found."
+        return "Not a PNG file or no metadata available."
+    return "".join(f"{name}: {text}\n" for name, text in entries)
+
+
+def metadata_text(image_path):
+    """
+    Read and format the metadata of an image in one go (uncached).
+
+    Returns:
+        str: Formatted metadata, or an error message
+    """
+    try:
+        return format_metadata(*read_metadata(image_path))
+    except Exception as e:
+        return f"Error reading image metadata: {str(e)}"
+
+
+class MetadataCache:
+    """
+    Cache of the text metadata of workspace images.
+
+    Entries are kept in a SQLite database in the workspace state folder and
+    remembered together with the file's size and mtime, so a file is read
+    again only after it changed. extract_all() fills the cache for a whole
+    workspace on a thread pool.
+    """
+
+    def __init__(self, state_dir):
+        """
+        Open (or create) the cache.
+
+        Args:
+            state_dir (str): Workspace state folder
+        """
+        self.db_path = os.path.join(state_dir, "metadata.db")
+        self._lock = threading.Lock()
+        self._closed = False
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                " path TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " kind TEXT,"
+                " entries TEXT NOT NULL)")
+
+    def _lookup(self, image_path, identity):
+        with self._lock:
+            if self._closed:
+                return None
+            row = self._conn.execute("SELECT size, mtime_ns, kind, entries FROM metadata WHERE path = ?",
+                                     (image_path,)).fetchone()
+        if row is not None and (row[0], row[1]) == identity:
+            return row[2], [tuple(entry) for entry in json.loads(row[3])]
+        return None
+
+    def _store_many(self, rows):
+        with self._lock:
+            if self._closed:
+                return
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO metadata (path, size, mtime_ns, kind, entries) VALUES (?, ?, ?, ?, ?)",
+                    rows)
+
+    @staticmethod
+    def _read(image_path, identity):
+        kind, entries = read_metadata(image_path)
+        return (image_path, identity[0], identity[1], kind, json.dumps(entries)), kind, entries
+
+    def get(self, image_path):
+        """
+        Get the metadata of an image, reading the file only if it isn't cached.
+
+        Returns:
+            tuple: (file kind, list of (name, text) pairs)
+        """
+        identity = file_identity(image_path)
+        if identity is None:
+            raise IOError(f"Cannot access {image_path}")
+        cached = self._lookup(image_path, identity)
+        if cached is not None:
+            return cached
+        row, kind, entries = self._read(image_path, identity)
+        self._store_many([row])
+        return kind, entries
+
+    def get_text(self, image_path):
+        """
+        Get the metadata text shown for an image.
+
+        Returns:
+            str: Formatted metadata (see format_metadata)
+        """
+        try:
+            return format_metadata(*self.get(image_path))
+        except Exception as e:
+            return f"Error reading image metadata: {str(e)}"
+
+    def extract_all(self, image_paths, max_workers=4, batch_size=500):
+        """
+        Fill the cache for many images at once.
+
+        Args:
+            image_paths (list): Full paths of the images
+            max_workers (int): Number of reader threads
+            batch_size (int): Number of rows written per transaction
+
+        Returns:
+            int: Number of images whose metadata had to be read
+        """
+        def work(image_path):
+            identity = file_identity(image_path)
+            if identity is None or self._lookup(image_path, identity) is not None:
+                return None
+            try:
+                return self._read(image_path, identity)[0]
+            except Exception as e:
+                print(f"Error reading metadata of {os.path.basename(image_path)}: {str(e)}")
+                return None
+
+        read = 0
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="amalthea-metadata") as executor:
+            for start in range(0, len(image_paths), batch_size):
+                if self._closed:
+                    break
+                rows = [row for row in executor.map(work, image_paths[start:start + batch_size])
+                        if row is not None]
+                if rows:
+                    self._store_many(rows)
+                    read += len(rows)
+        return read
+
+    def forget(self, image_paths):
+        """Remove images from the cache."""
+        with self._lock:
+            if self._closed:
+                return
+            with self._conn:
+                self._conn.executemany("DELETE FROM metadata WHERE path = ?", [(path,) for path in image_paths])
+
+    def close(self):
+        """Close the database; a running extract_all() stops after its current batch."""
+        with self._lock:
+            self._closed = True
+            self._conn.close()
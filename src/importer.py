@@ -0,0 +1,435 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.instrumentation import traced
+
+# Bytes read at a time while hashing
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# ioctl that clones a file's extents on copy-on-write file systems (Btrfs, XFS)
+FICLONE = 0x40049409
+
+
+def hash_file(path):
+    """
+    Hash the content of a file without reading it into memory at once.
+
+    Args:
+        path (str): Path of the file
+
+    Returns:
+        str: Hex digest of the content
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb') as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.hexdigest()
+
+
+def fast_copy(source_path, dest_path, link=False):
+    """
+    Copy a file using the cheapest method the platform and file systems allow.
+
+    In order: a hard link (only if link is True, as the copy then shares its
+    content with the source), a copy-on-write clone, os.copy_file_range, and
+    finally shutil.copyfile. The last three copy in the kernel without
+    passing the data through Python. Timestamps are copied like shutil.copy2.
+
+    Args:
+        source_path (str): File to copy
+        dest_path (str): Path of the new file (must not exist)
+        link (bool): Allow hard linking on the same file system
+
+    Returns:
+        str: The method that was used
+    """
+    if link:
+        try:
+            os.link(source_path, dest_path)
+            return "link"
+        except OSError:
+            pass
+
+    method = _copy_in_kernel(source_path, dest_path)
+    if method is None:
+        shutil.copyfile(source_path, dest_path)
+        method = "copy"
+    shutil.copystat(source_path, dest_path)
+    return method
+
+
+def _copy_in_kernel(source_path, dest_path):
+    """Clone or copy a file with Linux system calls, or return None if they aren't available."""
+    if not sys.platform.startswith('linux'):
+        return None
+
+    with open(source_path, 'rb') as source, open(dest_path, 'wb') as dest:
+        try:
+            import fcntl
+            fcntl.ioctl(dest.fileno(), FICLONE, source.fileno())
+            return "reflink"
+        except (ImportError, OSError):
+            pass
+
+        if not hasattr(os, 'copy_file_range'):
+            return None
+        try:
+            remaining = os.fstat(source.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(source.fileno(), dest.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+            return "copy_file_range"
+        except OSError:
+            # For example across file systems on older kernels; start over
+            dest.seek(0)
+            dest.truncate()
+            return None
+
+
+def unique_name(filename, taken):
+    """
+    Pick a file name whose stem isn't taken yet.
+
+    Tag files are named after the image stem, so "cat.png" and "cat.jpg"
+    would share "cat.txt"; colliding names get a numbered suffix instead
+    ("cat_1.png", "cat_2.png", ...).
+
+    Args:
+        filename (str): The wanted file name
+        taken (set): Normalized stems already in use (see stem_key)
+
+    Returns:
+        str: filename, or the first numbered variant that is free
+    """
+    stem, ext = os.path.splitext(filename)
+    candidate = filename
+    number = 1
+    while stem_key(candidate) in taken:
+        candidate = f"{stem}_{number}{ext}"
+        number += 1
+    return candidate
+
+
+def stem_key(filename):
+    """Normalize a file name's stem for collision checks (case-insensitive where the OS is)."""
+    return os.path.normcase(os.path.splitext(filename)[0])
+
+
+class ContentHashCache:
+    """
+    Content hashes of workspace files, kept between imports.
+
+    Entries are keyed by path and remembered together with the file's size
+    and mtime, so a file is hashed again only after it changed.
+    """
+
+    def __init__(self, cache_path=None):
+        """
+        Load the cache.
+
+        Args:
+            cache_path (str): JSON file the cache is kept in, or None to keep it in memory only
+        """
+        self.cache_path = cache_path
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._changed = False
+
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except Exception as e:
+                print(f"Error reading hash cache, starting over: {str(e)}")
+
+    def get(self, path, size, mtime_ns):
+        """Return the cached hash of a file, or None if it is unknown or changed."""
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is not None and entry[0] == size and entry[1] == mtime_ns:
+            return entry[2]
+        return None
+
+    def put(self, path, size, mtime_ns, digest):
+        with self._lock:
+            self._entries[path] = [size, mtime_ns, digest]
+            self._changed = True
+
+    def hash(self, path, size, mtime_ns):
+        """Get the hash of a file, computing and remembering it if needed."""
+        digest = self.get(path, size, mtime_ns)
+        if digest is None:
+            digest = hash_file(path)
+            self.put(path, size, mtime_ns, digest)
+        return digest
+
+    def save(self):
+        """Write the cache to disk if it changed, dropping files that no longer exist."""
+        if not self.cache_path or not self._changed:
+            return
+        with self._lock:
+            entries = {path: entry for path, entry in self._entries.items() if os.path.exists(path)}
+            self._entries = entries
+            self._changed = False
+        temp_path = self.cache_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        os.replace(temp_path, self.cache_path)
+
+
+class ImportJob:
+    """
+    Copies the images of a folder (and their tag files) into the workspace.
+
+    Files whose content is already in the workspace, or that repeat another
+    file of the same import, are skipped. Only files that share their size
+    with another file can be duplicates, so only those are hashed; hashing
+    and copying both run on a thread pool, and copies use fast_copy(). Name
+    collisions with different content get a numbered name (see unique_name).
+    Files are written under a temporary name and renamed into place, so the
+    folder watcher and a crash never see half-copied images.
+
+    Like BulkTagJob the job runs in the background; callers poll done/total
+    and finished and can cancel it at any time.
+    """
+
+    def __init__(self, source_folder, dest_folder, extensions, hash_cache=None, link=False, max_workers=4):
+        """
+        Initialize the job.
+
+        Args:
+            source_folder (str): Folder to import from
+            dest_folder (str): The workspace images folder
+            extensions (tuple): Lower-case image file extensions to import
+            hash_cache (ContentHashCache): Cache of workspace file hashes
+            link (bool): Hard link instead of copying when on the same file system
+            max_workers (int): Number of worker threads
+        """
+        self.source_folder = source_folder
+        self.dest_folder = dest_folder
+        self.extensions = extensions
+        self.hash_cache = hash_cache if hash_cache is not None else ContentHashCache()
+        self.link = link
+        self.max_workers = max_workers
+
+        self.total = 0
+        self.done = 0
+        # Full paths of the imported images in the workspace
+        self.imported = []
+        self.imported_tags = 0
+        # (source path, existing path) of skipped duplicates
+        self.duplicates = []
+        # Source file name -> new name for images that were renamed
+        self.renamed = {}
+        # (source path, error message) for every file that failed
+        self.errors = []
+        self.methods = {}
+        self.finished = False
+
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def start(self):
+        """Start importing in the background and return immediately."""
+        self._thread = threading.Thread(target=self._run, name="amalthea-import", daemon=True)
+        self._thread.start()
+        return self
+
+    def run(self):
+        """Import every file and return when done (or cancelled)."""
+        self._run()
+        return self
+
+    def cancel(self):
+        """Stop after the files that are already being copied."""
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Wait for a job started with start() to finish."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.finished
+
+    def _list_images(self, folder):
+        """List (name, path, size, mtime_ns) of the images in a folder, sorted by name."""
+        images = []
+        with os.scandir(folder) as scan:
+            for entry in scan:
+                if os.path.splitext(entry.name)[1].lower() not in self.extensions:
+                    continue
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        images.append((entry.name, entry.path, stat.st_size, stat.st_mtime_ns))
+                except OSError:
+                    continue
+        images.sort()
+        return images
+
+    @traced("import.run")
+    def _run(self):
+        try:
+            os.makedirs(self.dest_folder, exist_ok=True)
+            sources = self._list_images(self.source_folder)
+            existing = self._list_images(self.dest_folder)
+            self.total = len(sources)
+
+            with ThreadPoolExecutor(max_workers=self.max_workers,
+                                    thread_name_prefix="amalthea-import-worker") as executor:
+                digests = self._hash_candidates(executor, sources, existing)
+                if self._cancel.is_set():
+                    return
+                plan = self._plan(sources, existing, digests)
+                for _ in executor.map(self._copy, plan):
+                    if self._cancel.is_set():
+                        break
+        except Exception as e:
+            self.errors.append((self.source_folder, str(e)))
+        finally:
+            try:
+                self.hash_cache.save()
+            except Exception as e:
+                print(f"Error saving hash cache: {str(e)}")
+            self.imported.sort()
+            self.finished = True
+
+    def _hash_candidates(self, executor, sources, existing):
+        """Hash the files that could be duplicates, i.e. that share their size with another file."""
+        size_counts = {}
+        for _, _, size, _ in sources + existing:
+            size_counts[size] = size_counts.get(size, 0) + 1
+        existing_set = set(existing)
+
+        def hash_one(item):
+            _, path, size, mtime_ns = item
+            if self._cancel.is_set():
+                return path, None
+            try:
+                # Workspace files are worth caching; import sources usually aren't seen again
+                if item in existing_set:
+                    return path, self.hash_cache.hash(path, size, mtime_ns)
+                return path, hash_file(path)
+            except OSError as e:
+                with self._lock:
+                    self.errors.append((path, str(e)))
+                return path, None
+
+        candidates = [item for item in sources + existing if size_counts[item[2]] > 1]
+        return dict(executor.map(hash_one, candidates))
+
+    def _plan(self, sources, existing, digests):
+        """Decide which sources to copy and under which name, in a deterministic order."""
+        seen = {}
+        for _, path, _, _ in existing:
+            if digests.get(path) is not None:
+                seen.setdefault(digests[path], path)
+
+        # Stems of workspace images and tag files
+        taken = {stem_key(name) for name, _, _, _ in existing}
+        with os.scandir(self.dest_folder) as scan:
+            taken.update(stem_key(entry.name) for entry in scan if entry.name.lower().endswith(".txt"))
+
+        plan = []
+        for name, path, _, _ in sources:
+            digest = digests.get(path)
+            if digest is None and path in digests:
+                # Couldn't be read; the error is already recorded
+                with self._lock:
+                    self.done += 1
+                continue
+            if digest is not None:
+                if digest in seen:
+                    with self._lock:
+                        self.duplicates.append((path, seen[digest]))
+                        self.done += 1
+                    continue
+                seen[digest] = path
+
+            dest_name = unique_name(name, taken)
+            taken.add(stem_key(dest_name))
+            if dest_name != name:
+                self.renamed[name] = dest_name
+            plan.append((path, dest_name))
+        return plan
+
+    @traced("import.copy")
+    def _copy(self, item):
+        """Worker: copy one image and its tag file into the workspace."""
+        source_path, dest_name = item
+        if self._cancel.is_set():
+            return
+        dest_path = os.path.join(self.dest_folder, dest_name)
+        # The temporary name has no image extension, so nothing picks it up early
+        temp_path = os.path.join(self.dest_folder, f".{dest_name}.importing")
+        try:
+            method = fast_copy(source_path, temp_path, self.link)
+            os.replace(temp_path, dest_path)
+
+            tag_source = os.path.splitext(source_path)[0] + ".txt"
+            tag_copied = False
+            if os.path.exists(tag_source):
+                tag_dest = os.path.join(self.dest_folder, os.path.splitext(dest_name)[0] + ".txt")
+                shutil.copy2(tag_source, tag_dest)
+                tag_copied = True
+
+            with self._lock:
+                self.imported.append(dest_path)
+                self.imported_tags += tag_copied
+                self.methods[method] = self.methods.get(method, 0) + 1
+        except Exception as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            with self._lock:
+                self.errors.append((source_path, str(e)))
+        finally:
+            with self._lock:
+                self.done += 1
+
+    def summary(self, max_errors=10):
+        """
+        Build a human readable summary of the job.
+
+        Args:
+            max_errors (int): Maximum number of individual errors to list
+
+        Returns:
+            str: Summary text
+        """
+        lines = [f"Imported {len(self.imported)} of {self.total} images and {self.imported_tags} tag files: "
+                 f"{len(self.duplicates)} duplicates skipped, {len(self.renamed)} renamed, "
+                 f"{len(self.errors)} failed."]
+        if self.cancelled:
+            lines.append("The import was cancelled.")
+        if self.renamed:
+            lines.append("")
+            lines.append("Renamed to avoid a name clash:")
+            for name, new_name in sorted(self.renamed.items())[:max_errors]:
+                lines.append(f"{name} -> {new_name}")
+            if len(self.renamed) > max_errors:
+                lines.append(f"... and {len(self.renamed) - max_errors} more")
+        if self.errors:
+            lines.append("")
+            lines.append("Errors:")
+            for path, message in self.errors[:max_errors]:
+                lines.append(f"{os.path.basename(path)}: {message}")
+            if len(self.errors) > max_errors:
+                lines.append(f"... and {len(self.errors) - max_errors} more")
+        return "\n".join(lines)
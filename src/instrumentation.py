@@ -0,0 +1,243 @@
+"""
+Lightweight instrumentation of the hot paths.
+
+Code marks the work it does with named spans:
+
+    from src.instrumentation import tracer
+
+    with tracer.span("preview.decode"):
+        ...
+
+While the tracer is disabled (the default) span() hands back one shared
+no-op context manager, so instrumented code costs an attribute check and a
+method call. Once enabled, every span is recorded with its thread and can
+be written out as Chrome trace-event JSON (open it in chrome://tracing or
+https://ui.perfetto.dev).
+
+Set AMALTHEA_TRACE=1 to enable tracing at startup, and AMALTHEA_TRACE_FILE
+to a path to have the trace written there when the application closes.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+
+def trace_requested():
+    """Check whether tracing was asked for (AMALTHEA_TRACE=1 or AMALTHEA_TRACE_FILE set)."""
+    return (os.environ.get("AMALTHEA_TRACE", "").lower() in ("1", "true", "yes")
+            or bool(os.environ.get("AMALTHEA_TRACE_FILE")))
+
+
+class _NullSpan:
+    """Context manager that records nothing, used while the tracer is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """A span being timed; recorded by the tracer when the with-block ends."""
+
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.record(self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+class Tracer:
+    """
+    Records named spans from any thread.
+
+    The newest max_events spans are kept, so tracing can stay on during a
+    long session without growing without bound.
+    """
+
+    def __init__(self, max_events=200000):
+        """
+        Create a disabled tracer.
+
+        Args:
+            max_events (int): Number of most recent spans to keep
+        """
+        self.enabled = False
+        # (name, thread id, start ns, end ns, args)
+        self._events = deque(maxlen=max_events)
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+
+    def enable(self):
+        """Start recording spans."""
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording spans; spans recorded so far are kept."""
+        self.enabled = False
+
+    def clear(self):
+        """Drop every recorded span."""
+        with self._lock:
+            self._events.clear()
+
+    def span(self, name, **args):
+        """
+        Time the body of a with-statement.
+
+        Args:
+            name (str): Span name, dotted by component (e.g. "tags.save")
+            **args: Extra values stored with the span and shown in the trace viewer
+
+        Returns:
+            A context manager
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def record(self, name, start_ns, end_ns, args=None):
+        """
+        Record a span that was timed elsewhere.
+
+        Args:
+            name (str): Span name
+            start_ns (int): time.perf_counter_ns() when the work started
+            end_ns (int): time.perf_counter_ns() when the work ended
+            args (dict): Optional extra values
+        """
+        thread = threading.current_thread()
+        with self._lock:
+            self._threads.setdefault(thread.ident, thread.name)
+            self._events.append((name, thread.ident, start_ns, end_ns, args or None))
+
+    def now(self):
+        """Current time on the tracer's clock, for spans recorded with record()."""
+        return time.perf_counter_ns()
+
+    def spans_since(self, start_ns, thread_ident=None):
+        """
+        Get the spans that started at or after a point in time.
+
+        Args:
+            start_ns (int): Value of now() to start from
+            thread_ident (int): Only spans of this thread, defaults to the calling thread
+
+        Returns:
+            list: (name, duration ms, args) tuples in the order the spans ended
+        """
+        if thread_ident is None:
+            thread_ident = threading.get_ident()
+        found = []
+        with self._lock:
+            for name, ident, start, end, args in reversed(self._events):
+                if end < start_ns:
+                    break
+                if ident == thread_ident and start >= start_ns:
+                    found.append((name, (end - start) / 1e6, args))
+        found.reverse()
+        return found
+
+    def chrome_trace(self):
+        """
+        Build the recorded spans as a Chrome trace-event document.
+
+        Returns:
+            dict: {"traceEvents": [...]} with one complete ("X") event per span
+        """
+        pid = os.getpid()
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+
+        trace_events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": ident,
+                         "args": {"name": thread_name}}
+                        for ident, thread_name in threads.items()]
+        for name, ident, start, end, args in events:
+            event = {"name": name, "cat": name.split(".", 1)[0], "ph": "X", "pid": pid, "tid": ident,
+                     "ts": (start - self._origin) / 1000, "dur": (end - start) / 1000}
+            if args:
+                event["args"] = {key: value if isinstance(value, (int, float, bool)) else str(value)
+                                 for key, value in args.items()}
+            trace_events.append(event)
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path):
+        """
+        Write the recorded spans to a Chrome trace-event JSON file.
+
+        Args:
+            path (str): File to write
+
+        Returns:
+            int: Number of spans written
+        """
+        trace = self.chrome_trace()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(trace, f)
+        os.replace(tmp_path, path)
+        return sum(1 for event in trace["traceEvents"] if event["ph"] == "X")
+
+
+def format_breakdown(spans, max_parts=6):
+    """
+    Summarize spans as a short one-line breakdown for the status bar.
+
+    Spans with the same name are added up.
+
+    Args:
+        spans (list): (name, duration ms, args) tuples, see Tracer.spans_since()
+        max_parts (int): Number of slowest parts to show
+
+    Returns:
+        str: e.g. "prefetch.get_frame 12.1 ms | show_image.photo 3.0 ms"
+    """
+    totals = {}
+    for name, duration, _ in spans:
+        totals[name] = totals.get(name, 0.0) + duration
+    slowest = sorted(totals.items(), key=lambda item: -item[1])[:max_parts]
+    return " | ".join(f"{name} {duration:.1f} ms" for name, duration in slowest)
+
+
+def traced(name):
+    """
+    Decorator that runs a function inside a span.
+
+    Args:
+        name (str): Span name
+    """
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            with _Span(tracer, name, None):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# The process-wide tracer every module records to
+tracer = Tracer()
+if trace_requested():
+    tracer.enable()
@@ -0,0 +1,244 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from src.preview import load_preview
+from src.instrumentation import tracer
+
+
+class Frame:
+    """A decoded, display-ready image together with its metadata and tags."""
+
+    def __init__(self, image_path, image, metadata, tags):
+        self.image_path = image_path
+        self.image = image
+        self.metadata = metadata
+        self.tags = tags
+        # Approximate size of the decoded pixel data in bytes
+        self.nbytes = image.width * image.height * len(image.getbands())
+
+
+class FrameCache:
+    """
+    Thread-safe LRU cache of display-ready frames with a memory budget.
+
+    Frames are evicted least recently used first once the combined size of
+    their pixel data exceeds the budget.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            max_bytes (int): Memory budget for cached pixel data in bytes
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.generation = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, image_path):
+        with self._lock:
+            return image_path in self._frames
+
+    def __len__(self):
+        with self._lock:
+            return len(self._frames)
+
+    def get(self, image_path):
+        """
+        Get a cached frame and mark it as most recently used.
+
+        Returns:
+            Frame: The cached frame, or None if it is not cached
+        """
+        with self._lock:
+            frame = self._frames.get(image_path)
+            if frame is not None:
+                self._frames.move_to_end(image_path)
+            return frame
+
+    def put(self, frame, generation=None):
+        """
+        Add a frame to the cache, evicting old frames if over budget.
+
+        Args:
+            frame (Frame): The frame to store
+            generation (int): Cache generation the frame was loaded in. Frames
+                loaded before the last invalidate() are dropped.
+
+        Returns:
+            bool: True if the frame was stored, False otherwise
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            if frame.nbytes > self.max_bytes:
+                return False
+
+            old = self._frames.pop(frame.image_path, None)
+            if old is not None:
+                self.total_bytes -= old.nbytes
+
+            self._frames[frame.image_path] = frame
+            self.total_bytes += frame.nbytes
+
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._frames.popitem(last=False)
+                self.total_bytes -= evicted.nbytes
+            return True
+
+    def update_tags(self, image_path, tags):
+        """Update the cached tags of a frame after they were changed."""
+        with self._lock:
+            frame = self._frames.get(image_path)
+            if frame is not None:
+                frame.tags = tags
+
+    def discard(self, image_path):
+        """Remove a single frame from the cache if present."""
+        with self._lock:
+            frame = self._frames.pop(image_path, None)
+            if frame is not None:
+                self.total_bytes -= frame.nbytes
+
+    def invalidate(self):
+        """Drop every cached frame, including ones still being loaded."""
+        with self._lock:
+            self._frames.clear()
+            self.total_bytes = 0
+            self.generation += 1
+
+
+class PrefetchEngine:
+    """
+    Decodes the images around the current position on a worker pool so that
+    Previous/Next can be served straight from the frame cache.
+    """
+
+    def __init__(self, tag_manager, radius=3, max_workers=2, cache=None, preview_store=None,
+                 metadata_cache=None):
+        """
+        Initialize the prefetch engine.
+
+        Args:
+            tag_manager (TagManager): Used to load the tags of each frame
+            radius (int): Number of images to prefetch before and after the current one
+            max_workers (int): Number of decode threads
+            cache (FrameCache): Cache to fill, a new one is created if not given
+            preview_store (PreviewStore): Optional on-disk preview cache that is
+                checked before decoding and filled after decoding
+            metadata_cache (MetadataCache): Optional cache the metadata text is taken from
+        """
+        self.tag_manager = tag_manager
+        self.preview_store = preview_store
+        self.metadata_cache = metadata_cache
+        self.radius = radius
+        self.cache = cache if cache is not None else FrameCache()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="amalthea-prefetch")
+        self._pending = {}
+        self._wanted = set()
+        self._lock = threading.Lock()
+
+    def _load_frame(self, image_path):
+        """Decode an image (or read its stored preview) and load its tags."""
+        stored = None
+        if self.preview_store:
+            with tracer.span("preview_store.get"):
+                stored = self.preview_store.get(image_path)
+        if stored is not None:
+            image, metadata = stored
+        else:
+            image, metadata = load_preview(image_path)
+            if self.preview_store:
+                with tracer.span("preview_store.put"):
+                    self.preview_store.put(image_path, image, metadata)
+        if self.metadata_cache is not None:
+            with tracer.span("metadata_cache.get"):
+                metadata = self.metadata_cache.get_text(image_path)
+        tags = self.tag_manager.load_tags(image_path)
+        return Frame(image_path, image, metadata, tags)
+
+    def _prefetch_job(self, image_path, generation):
+        """Worker entry point for a single prefetch request."""
+        try:
+            with self._lock:
+                # Skip images the user has already navigated away from
+                if image_path not in self._wanted:
+                    return None
+            with tracer.span("prefetch.background_load"):
+                frame = self._load_frame(image_path)
+            self.cache.put(frame, generation)
+            return frame
+        finally:
+            with self._lock:
+                self._pending.pop(image_path, None)
+
+    def get_frame(self, image_path):
+        """
+        Get the frame for an image, decoding it now if it is not ready yet.
+
+        If a worker is already decoding the image this waits for it instead of
+        decoding the same file twice.
+
+        Returns:
+            Frame: The display-ready frame
+        """
+        frame = self.cache.get(image_path)
+        if frame is not None:
+            return frame
+
+        with self._lock:
+            future = self._pending.get(image_path)
+        if future is not None:
+            with tracer.span("prefetch.wait"):
+                frame = future.result()
+            if frame is not None:
+                return frame
+
+        generation = self.cache.generation
+        with tracer.span("prefetch.load"):
+            frame = self._load_frame(image_path)
+        self.cache.put(frame, generation)
+        return frame
+
+    def prefetch(self, images, index):
+        """
+        Schedule decoding of the neighbours of images[index].
+
+        Closer images are scheduled first, alternating forwards and backwards.
+
+        Args:
+            images (list): Ordered list of image paths
+            index (int): Position of the current image
+        """
+        if not images:
+            return
+
+        count = len(images)
+        order = []
+        for distance in range(1, min(self.radius, count - 1) + 1):
+            for step in (distance, -distance):
+                path = images[(index + step) % count]
+                if path not in order:
+                    order.append(path)
+
+        generation = self.cache.generation
+        with self._lock:
+            self._wanted = set(order)
+            self._wanted.add(images[index])
+            for path in order:
+                if path in self._pending or path in self.cache:
+                    continue
+                self._pending[path] = self._executor.submit(
+                    self._prefetch_job, path, generation)
+
+    def shutdown(self):
+        """Stop the worker pool, dropping any queued work."""
+        with self._lock:
+            # Queued jobs check this set first, so they finish immediately
+            self._wanted = set()
+        self._executor.shutdown(wait=False)
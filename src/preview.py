@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+from PIL import Image
+
+from src.image_metadata import metadata_text
+from src.instrumentation import tracer
+
+# Largest size an image is shown at in the main window
+PREVIEW_MAX_SIZE = (700, 400)
+
+# Modes supported by Image.reduce()
+REDUCIBLE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'RGBX', 'CMYK', 'I', 'F')
+
+# Downscale ratio from which a cheaper resampling filter is used
+LARGE_RATIO = 3
+
+
+def fit_size(size, max_size):
+    """
+    Calculate the size an image has to be scaled to in order to fit max_size.
+
+    Args:
+        size (tuple): Original (width, height)
+        max_size (tuple): Maximum (width, height)
+
+    Returns:
+        tuple: The scaled (width, height), or None if the image already fits
+    """
+    width, height = size
+    max_width, max_height = max_size
+
+    if width <= max_width and height <= max_height:
+        return None
+
+    ratio = min(max_width/width, max_height/height)
+    return max(1, int(width * ratio)), max(1, int(height * ratio))
+
+
+def _scale_down(pil_image, target):
+    """
+    Scale an opened image down to target using the cheapest decode available.
+
+    JPEGs are decoded straight at a reduced DCT scale, so the full-size bitmap
+    is never built. Whatever is left of a large ratio is then box-reduced by an
+    integer factor, and the final fractional step uses LANCZOS (or BILINEAR
+    when the image mode can't be box-reduced and the ratio is still large).
+    """
+    if pil_image.format == 'JPEG':
+        # Picks the largest 1/2, 1/4 or 1/8 scale that is still >= target
+        pil_image.draft(pil_image.mode, target)
+
+    factor = min(pil_image.width // target[0], pil_image.height // target[1])
+    if factor >= 2 and pil_image.mode in REDUCIBLE_MODES:
+        pil_image = pil_image.reduce(factor)
+        factor = 1
+
+    resample = Image.LANCZOS if factor < LARGE_RATIO else Image.BILINEAR
+    return pil_image.resize(target, resample)
+
+
+def load_preview(image_path, max_size=PREVIEW_MAX_SIZE, fast=True):
+    """
+    Open an image, read its metadata and scale it down to fit the display area.
+
+    The returned image is fully decoded, so this is safe to call from a worker
+    thread and hand the result to the Tk thread afterwards.
+
+    Args:
+        image_path (str): Full path to the image file
+        max_size (tuple): Maximum (width, height) of the preview
+        fast (bool): Use reduced-resolution decoding. When False the full image
+            is decoded and resized with LANCZOS (the original behaviour).
+
+    Returns:
+        tuple: (PIL.Image.Image, str) - the preview image and its metadata text
+    """
+    with tracer.span("preview.open"):
+        pil_image = Image.open(image_path)
+    with pil_image:
+        # Text chunks are read straight from the file headers
+        with tracer.span("preview.metadata"):
+            metadata = metadata_text(image_path)
+
+        # Calculate resize dimensions to fit in display area
+        target = fit_size(pil_image.size, max_size)
+
+        with tracer.span("preview.decode", size=f"{pil_image.size[0]}x{pil_image.size[1]}"):
+            if target is None:
+                pil_image.load()
+                preview = pil_image.copy()
+            elif fast:
+                preview = _scale_down(pil_image, target)
+            else:
+                preview = pil_image.resize(target, Image.LANCZOS)
+
+    return preview, metadata
+
+
+def compare_preview_paths(image_path, max_size=PREVIEW_MAX_SIZE, repeat=3):
+    """
+    Measure the fast preview path against the full decode path for one image.
+
+    Args:
+        image_path (str): Full path to the image file
+        max_size (tuple): Maximum (width, height) of the preview
+        repeat (int): Number of runs per path, the best run is reported
+
+    Returns:
+        dict: Best time in seconds and number of decoded pixels for each path
+    """
+    results = {}
+    for name, fast in (("full", False), ("fast", True)):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            load_preview(image_path, max_size, fast=fast)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        # Size of the largest bitmap built while decoding
+        with Image.open(image_path) as pil_image:
+            if fast and pil_image.format == 'JPEG':
+                target = fit_size(pil_image.size, max_size)
+                if target is not None:
+                    pil_image.draft(pil_image.mode, target)
+            decoded_pixels = pil_image.width * pil_image.height
+
+        results[name] = {"seconds": best, "decoded_pixels": decoded_pixels}
+    return results
+
+
+if __name__ == "__main__":
+    # Usage: python -m src.preview IMAGE [IMAGE ...]
+    for path in sys.argv[1:]:
+        result = compare_preview_paths(path)
+        full, fast = result["full"], result["fast"]
+        print(f"{os.path.basename(path)}: "
+              f"full {full['seconds'] * 1000:.1f} ms / {full['decoded_pixels']} px, "
+              f"fast {fast['seconds'] * 1000:.1f} ms / {fast['decoded_pixels']} px "
+              f"({full['seconds'] / max(fast['seconds'], 1e-9):.1f}x faster)")
@@ -0,0 +1,277 @@
+import json
+import mmap
+import os
+import threading
+import time
+from PIL import Image
+
+from src.preview import PREVIEW_MAX_SIZE
+from src.workspace import file_identity
+
+# Bump when the pack or index layout changes
+STORE_VERSION = 2
+
+# Number of new previews after which the index is saved again
+INDEX_SAVE_INTERVAL = 256
+
+# Image modes whose raw bytes fully describe the image
+STORED_MODES = ('1', 'L', 'LA', 'RGB', 'RGBA', 'CMYK', 'I', 'F')
+
+
+class PreviewStore:
+    """
+    Persistent cache of pre-scaled previews for a workspace.
+
+    Previews are stored as raw pixel data, followed by their metadata text, in
+    a single append-only pack file that is read through mmap. A JSON index
+    maps each image (by its path relative to the workspace root, so images
+    with the same name in different sub-folders don't collide) to its file identity (size and mtime) and the offset
+    of its record in the pack, so a cache hit costs one memory copy instead of
+    opening and decoding the original. When the pack grows past the size cap,
+    the least recently used previews are dropped and the pack is compacted.
+    """
+
+    def __init__(self, state_dir, root=None, max_bytes=1024 * 1024 * 1024, max_size=PREVIEW_MAX_SIZE):
+        """
+        Initialize the store, loading the existing index if there is one.
+
+        Args:
+            state_dir (str): Directory to keep the pack and index files in
+            root (str): Workspace root the images are keyed relative to; images
+                are keyed by their absolute path when not given
+            max_bytes (int): Size cap for the pack file in bytes
+            max_size (tuple): Maximum (width, height) of the stored previews
+        """
+        self.pack_path = os.path.join(state_dir, "previews.pack")
+        self.index_path = os.path.join(state_dir, "previews.idx")
+        self.root = os.path.abspath(root) if root else None
+        self.max_bytes = max_bytes
+        self.max_size = list(max_size)
+
+        self._entries = {}
+        self._pack_size = 0
+        self._live_bytes = 0
+        self._dirty = False
+        self._unsaved_puts = 0
+        self._map = None
+        self._map_size = 0
+        self._lock = threading.Lock()
+
+        self._load_index()
+
+    def _load_index(self):
+        """Load the index, discarding the store if it doesn't match the pack."""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as index_file:
+                index = json.load(index_file)
+            pack_size = os.path.getsize(self.pack_path)
+
+            if (index.get("version") != STORE_VERSION
+                    or index.get("max_size") != self.max_size
+                    or index.get("pack_size", -1) > pack_size):
+                raise ValueError("preview cache is outdated")
+
+            # Drop records appended after the index was last saved
+            if pack_size > index["pack_size"]:
+                os.truncate(self.pack_path, index["pack_size"])
+
+            self._entries = index["entries"]
+            self._pack_size = index["pack_size"]
+            self._live_bytes = sum(entry[3] + entry[4] for entry in self._entries.values())
+        except FileNotFoundError:
+            self._reset()
+        except Exception as e:
+            print(f"Discarding preview cache: {str(e)}")
+            self._reset()
+
+    def _reset(self):
+        """Start over with an empty pack."""
+        self._close_map()
+        self._entries = {}
+        self._pack_size = 0
+        self._live_bytes = 0
+        self._dirty = True
+        try:
+            open(self.pack_path, 'wb').close()
+        except Exception as e:
+            print(f"Error creating preview cache: {str(e)}")
+
+    def _close_map(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self._map_size = 0
+
+    def _read(self, offset, length):
+        """Read bytes from the pack through a (re)mapped view."""
+        if self._map is None or offset + length > self._map_size:
+            self._close_map()
+            with open(self.pack_path, 'rb') as pack_file:
+                self._map = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._map_size = len(self._map)
+        return self._map[offset:offset + length]
+
+    def _key(self, image_path):
+        """Index key of an image: its path relative to the root, or its absolute path."""
+        path = os.path.abspath(image_path)
+        if self.root is not None:
+            try:
+                relative = os.path.relpath(path, self.root)
+            except ValueError:
+                # On another drive than the root
+                relative = os.pardir
+            if not relative.startswith(os.pardir):
+                path = relative
+        return path.replace(os.sep, '/')
+
+    def get(self, image_path):
+        """
+        Get the stored preview of an image if it is still up to date.
+
+        Args:
+            image_path (str): Full path to the image file
+
+        Returns:
+            tuple: (PIL.Image.Image, str) - the preview and its metadata text,
+                or None if there is no up to date preview
+        """
+        identity = file_identity(image_path)
+        if identity is None:
+            return None
+
+        name = self._key(image_path)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[0] != identity[0] or entry[1] != identity[1]:
+                return None
+
+            _, _, offset, pixel_length, meta_length, mode, width, height, _ = entry
+            try:
+                data = self._read(offset, pixel_length + meta_length)
+            except Exception as e:
+                print(f"Error reading preview cache: {str(e)}")
+                return None
+
+            entry[8] = time.time()
+            self._dirty = True
+
+        image = Image.frombytes(mode, (width, height), data[:pixel_length])
+        metadata = data[pixel_length:].decode('utf-8')
+        return image, metadata
+
+    def put(self, image_path, image, metadata):
+        """
+        Store the preview of an image.
+
+        Args:
+            image_path (str): Full path to the image file
+            image (PIL.Image.Image): The scaled preview
+            metadata (str): Metadata text shown with the preview
+        """
+        identity = file_identity(image_path)
+        if identity is None:
+            return
+
+        # Raw bytes don't carry a palette, so store palette images expanded
+        if image.mode not in STORED_MODES:
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        pixels = image.tobytes()
+        meta_bytes = metadata.encode('utf-8')
+        name = self._key(image_path)
+
+        with self._lock:
+            try:
+                with open(self.pack_path, 'ab') as pack_file:
+                    pack_file.write(pixels)
+                    pack_file.write(meta_bytes)
+            except Exception as e:
+                print(f"Error writing preview cache: {str(e)}")
+                return
+
+            old = self._entries.pop(name, None)
+            if old is not None:
+                self._live_bytes -= old[3] + old[4]
+
+            self._entries[name] = [identity[0], identity[1], self._pack_size,
+                                   len(pixels), len(meta_bytes), image.mode,
+                                   image.width, image.height, time.time()]
+            self._pack_size += len(pixels) + len(meta_bytes)
+            self._live_bytes += len(pixels) + len(meta_bytes)
+            self._dirty = True
+            self._unsaved_puts += 1
+
+            # Compact when over the cap or when most of the pack is dead space
+            if self._pack_size > self.max_bytes or self._pack_size > 2 * self._live_bytes + self.max_bytes // 4:
+                self._compact()
+            elif self._unsaved_puts >= INDEX_SAVE_INTERVAL:
+                try:
+                    self._save_index()
+                except Exception as e:
+                    print(f"Error saving preview cache index: {str(e)}")
+
+    def _compact(self):
+        """Rewrite the pack with only the most recently used live previews."""
+        keep_bytes = self.max_bytes * 3 // 4
+        kept = {}
+        total = 0
+        for name, entry in sorted(self._entries.items(), key=lambda item: item[1][8], reverse=True):
+            length = entry[3] + entry[4]
+            if total + length > keep_bytes:
+                break
+            kept[name] = entry
+            total += length
+
+        temp_path = self.pack_path + ".tmp"
+        try:
+            offset = 0
+            with open(temp_path, 'wb') as temp_file:
+                # Copy in pack order so reads stay mostly sequential
+                for name, entry in sorted(kept.items(), key=lambda item: item[1][2]):
+                    length = entry[3] + entry[4]
+                    temp_file.write(self._read(entry[2], length))
+                    entry[2] = offset
+                    offset += length
+            self._close_map()
+            os.replace(temp_path, self.pack_path)
+        except Exception as e:
+            print(f"Error compacting preview cache: {str(e)}")
+            self._reset()
+            return
+
+        self._entries = kept
+        self._pack_size = offset
+        self._live_bytes = offset
+        self._dirty = True
+        self._save_index()
+
+    def _save_index(self):
+        """Atomically write the index file."""
+        index = {
+            "version": STORE_VERSION,
+            "max_size": self.max_size,
+            "pack_size": self._pack_size,
+            "entries": self._entries,
+        }
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as index_file:
+            json.dump(index, index_file, separators=(',', ':'))
+        os.replace(temp_path, self.index_path)
+        self._dirty = False
+        self._unsaved_puts = 0
+
+    def flush(self):
+        """Write the index to disk if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                self._save_index()
+            except Exception as e:
+                print(f"Error saving preview cache index: {str(e)}")
+
+    def close(self):
+        """Flush the index and release the pack mapping."""
+        self.flush()
+        with self._lock:
+            self._close_map()
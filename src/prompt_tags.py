@@ -0,0 +1,378 @@
+import json
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from src.image_metadata import read_metadata
+from src.tag_manager import parse_tags, join_tags
+from src.instrumentation import traced
+
+# How parsed prompt tags combine with the tags an image already has
+MERGE_RULES = {
+    "append": "Add new prompt tags after the existing tags",
+    "prepend": "Put the prompt tags first, followed by the other existing tags",
+    "replace": "Replace the existing tags with the prompt tags",
+    "missing": "Only tag images that have no tags yet",
+}
+
+# A1111 writes the generation settings on a line of their own after the prompt
+SETTINGS_LINE = re.compile(r"^Steps: \d+")
+# Extra networks like <lora:name:0.8>
+EXTRA_NETWORK = re.compile(r"<[^<>]*>")
+# Attention weights like (word:1.2) or [word:0.5], only directly before a closing bracket
+ATTENTION_WEIGHT = re.compile(r"(?<!\\):\s*-?\d*\.?\d+\s*(?=[)\]])")
+UNESCAPED_BRACKET = re.compile(r"(?<!\\)[()\[\]{}]")
+ESCAPED_BRACKET = re.compile(r"\\([()\[\]{}])")
+TAG_SEPARATOR = re.compile(r"[,\n]|\bBREAK\b")
+
+
+def a1111_prompt(parameters):
+    """
+    Get the positive prompt from an A1111 style "parameters" text.
+
+    Args:
+        parameters (str): Prompt, then optionally "Negative prompt: ..." and the settings line
+
+    Returns:
+        str: The positive prompt
+    """
+    lines = []
+    for line in parameters.split("\n"):
+        if line.startswith("Negative prompt:") or SETTINGS_LINE.match(line):
+            break
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def comfyui_prompt(graph):
+    """
+    Get the positive prompt from a ComfyUI "prompt" graph.
+
+    The texts are collected from the nodes feeding the "positive" input of
+    the samplers; without a sampler, from every CLIP text encoder.
+
+    Args:
+        graph (dict): Node id -> {"class_type": ..., "inputs": {...}}
+
+    Returns:
+        str: The positive prompt texts, one per line
+    """
+    texts = []
+    visited = set()
+
+    def collect(node_id):
+        node = graph.get(str(node_id))
+        if node_id in visited or not isinstance(node, dict):
+            return
+        visited.add(node_id)
+        for name, value in node.get("inputs", {}).items():
+            if name in ("text", "text_g", "text_l") and isinstance(value, str):
+                texts.append(value)
+            elif isinstance(value, list) and len(value) == 2:
+                # A link to another node's output
+                collect(str(value[0]))
+
+    samplers = [node for node in graph.values()
+                if isinstance(node, dict) and isinstance(node.get("inputs", {}).get("positive"), list)]
+    if samplers:
+        for node in samplers:
+            collect(str(node["inputs"]["positive"][0]))
+    else:
+        for node_id, node in graph.items():
+            if isinstance(node, dict) and "CLIPTextEncode" in str(node.get("class_type", "")):
+                collect(node_id)
+    return "\n".join(texts)
+
+
+def find_prompt(entries):
+    """
+    Find the positive generation prompt in an image's text metadata.
+
+    Args:
+        entries (list): (name, text) pairs from read_metadata()
+
+    Returns:
+        str: The prompt, or None if the image has none
+    """
+    fields = dict(entries)
+    for name in ("parameters", "UserComment"):
+        if fields.get(name, "").strip():
+            return a1111_prompt(fields[name])
+    if fields.get("prompt", "").strip():
+        try:
+            graph = json.loads(fields["prompt"])
+        except ValueError:
+            # Some tools store the plain prompt text under this name
+            return fields["prompt"]
+        if isinstance(graph, dict):
+            return comfyui_prompt(graph)
+    return None
+
+
+def prompt_to_tags(prompt, ignore=()):
+    """
+    Turn a generation prompt into normalized tags.
+
+    Extra networks, attention brackets and weights are removed, the prompt
+    is split at commas, line breaks and BREAK, and every tag is lower-cased
+    with its whitespace collapsed. Duplicates are dropped.
+
+    Args:
+        prompt (str): Positive prompt
+        ignore (set): Normalized tags to leave out (for example quality tags)
+
+    Returns:
+        list: The tags in prompt order
+    """
+    prompt = EXTRA_NETWORK.sub(",", prompt)
+    prompt = ATTENTION_WEIGHT.sub("", prompt)
+    prompt = UNESCAPED_BRACKET.sub("", prompt)
+    prompt = ESCAPED_BRACKET.sub(r"\1", prompt)
+    tags = []
+    seen = set()
+    for part in TAG_SEPARATOR.split(prompt):
+        tag = " ".join(part.split()).lower()
+        if tag and tag not in seen and tag not in ignore:
+            seen.add(tag)
+            tags.append(tag)
+    return tags
+
+
+def merge_tags(existing, parsed, rule):
+    """
+    Combine an image's tags with the tags parsed from its prompt.
+
+    A prompt without any tags (only LoRA references or ignored tags) never
+    changes the image, so "replace" can't wipe its tags.
+
+    Args:
+        existing (list): The image's current tags
+        parsed (list): Tags from the prompt
+        rule (str): One of MERGE_RULES
+
+    Returns:
+        list: The new tags, or None if the image stays unchanged
+    """
+    if not parsed:
+        return None
+    if rule == "append":
+        known = set(existing)
+        merged = existing + [tag for tag in parsed if tag not in known]
+    elif rule == "prepend":
+        known = set(parsed)
+        merged = parsed + [tag for tag in existing if tag not in known]
+    elif rule == "replace":
+        merged = list(parsed)
+    elif rule == "missing":
+        merged = existing if existing else list(parsed)
+    else:
+        raise ValueError(f"Unknown merge rule: {rule}")
+    return None if merged == existing else merged
+
+
+def extract_prompt_tags(task):
+    """
+    Worker process: read the prompts of a batch of images and parse them into tags.
+
+    Args:
+        task (tuple): (list of image paths, set of tags to ignore)
+
+    Returns:
+        list: (image_path, tags or None if there is no prompt, error message or None)
+    """
+    image_paths, ignore = task
+    results = []
+    for image_path in image_paths:
+        try:
+            prompt = find_prompt(read_metadata(image_path)[1])
+            tags = prompt_to_tags(prompt, ignore) if prompt is not None else None
+            results.append((image_path, tags, None))
+        except Exception as e:
+            results.append((image_path, None, str(e)))
+    return results
+
+
+class PromptTagJob:
+    """
+    Converts the generation prompts embedded in images into their tags.
+
+    The prompts are read from the file headers and parsed on a process pool
+    across all cores. Once every image is parsed, the merged tags of all
+    changed images are written with a single write_many() call, so backends
+    that batch (the SQLite database, the journal) store them in one
+    transaction. Cancelling before that point writes nothing.
+
+    Like BulkTagJob the job runs in the background; callers poll done/total
+    and finished and can cancel it at any time.
+    """
+
+    def __init__(self, image_paths, backend, read_tags=None, merge_rule="append", ignore=(),
+                 max_workers=None, batch_size=64):
+        """
+        Initialize the job.
+
+        Args:
+            image_paths (list): Full paths of the images to process
+            backend: Tag storage backend the new tags are written to
+            read_tags (function): Optional replacement for backend.read, for
+                example to take the current tags from a TagIndex
+            merge_rule (str): One of MERGE_RULES
+            ignore (iterable): Tags that are never taken from a prompt
+            max_workers (int): Number of worker processes, defaults to the number of CPUs
+            batch_size (int): Number of images sent to a worker at a time
+        """
+        if merge_rule not in MERGE_RULES:
+            raise ValueError(f"Unknown merge rule: {merge_rule}")
+        self.image_paths = list(image_paths)
+        self.backend = backend
+        self.read_tags = read_tags if read_tags is not None else backend.read
+        self.merge_rule = merge_rule
+        self.ignore = frozenset(" ".join(tag.split()).lower() for tag in ignore)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+
+        self.total = len(self.image_paths)
+        self.done = 0
+        self.with_prompt = 0
+        # Images whose prompt left no tags, and which were left unchanged
+        self.empty_prompts = 0
+        self.unchanged = 0
+        # (image_path, new tags string) for every image that was rewritten
+        self.changes = []
+        # (image_path, error message) for every image that failed
+        self.errors = []
+        self.finished = False
+
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def changed(self):
+        return len(self.changes)
+
+    def start(self):
+        """Start processing in the background and return immediately."""
+        self._thread = threading.Thread(target=self._run, name="amalthea-prompt-tags", daemon=True)
+        self._thread.start()
+        return self
+
+    def run(self):
+        """Process every image and return when done (or cancelled)."""
+        self._run()
+        return self
+
+    def cancel(self):
+        """Stop parsing; nothing is written once the job is cancelled."""
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Wait for a job started with start() to finish."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.finished
+
+    @traced("prompt_tags.run")
+    def _run(self):
+        try:
+            parsed = self._parse_all()
+            if self._cancel.is_set():
+                return
+            changes = self._merge(parsed)
+            if changes:
+                try:
+                    self.backend.write_many(changes)
+                    self.changes = changes
+                except Exception as e:
+                    self.errors.extend((image_path, f"Not saved: {str(e)}") for image_path, _ in changes)
+        except Exception as e:
+            self.errors.append(("", str(e)))
+        finally:
+            self.finished = True
+
+    def _parse_all(self):
+        """Parse the prompts of every image on the process pool."""
+        parsed = {}
+        in_flight = threading.BoundedSemaphore(self.max_workers * 2)
+
+        def finished_one(future, batch):
+            try:
+                results = future.result()
+            except Exception as e:
+                results = [(image_path, None, str(e)) for image_path in batch]
+            with self._lock:
+                for image_path, tags, error in results:
+                    if error is not None:
+                        self.errors.append((image_path, error))
+                    elif tags is not None:
+                        parsed[image_path] = tags
+                self.done += len(results)
+            in_flight.release()
+
+        # Spawned workers don't inherit the UI's threads and locks
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context) as executor:
+            for start in range(0, self.total, self.batch_size):
+                in_flight.acquire()
+                if self._cancel.is_set():
+                    in_flight.release()
+                    break
+                batch = self.image_paths[start:start + self.batch_size]
+                future = executor.submit(extract_prompt_tags, (batch, self.ignore))
+                future.add_done_callback(lambda future, batch=batch: finished_one(future, batch))
+        self.with_prompt = len(parsed)
+        return parsed
+
+    def _merge(self, parsed):
+        """Work out the new tags of every image with a prompt, in workspace order."""
+        changes = []
+        for image_path in self.image_paths:
+            tags = parsed.get(image_path)
+            if tags is None:
+                continue
+            if not tags:
+                self.empty_prompts += 1
+                continue
+            try:
+                existing = parse_tags(self.read_tags(image_path))
+            except Exception as e:
+                self.errors.append((image_path, str(e)))
+                continue
+            merged = merge_tags(existing, tags, self.merge_rule)
+            if merged is None:
+                self.unchanged += 1
+            else:
+                changes.append((image_path, join_tags(merged)))
+        return changes
+
+    def summary(self, max_errors=10):
+        """
+        Build a human readable summary of the job.
+
+        Args:
+            max_errors (int): Maximum number of individual errors to list
+
+        Returns:
+            str: Summary text
+        """
+        lines = [f"Found prompts in {self.with_prompt} of {self.total} images: "
+                 f"{self.changed} updated, {self.unchanged} unchanged, {len(self.errors)} failed."]
+        if self.empty_prompts:
+            lines.append(f"{self.empty_prompts} prompts had no tags left after removing LoRA references "
+                         f"and ignored tags; those images were left unchanged.")
+        if self.cancelled:
+            lines.append("The operation was cancelled; no tags were changed.")
+        if self.errors:
+            lines.append("")
+            lines.append("Errors:")
+            for image_path, message in self.errors[:max_errors]:
+                lines.append(f"{os.path.basename(image_path)}: {message}")
+            if len(self.errors) > max_errors:
+                lines.append(f"... and {len(self.errors) - max_errors} more")
+        return "\n".join(lines)
@@ -0,0 +1,231 @@
+import os
+import re
+import sqlite3
+import threading
+
+from src.workspace import file_identity
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """
+    Split text into lower-case word tokens.
+
+    Args:
+        text (str): Text to split
+
+    Returns:
+        list: The tokens in order
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class SearchIndex:
+    """
+    Full-text search over the embedded metadata and the tags of workspace images.
+
+    Metadata text (for example the "parameters" chunk of generated images)
+    is tokenized into a SQLite FTS5 index in the workspace state folder.
+    Each image is remembered with its size and mtime, so update() only reads
+    images that are new or changed. Tags change all the time, so they are
+    not copied into the database; tag terms are answered from the in-memory
+    TagIndex instead.
+
+    A query is a list of words. An image matches when every word is the
+    start of a token in its metadata or tags; words starting with "-"
+    exclude the images they match.
+    """
+
+    def __init__(self, state_dir, metadata_cache, tag_index):
+        """
+        Open (or create) the index.
+
+        Args:
+            state_dir (str): Workspace state folder
+            metadata_cache (MetadataCache): Where the metadata text is read from
+            tag_index (TagIndex): Current tags of the workspace images
+        """
+        self.metadata_cache = metadata_cache
+        self.tag_index = tag_index
+        self._lock = threading.Lock()
+        self._closed = False
+        # Tag -> its tokens, so tag queries don't tokenize the same tags again
+        self._tag_tokens = {}
+
+        self._conn = sqlite3.connect(os.path.join(state_dir, "search.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs ("
+                " id INTEGER PRIMARY KEY,"
+                " path TEXT UNIQUE NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL)")
+            try:
+                self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS doc_text "
+                                   "USING fts5(body, detail=none)")
+                self.full_text = True
+            except sqlite3.OperationalError:
+                # SQLite built without FTS5: fall back to substring scans
+                self._conn.execute("CREATE TABLE IF NOT EXISTS doc_text_plain ("
+                                   " rowid INTEGER PRIMARY KEY, body TEXT NOT NULL)")
+                self.full_text = False
+
+        self._paths = {}
+        self._docs = {}
+        for doc_id, path, size, mtime_ns in self._conn.execute("SELECT id, path, size, mtime_ns FROM docs"):
+            self._paths[doc_id] = path
+            self._docs[path] = (doc_id, (size, mtime_ns))
+
+    @property
+    def _text_table(self):
+        return "doc_text" if self.full_text else "doc_text_plain"
+
+    def __len__(self):
+        return len(self._docs)
+
+    def update(self, image_paths, prune=True, batch_size=500):
+        """
+        Index the metadata of images that are new or changed since they were indexed.
+
+        Args:
+            image_paths (list): Full paths of the images
+            prune (bool): Also drop indexed images that aren't in image_paths
+            batch_size (int): Number of images written per transaction
+
+        Returns:
+            int: Number of images that were (re)indexed
+        """
+        indexed = 0
+        batch = []
+        for image_path in image_paths:
+            if self._closed:
+                return indexed
+            identity = file_identity(image_path)
+            doc = self._docs.get(image_path)
+            if identity is None or (doc is not None and doc[1] == identity):
+                continue
+            try:
+                _, entries = self.metadata_cache.get(image_path)
+            except Exception as e:
+                print(f"Error indexing {os.path.basename(image_path)}: {str(e)}")
+                continue
+            body = "\n".join(f"{name} {text}" for name, text in entries)
+            batch.append((image_path, identity, body if self.full_text else body.lower()))
+            if len(batch) >= batch_size:
+                indexed += self._store(batch)
+                batch = []
+        if batch:
+            indexed += self._store(batch)
+
+        if prune:
+            keep = set(image_paths)
+            with self._lock:
+                stale = [path for path in self._docs if path not in keep]
+            self.remove(stale)
+        return indexed
+
+    def _store(self, batch):
+        """Write a batch of (path, identity, body) in one transaction."""
+        with self._lock:
+            if self._closed:
+                return 0
+            with self._conn:
+                for image_path, (size, mtime_ns), body in batch:
+                    doc = self._docs.get(image_path)
+                    if doc is None:
+                        cursor = self._conn.execute("INSERT INTO docs (path, size, mtime_ns) VALUES (?, ?, ?)",
+                                                    (image_path, size, mtime_ns))
+                        doc_id = cursor.lastrowid
+                    else:
+                        doc_id = doc[0]
+                        self._conn.execute("UPDATE docs SET size = ?, mtime_ns = ? WHERE id = ?",
+                                           (size, mtime_ns, doc_id))
+                        self._conn.execute(f"DELETE FROM {self._text_table} WHERE rowid = ?", (doc_id,))
+                    self._conn.execute(f"INSERT INTO {self._text_table} (rowid, body) VALUES (?, ?)",
+                                       (doc_id, body))
+                    self._paths[doc_id] = image_path
+                    self._docs[image_path] = (doc_id, (size, mtime_ns))
+        return len(batch)
+
+    def remove(self, image_paths):
+        """Drop images from the index."""
+        with self._lock:
+            if self._closed:
+                return
+            doc_ids = [(self._docs.pop(path)[0],) for path in image_paths if path in self._docs]
+            if not doc_ids:
+                return
+            with self._conn:
+                self._conn.executemany("DELETE FROM docs WHERE id = ?", doc_ids)
+                self._conn.executemany(f"DELETE FROM {self._text_table} WHERE rowid = ?", doc_ids)
+            for (doc_id,) in doc_ids:
+                self._paths.pop(doc_id, None)
+
+    def _metadata_hits(self, term):
+        """Get the images whose metadata has a token starting with term."""
+        with self._lock:
+            if self._closed:
+                return set()
+            if self.full_text:
+                rows = self._conn.execute("SELECT rowid FROM doc_text WHERE doc_text MATCH ?",
+                                          (f'"{term}"*',))
+            else:
+                rows = self._conn.execute("SELECT rowid FROM doc_text_plain WHERE instr(body, ?) > 0",
+                                          (term,))
+            paths = self._paths
+            return {paths[row[0]] for row in rows if row[0] in paths}
+
+    def _tag_hits(self, term):
+        """Get the images that have a tag with a token starting with term."""
+        matching = []
+        for tag in self.tag_index.tag_counts():
+            tokens = self._tag_tokens.get(tag)
+            if tokens is None:
+                tokens = self._tag_tokens[tag] = tokenize(tag)
+            if any(token.startswith(term) for token in tokens):
+                matching.append(tag)
+        return self.tag_index.images_with_any(matching)
+
+    def search(self, query, images=None):
+        """
+        Find the images that match a query.
+
+        Args:
+            query (str): Words to look for; a leading "-" excludes a word
+            images (list): Workspace images a query of only exclusions starts
+                from, defaults to every indexed image
+
+        Returns:
+            set: Full paths of the matching images, or None for an empty query
+        """
+        include = []
+        exclude = []
+        for word in query.split():
+            target = exclude if word.startswith("-") else include
+            target.extend(tokenize(word))
+        if not include and not exclude:
+            return None
+
+        if include:
+            result = None
+            for term in include:
+                hits = self._metadata_hits(term) | self._tag_hits(term)
+                result = hits if result is None else result & hits
+                if not result:
+                    return set()
+        else:
+            # Only exclusions: start from every known image
+            result = set(self._docs if images is None else images)
+
+        for term in exclude:
+            result -= self._metadata_hits(term) | self._tag_hits(term)
+        return result
+
+    def close(self):
+        """Close the database; a running update() stops at its next image."""
+        with self._lock:
+            self._closed = True
+            self._conn.close()
@@ -0,0 +1,388 @@
+import json
+import os
+import re
+import shutil
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from src.instrumentation import traced
+
+# Supported archive formats and their file extensions
+SHARD_FORMATS = {"tar": ".tar", "zip": ".zip"}
+
+# Bytes copied at a time from image files into a shard
+COPY_CHUNK_SIZE = 1024 * 1024
+
+TAR_BLOCK_SIZE = tarfile.BLOCKSIZE
+
+
+def sample_keys(image_paths, taken=()):
+    """
+    Build a unique webdataset key for every image.
+
+    Loaders treat everything after the first dot of a member name as its
+    extension, so dots in the file stem are replaced. Stems that would clash
+    (like "cat.png" and "cat.jpg") get a numbered suffix.
+
+    Args:
+        image_paths (list): Full paths of the images
+        taken (iterable): Keys that are already in use and must not be returned
+
+    Returns:
+        list: One key per image, in the same order
+    """
+    keys = []
+    used = set(taken)
+    for image_path in image_paths:
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        base = re.sub(r"[.\s/\\]", "_", stem) or "sample"
+        key = base
+        number = 1
+        while key in used:
+            key = f"{base}_{number}"
+            number += 1
+        used.add(key)
+        keys.append(key)
+    return keys
+
+
+def plan_shards(sizes, shard_bytes):
+    """
+    Split samples into consecutive shards of about shard_bytes each.
+
+    Args:
+        sizes (list): Size in bytes of every sample
+        shard_bytes (int): Target shard size; a single larger sample gets its own shard
+
+    Returns:
+        list: One (start, end) index range per shard
+    """
+    shards = []
+    start = 0
+    total = 0
+    for index, size in enumerate(sizes):
+        if index > start and total + size > shard_bytes:
+            shards.append((start, index))
+            start = index
+            total = 0
+        total += size
+    if start < len(sizes):
+        shards.append((start, len(sizes)))
+    return shards
+
+
+class ShardExportJob:
+    """
+    Exports the workspace as archive shards of image + caption pairs.
+
+    Every sample is stored as "<key>.<ext>" (the image) and "<key>.txt" (its
+    comma separated tags), webdataset style, in uncompressed tar or zip
+    shards of roughly shard_bytes each. Shards are written in parallel, each
+    one sequentially with large writes, under a temporary name that is
+    renamed once the shard is complete. An index.json next to the shards
+    lists the samples of every shard and, for tar shards, the byte offset
+    and size of every member, so single samples can be read without
+    scanning the archive.
+
+    Every export names its shards after its own run id, and adds them to the
+    index of the folder instead of replacing it, so batches can be exported
+    one after another into the same folder. Only shards of a cancelled run
+    are deleted again.
+
+    Like BulkTagJob the job runs in the background; callers poll done/total
+    and finished and can cancel it at any time.
+    """
+
+    def __init__(self, image_paths, dest_dir, read_tags, archive_format="tar",
+                 shard_bytes=512 * 1024 * 1024, max_workers=4):
+        """
+        Initialize the job.
+
+        Args:
+            image_paths (list): Full paths of the images to export, in order
+            dest_dir (str): Folder the shards and index are written to
+            read_tags (function): Returns the tag string of an image
+            archive_format (str): "tar" or "zip"
+            shard_bytes (int): Target size of a shard in bytes
+            max_workers (int): Number of shards written at the same time
+        """
+        if archive_format not in SHARD_FORMATS:
+            raise ValueError(f"Unknown shard format: {archive_format}")
+        self.image_paths = list(image_paths)
+        self.dest_dir = dest_dir
+        self.read_tags = read_tags
+        self.archive_format = archive_format
+        self.shard_bytes = shard_bytes
+        self.max_workers = max_workers
+        self.run_id = None
+
+        self.total = len(self.image_paths)
+        self.done = 0
+        self.exported = 0
+        self.captions = 0
+        # Index entry of every shard written
+        self.shards = []
+        # (image_path, error message) for every image that failed
+        self.errors = []
+        self.finished = False
+
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def start(self):
+        """Start exporting in the background and return immediately."""
+        self._thread = threading.Thread(target=self._run, name="amalthea-shard-export", daemon=True)
+        self._thread.start()
+        return self
+
+    def run(self):
+        """Export every image and return when done (or cancelled)."""
+        self._run()
+        return self
+
+    def cancel(self):
+        """Stop after the shards that are being written."""
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Wait for a job started with start() to finish."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.finished
+
+    def shard_name(self, number):
+        return f"dataset-{self.run_id}-{number:06d}{SHARD_FORMATS[self.archive_format]}"
+
+    def _new_run_id(self):
+        """Pick a run id (the start time) that no shard in the folder uses yet."""
+        base = time.strftime("%Y%m%d-%H%M%S")
+        names = os.listdir(self.dest_dir)
+        run_id = base
+        number = 1
+        while any(name.startswith(f"dataset-{run_id}-") for name in names):
+            number += 1
+            run_id = f"{base}-{number}"
+        return run_id
+
+    def _load_index(self):
+        """Load the index of earlier exports to the folder, or None if there is none."""
+        index_path = os.path.join(self.dest_dir, "index.json")
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get("format") != self.archive_format:
+            raise ValueError(f"The folder already holds {index.get('format')} shards, "
+                             f"export the {self.archive_format} shards to another folder")
+        return index
+
+    @traced("shard_export.run")
+    def _run(self):
+        try:
+            os.makedirs(self.dest_dir, exist_ok=True)
+            # Read before anything is written, so a broken index stops the export
+            index = self._load_index()
+            self.run_id = self._new_run_id()
+            keys = sample_keys(self.image_paths)
+            sizes = []
+            for image_path in self.image_paths:
+                try:
+                    sizes.append(os.path.getsize(image_path))
+                except OSError:
+                    sizes.append(0)
+
+            work = [(number, start, end) for number, (start, end)
+                    in enumerate(plan_shards(sizes, self.shard_bytes))]
+            with ThreadPoolExecutor(max_workers=self.max_workers,
+                                    thread_name_prefix="amalthea-shard-writer") as executor:
+                for shard in executor.map(lambda item: self._write_shard(keys, *item), work):
+                    if shard is not None:
+                        self.shards.append(shard)
+
+            if self._cancel.is_set():
+                self._remove_run_shards()
+            else:
+                self._write_index(index)
+        except Exception as e:
+            self.errors.append((self.dest_dir, str(e)))
+        finally:
+            self.finished = True
+
+    def _samples(self, keys, start, end):
+        """Yield (key, image_path, caption bytes) of a shard, skipping unreadable tags."""
+        for index in range(start, end):
+            if self._cancel.is_set():
+                return
+            image_path = self.image_paths[index]
+            try:
+                caption = self.read_tags(image_path).encode('utf-8')
+            except Exception as e:
+                self._failed(image_path, e)
+                continue
+            yield keys[index], image_path, caption
+
+    def _failed(self, image_path, error):
+        with self._lock:
+            self.errors.append((image_path, str(error)))
+            self.done += 1
+
+    @traced("shard_export.shard")
+    def _write_shard(self, keys, number, start, end):
+        """Worker: write one shard and return its index entry (None if cancelled)."""
+        if self._cancel.is_set():
+            return None
+        name = self.shard_name(number)
+        path = os.path.join(self.dest_dir, name)
+        temp_path = path + ".tmp"
+        try:
+            if self.archive_format == "tar":
+                samples = self._write_tar(temp_path, self._samples(keys, start, end))
+            else:
+                samples = self._write_zip(temp_path, self._samples(keys, start, end))
+            if self._cancel.is_set():
+                os.remove(temp_path)
+                return None
+            os.replace(temp_path, path)
+        except Exception as e:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            with self._lock:
+                for index in range(start, end):
+                    self.errors.append((self.image_paths[index], f"{name}: {str(e)}"))
+            return None
+        return {"name": name, "size": os.path.getsize(path), "samples": samples}
+
+    def _write_tar(self, path, samples):
+        """Write a tar shard directly, recording the data offset of every member."""
+        entries = []
+        with open(path, 'wb') as out:
+            for key, image_path, caption in samples:
+                position = out.tell()
+                try:
+                    with open(image_path, 'rb') as image:
+                        image_size = os.fstat(image.fileno()).st_size
+                        ext = os.path.splitext(image_path)[1].lower()
+                        image_member = self._tar_member(out, key + ext, image, image_size)
+                except Exception as e:
+                    # Drop whatever part of the member was written
+                    out.seek(position)
+                    out.truncate()
+                    self._failed(image_path, e)
+                    continue
+
+                caption_member = self._tar_member(out, key + ".txt", None, len(caption), caption)
+                entries.append({"key": key, "source": os.path.basename(image_path),
+                                "members": dict([image_member, caption_member])})
+                self._exported(caption)
+
+            # End of archive: two empty blocks
+            out.write(b"\0" * (2 * TAR_BLOCK_SIZE))
+        return entries
+
+    def _tar_member(self, out, name, fileobj, size, data=None):
+        """Append one member to a tar stream and return (name, [data offset, size])."""
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mode = 0o644
+        info.mtime = int(os.fstat(fileobj.fileno()).st_mtime) if fileobj is not None else 0
+        out.write(info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape"))
+        offset = out.tell()
+        if data is not None:
+            out.write(data)
+        else:
+            shutil.copyfileobj(fileobj, out, COPY_CHUNK_SIZE)
+        if out.tell() - offset != size:
+            raise IOError(f"{name} changed while it was exported")
+        padding = -size % TAR_BLOCK_SIZE
+        if padding:
+            out.write(b"\0" * padding)
+        return name, [offset, size]
+
+    def _write_zip(self, path, samples):
+        """Write an uncompressed zip shard."""
+        entries = []
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for key, image_path, caption in samples:
+                ext = os.path.splitext(image_path)[1].lower()
+                try:
+                    info = zipfile.ZipInfo.from_file(image_path, key + ext)
+                    info.compress_type = zipfile.ZIP_STORED
+                    with open(image_path, 'rb') as image, archive.open(info, 'w', force_zip64=True) as member:
+                        shutil.copyfileobj(image, member, COPY_CHUNK_SIZE)
+                except Exception as e:
+                    self._failed(image_path, e)
+                    continue
+
+                archive.writestr(key + ".txt", caption)
+                entries.append({"key": key, "source": os.path.basename(image_path),
+                                "members": [key + ext, key + ".txt"]})
+                self._exported(caption)
+        return entries
+
+    def _exported(self, caption):
+        with self._lock:
+            self.exported += 1
+            self.captions += bool(caption)
+            self.done += 1
+
+    def _write_index(self, index):
+        """
+        Add the shards of this run to index.json.
+
+        Args:
+            index (dict): The index of earlier exports, or None
+        """
+        shards = list(index["shards"]) if index is not None else []
+        for shard in self.shards:
+            shard["run"] = self.run_id
+        shards.extend(self.shards)
+        index = {
+            "format": self.archive_format,
+            "samples": sum(len(shard["samples"]) for shard in shards),
+            "shards": shards,
+        }
+        index_path = os.path.join(self.dest_dir, "index.json")
+        temp_path = index_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=1)
+        os.replace(temp_path, index_path)
+
+    def _remove_run_shards(self):
+        """Delete the shards this run finished before it was cancelled."""
+        for shard in self.shards:
+            try:
+                os.remove(os.path.join(self.dest_dir, shard["name"]))
+            except OSError as e:
+                print(f"Error removing shard {shard['name']}: {str(e)}")
+        self.shards = []
+
+    def summary(self, max_errors=10):
+        """
+        Build a human readable summary of the job.
+
+        Args:
+            max_errors (int): Maximum number of individual errors to list
+
+        Returns:
+            str: Summary text
+        """
+        lines = [f"Exported {self.exported} of {self.total} images ({self.captions} with tags) "
+                 f"into {len(self.shards)} {self.archive_format} shards, {len(self.errors)} failed."]
+        if self.cancelled:
+            lines.append("The export was cancelled.")
+        if self.errors:
+            lines.append("")
+            lines.append("Errors:")
+            for image_path, message in self.errors[:max_errors]:
+                lines.append(f"{os.path.basename(image_path)}: {message}")
+            if len(self.errors) > max_errors:
+                lines.append(f"... and {len(self.errors) - max_errors} more")
+        return "\n".join(lines)
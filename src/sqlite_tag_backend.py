@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import threading
+
+from src.tag_manager import SidecarBackend, parse_tags
+
+
+class SQLiteTagBackend:
+    """
+    Tag storage backend that keeps tags in a local SQLite database.
+
+    The database runs in WAL mode with an index on the tag column, and bulk
+    writes go through a single transaction. The .txt sidecar files are not
+    written on every save: changed images are marked dirty and their sidecars
+    are written by flush(), either on demand (for example before an export)
+    or periodically from a background thread when sync_interval is set.
+
+    Images that aren't in the database yet are read through from their
+    sidecar, so an existing workspace can switch backends without an import step.
+    """
+
+    def __init__(self, db_path, sync_interval=None):
+        """
+        Open (or create) the tag database.
+
+        Args:
+            db_path (str): Path of the SQLite database file
+            sync_interval (float): Seconds between background sidecar syncs,
+                or None to only write sidecars on flush()
+        """
+        self.db_path = db_path
+        self.sidecars = SidecarBackend()
+        self._lock = threading.RLock()
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                " path TEXT PRIMARY KEY,"
+                " tags TEXT,"              # NULL when the tags were deleted
+                " dirty INTEGER NOT NULL DEFAULT 0)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS image_tags ("
+                " path TEXT NOT NULL,"
+                " tag TEXT NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_image_tags_tag ON image_tags (tag)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_image_tags_path ON image_tags (path)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_images_dirty ON images (dirty) WHERE dirty = 1")
+
+        # Optional lazy background sync of the sidecar files
+        self._stop = threading.Event()
+        self._sync_thread = None
+        if sync_interval:
+            self._sync_thread = threading.Thread(target=self._sync_loop, args=(sync_interval,),
+                                                 name="amalthea-tag-sync", daemon=True)
+            self._sync_thread.start()
+
+    def _store(self, image_path, tags, dirty):
+        """Insert or replace the row of an image (inside a transaction)."""
+        key = os.path.abspath(image_path)
+        self._conn.execute("INSERT OR REPLACE INTO images (path, tags, dirty) VALUES (?, ?, ?)",
+                           (key, tags, dirty))
+        self._conn.execute("DELETE FROM image_tags WHERE path = ?", (key,))
+        if tags:
+            self._conn.executemany("INSERT INTO image_tags (path, tag) VALUES (?, ?)",
+                                   [(key, tag) for tag in dict.fromkeys(parse_tags(tags))])
+
+    def read(self, image_path):
+        """Return the tags of an image, or an empty string if it has none."""
+        with self._lock:
+            row = self._conn.execute("SELECT tags FROM images WHERE path = ?",
+                                     (os.path.abspath(image_path),)).fetchone()
+            if row is not None:
+                return row[0] or ""
+
+            # Not seen yet - read through from the sidecar and remember it
+            tags = self.sidecars.read(image_path)
+            with self._conn:
+                self._store(image_path, tags, 0)
+            return tags
+
+    def write(self, image_path, tags):
+        """Store the tags of an image."""
+        self.write_many([(image_path, tags)])
+
+    def write_many(self, items):
+        """Store the tags of several images in one transaction."""
+        with self._lock, self._conn:
+            for image_path, tags in items:
+                self._store(image_path, tags, 1)
+
+    def write_batch(self, items):
+        """Store the tags of several images as one unit (the transaction is rolled back on failure)."""
+        self.write_many(items)
+
+    def delete(self, image_path):
+        """Remove the tags of an image."""
+        with self._lock, self._conn:
+            self._store(image_path, None, 1)
+
+    def forget(self, image_paths):
+        """Remove images from the database without touching their sidecars."""
+        keys = [(os.path.abspath(image_path),) for image_path in image_paths]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM images WHERE path = ?", keys)
+            self._conn.executemany("DELETE FROM image_tags WHERE path = ?", keys)
+
+    def images_with_tag(self, tag):
+        """
+        Get the images that have a tag.
+
+        Returns:
+            list: Full paths of the images with the tag
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT path FROM image_tags WHERE tag = ?", (tag,))
+            return [row[0] for row in rows]
+
+    def tag_counts(self):
+        """
+        Get the number of images for every tag in the database.
+
+        Returns:
+            dict: Tag to image count
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT tag, COUNT(*) FROM image_tags GROUP BY tag")
+            return dict(rows)
+
+    def flush(self):
+        """Write the sidecar files of every image changed since the last flush."""
+        with self._lock:
+            rows = self._conn.execute("SELECT path, tags FROM images WHERE dirty = 1").fetchall()
+            if not rows:
+                return
+
+            synced = []
+            errors = []
+            for path, tags in rows:
+                try:
+                    if tags is None:
+                        self.sidecars.delete(path)
+                    else:
+                        self.sidecars.write(path, tags)
+                    synced.append((path,))
+                except Exception as e:
+                    errors.append(f"{os.path.basename(path)}: {str(e)}")
+
+            with self._conn:
+                self._conn.executemany("UPDATE images SET dirty = 0 WHERE path = ?", synced)
+
+        if errors:
+            raise IOError(f"{len(errors)} tag files could not be written ({errors[0]})")
+
+    def _sync_loop(self, interval):
+        """Background thread: periodically write dirty sidecars."""
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error syncing tag files: {str(e)}")
+
+    def close(self):
+        """Stop the background sync, write pending sidecars and close the database."""
+        self._stop.set()
+        if self._sync_thread is not None:
+            self._sync_thread.join()
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                self._conn.close()
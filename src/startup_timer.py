@@ -0,0 +1,124 @@
+import builtins
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Time from starting main() until the window is drawn that startup should stay within
+FIRST_PAINT_BUDGET_MS = 150
+
+
+def report_requested():
+    """Check whether a startup report was asked for (AMALTHEA_STARTUP_REPORT=1)."""
+    return os.environ.get("AMALTHEA_STARTUP_REPORT", "").lower() in ("1", "true", "yes")
+
+
+class StartupTimer:
+    """
+    Measures how long the phases of application startup take.
+
+    Phases are timed with phase() and instants are recorded with mark(),
+    both relative to when the timer was created. With profile_imports the
+    timer also records every module imported while it is enabled, with its
+    own and cumulative import time (like "python -X importtime"), so slow
+    imports that crept into startup are easy to spot.
+    """
+
+    def __init__(self, profile_imports=False):
+        """
+        Start the timer.
+
+        Args:
+            profile_imports (bool): Also time every module imported from now on
+        """
+        self.started = time.perf_counter()
+        # (name, start ms, duration ms or None for a mark)
+        self.events = []
+        # (module, self ms, cumulative ms, nesting depth) in the order imports finished
+        self.imports = []
+        self._original_import = None
+        # Per-thread stack of the imports in progress, so imports on
+        # background threads don't nest into the main thread's
+        self._import_stacks = threading.local()
+        if profile_imports:
+            self._start_import_profile()
+
+    def elapsed_ms(self):
+        """Milliseconds since the timer was started."""
+        return (time.perf_counter() - self.started) * 1000
+
+    @contextmanager
+    def phase(self, name):
+        """Time the body of a with-statement as a named phase."""
+        start = self.elapsed_ms()
+        try:
+            yield
+        finally:
+            self.events.append((name, start, self.elapsed_ms() - start))
+
+    def mark(self, name):
+        """Record that a named point of startup was reached."""
+        self.events.append((name, self.elapsed_ms(), None))
+
+    def _start_import_profile(self):
+        """Wrap __import__ to time every module that isn't imported yet."""
+        original = builtins.__import__
+        stacks = self._import_stacks
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules:
+                return original(name, globals, locals, fromlist, level)
+            stack = getattr(stacks, "stack", None)
+            if stack is None:
+                stack = stacks.stack = []
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000
+                children = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                self.imports.append((name, elapsed - children, elapsed, len(stack)))
+
+        self._original_import = original
+        builtins.__import__ = timed_import
+
+    def stop_import_profile(self):
+        """Stop timing imports (modules imported later aren't part of startup)."""
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def report(self, min_import_ms=1.0):
+        """
+        Build the startup report.
+
+        Args:
+            min_import_ms (float): Leave out imports faster than this (cumulative)
+
+        Returns:
+            str: Report text
+        """
+        lines = ["Startup timings (ms since main() started):"]
+        for name, start, duration in self.events:
+            if duration is None:
+                lines.append(f"  {start:8.1f}            {name}")
+            else:
+                lines.append(f"  {start:8.1f} +{duration:8.1f}  {name}")
+
+        painted = [start for name, start, duration in self.events if name == "window shown"]
+        if painted:
+            verdict = "within" if painted[0] <= FIRST_PAINT_BUDGET_MS else "OVER"
+            lines.append(f"Window shown after {painted[0]:.1f} ms, {verdict} the "
+                         f"{FIRST_PAINT_BUDGET_MS} ms budget.")
+
+        if self.imports:
+            lines.append("")
+            lines.append("Imports (self ms | cumulative ms | module):")
+            for name, own, cumulative, depth in self.imports:
+                if cumulative >= min_import_ms:
+                    lines.append(f"  {own:8.1f} | {cumulative:8.1f} | {'  ' * depth}{name}")
+        return "\n".join(lines)
@@ -0,0 +1,229 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.tag_manager import parse_tags, join_tags
+from src.bulk_tagger import rename_tag, merge_tags_into, remove_tags, replace_tag
+from src.instrumentation import traced
+
+# Workspace-wide tag edits and their descriptions
+TAG_EDITS = {
+    "rename": "Rename a tag",
+    "merge": "Merge several tags into one",
+    "remove": "Remove tags",
+    "replace": "Replace a tag with several tags",
+}
+
+
+def build_tag_edit(operation, tags, new_tags=()):
+    """
+    Build the mutation of a workspace-wide tag edit.
+
+    Args:
+        operation (str): One of TAG_EDITS
+        tags (list): The tags to edit (one tag for rename and replace)
+        new_tags (list): The new tag (rename, merge) or tags (replace)
+
+    Returns:
+        function: Mutation for TagEditJob
+
+    Raises:
+        ValueError: If the tags don't fit the operation
+    """
+    tags = list(tags)
+    new_tags = list(new_tags)
+    if not tags:
+        raise ValueError("No tags given")
+    if operation == "remove":
+        return remove_tags(tags)
+    if operation == "replace":
+        if len(tags) != 1 or not new_tags:
+            raise ValueError("Replace takes one tag and the tags that replace it")
+        return replace_tag(tags[0], new_tags)
+    if operation in ("rename", "merge"):
+        if len(new_tags) != 1:
+            raise ValueError(f"{operation.capitalize()} takes exactly one new tag")
+        if operation == "rename" and len(tags) != 1:
+            raise ValueError("Rename takes one tag, use merge for several")
+        if operation == "rename":
+            return rename_tag(tags[0], new_tags[0])
+        return merge_tags_into(tags, new_tags[0])
+    raise ValueError(f"Unknown tag edit: {operation}")
+
+
+class TagEditJob:
+    """
+    Rewrites the tags of many images in batches, each batch all or nothing.
+
+    Callers pass only the images that have one of the edited tags (the
+    TagIndex finds them without reading any tag files). Batches are processed
+    in parallel; each one computes the new tags of its images and stores them
+    with the backend's write_batch(), which rolls the batch back if any write
+    fails. A failed batch is reported and the other batches carry on, so a
+    job never leaves a batch half-changed. With dry_run the changes are only
+    computed.
+
+    The job runs in the background like BulkTagJob; callers poll done/total
+    and finished, and can cancel it between batches.
+    """
+
+    def __init__(self, image_paths, mutate, backend, read_tags=None, batch_size=256, max_workers=4,
+                 dry_run=False):
+        """
+        Initialize the job.
+
+        Args:
+            image_paths (list): Full paths of the images to edit
+            mutate (function): Called with the image's tag list, returns the new
+                tag list or None to leave the image unchanged
+            backend: Tag storage backend with read() and write_batch()
+            read_tags (function): Optional replacement for backend.read, for
+                example to take the current tags from a TagIndex
+            batch_size (int): Number of images written as one unit
+            max_workers (int): Number of batches processed at once
+            dry_run (bool): Only work out the changes, don't write them
+        """
+        self.image_paths = image_paths
+        self.mutate = mutate
+        self.backend = backend
+        self.read_tags = read_tags if read_tags is not None else backend.read
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.dry_run = dry_run
+
+        self.total = len(image_paths)
+        self.done = 0
+        self.unchanged = 0
+        # (image_path, new tags string) for every image that was rewritten
+        self.changes = []
+        # image_path -> tags string before the edit, for every changed image
+        self.previous = {}
+        # (image_path, error message) for every image that failed
+        self.errors = []
+        self.rolled_back = 0
+        self.finished = False
+
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def changed(self):
+        return len(self.changes)
+
+    def start(self):
+        """Start processing in the background and return immediately."""
+        self._thread = threading.Thread(target=self._run, name="amalthea-tag-edit", daemon=True)
+        self._thread.start()
+        return self
+
+    def run(self):
+        """Process every image and return when done (or cancelled)."""
+        self._run()
+        return self
+
+    def cancel(self):
+        """Stop after the batches that are already being written."""
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Wait for a job started with start() to finish."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.finished
+
+    @traced("tag_edit.run")
+    def _run(self):
+        try:
+            batches = [self.image_paths[start:start + self.batch_size]
+                       for start in range(0, len(self.image_paths), self.batch_size)]
+            with ThreadPoolExecutor(max_workers=self.max_workers,
+                                    thread_name_prefix="amalthea-tag-edit-worker") as executor:
+                # Consume the results so that unexpected errors surface here
+                for _ in executor.map(self._process_batch, batches):
+                    pass
+        except Exception as e:
+            print(f"Error editing tags: {str(e)}")
+        finally:
+            self.finished = True
+
+    @traced("tag_edit.batch")
+    def _process_batch(self, batch):
+        """Worker: compute and store the new tags of one batch of images."""
+        if self._cancel.is_set():
+            return
+        items = []
+        previous = {}
+        unchanged = 0
+        errors = []
+        for image_path in batch:
+            try:
+                tags = self.read_tags(image_path)
+                new_list = self.mutate(parse_tags(tags))
+            except Exception as e:
+                errors.append((image_path, str(e)))
+                continue
+            if new_list is None:
+                unchanged += 1
+            else:
+                new_tags = join_tags(new_list)
+                items.append((image_path, new_tags))
+                previous[image_path] = tags
+
+        rolled_back = False
+        if items and not self.dry_run:
+            try:
+                self.backend.write_batch(items)
+            except Exception as e:
+                rolled_back = True
+                errors.extend((image_path, f"Not changed, batch rolled back: {str(e)}")
+                              for image_path, _ in items)
+
+        with self._lock:
+            if not rolled_back:
+                self.changes.extend(items)
+                self.previous.update(previous)
+            else:
+                self.rolled_back += 1
+            self.unchanged += unchanged
+            self.errors.extend(errors)
+            self.done += len(batch)
+
+    def summary(self, max_errors=10, max_changes=0):
+        """
+        Build a human readable summary of the job.
+
+        Args:
+            max_errors (int): Maximum number of individual errors to list
+            max_changes (int): Maximum number of changed images to list with
+                their tags before and after
+
+        Returns:
+            str: Summary text
+        """
+        verb = "would change" if self.dry_run else "changed"
+        lines = [f"Processed {self.done} of {self.total} images: {self.changed} {verb}, "
+                 f"{self.unchanged} unchanged, {len(self.errors)} failed."]
+        if self.rolled_back:
+            lines.append(f"{self.rolled_back} batches were rolled back and left unchanged.")
+        if self.cancelled:
+            lines.append("The operation was cancelled.")
+        if max_changes and self.changes:
+            lines.append("")
+            lines.append("Changes:")
+            for image_path, new_tags in self.changes[:max_changes]:
+                lines.append(f"{os.path.basename(image_path)}: {self.previous[image_path]} -> {new_tags}")
+            if len(self.changes) > max_changes:
+                lines.append(f"... and {len(self.changes) - max_changes} more")
+        if self.errors:
+            lines.append("")
+            lines.append("Errors:")
+            for image_path, message in self.errors[:max_errors]:
+                lines.append(f"{os.path.basename(image_path)}: {message}")
+            if len(self.errors) > max_errors:
+                lines.append(f"... and {len(self.errors) - max_errors} more")
+        return "\n".join(lines)
@@ -0,0 +1,471 @@
+import re
+import threading
+from array import array
+from itertools import compress
+
+from src.tag_manager import parse_tags
+
+# Turns the "0"/"1" characters of bin() into zero/non-zero bytes for itertools.compress
+_BINARY_DIGITS = bytes.maketrans(b"01", b"\0\1")
+
+# Query tokens: parentheses, quoted tags and bare words
+_QUERY_TOKEN = re.compile(r'\(|\)|"[^"]*"|[^\s()"]+')
+QUERY_OPERATORS = ("AND", "OR", "NOT")
+
+
+def _popcount(bits):
+    """Count the set bits of a bitset."""
+    try:
+        return bits.bit_count()
+    except AttributeError:
+        return bin(bits).count("1")
+
+
+def positions_to_bits(positions, size):
+    """
+    Build a bitset with the given bits set.
+
+    Args:
+        positions (iterable): Bit numbers to set
+        size (int): Upper bound of the bit numbers
+
+    Returns:
+        int: The bitset
+    """
+    data = bytearray((size + 7) // 8)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, 'little')
+
+
+def bits_to_positions(bits):
+    """
+    List the set bits of a bitset.
+
+    Returns:
+        list: Bit numbers in ascending order
+    """
+    # bin() is the fastest way to get at the bits; reversed, digit N is bit N
+    digits = bin(bits)[:1:-1].encode('ascii').translate(_BINARY_DIGITS)
+    return list(compress(range(len(digits)), digits))
+
+
+def is_tag_query(text):
+    """Check whether a search uses the boolean tag query syntax (AND, OR, NOT or parentheses)."""
+    return any(token in QUERY_OPERATORS or token in "()" for token in _QUERY_TOKEN.findall(text))
+
+
+class TagVocabulary:
+    """
+    Interns tag strings as small integer IDs.
+
+    IDs are handed out in the order tags are first seen and are never reused,
+    so an ID stays valid for the lifetime of the vocabulary.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._tags = []
+
+    def __len__(self):
+        return len(self._tags)
+
+    def __contains__(self, tag):
+        return tag in self._ids
+
+    def intern(self, tag):
+        """Get the ID of a tag, assigning a new one if the tag wasn't seen before."""
+        tag_id = self._ids.get(tag)
+        if tag_id is None:
+            tag_id = self._ids[tag] = len(self._tags)
+            self._tags.append(tag)
+        return tag_id
+
+    def id_of(self, tag):
+        """Get the ID of a tag, or None if it was never seen."""
+        return self._ids.get(tag)
+
+    def tag_of(self, tag_id):
+        """Get the tag string of an ID."""
+        return self._tags[tag_id]
+
+
+class TagIndex:
+    """
+    In-memory index of the tags of every image in a workspace.
+
+    Tags are interned in a TagVocabulary and every image gets a position, so
+    an image's tags are a compact array of tag IDs and each tag maps to the
+    positions of the images that have it (an inverted index). For queries the
+    positions of a tag are turned into a bitset (a Python int with one bit per
+    image), which makes AND/OR/NOT over the whole workspace a handful of big
+    integer operations instead of a loop over the images. Bitsets are built
+    when a query first needs them and dropped when the tag changes.
+
+    The index is built once per workspace and must be kept current by calling
+    set_tags()/remove_image() whenever tags are saved or deleted.
+    """
+
+    def __init__(self, tag_manager):
+        """
+        Initialize an empty index.
+
+        Args:
+            tag_manager (TagManager): Used to read the tags when building the index
+        """
+        self.tag_manager = tag_manager
+        self._lock = threading.RLock()
+        self.clear()
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, image_path):
+        return image_path in self._positions
+
+    @property
+    def vocabulary(self):
+        """The TagVocabulary the tag IDs refer to."""
+        return self._vocabulary
+
+    def build(self, images):
+        """
+        (Re)build the index by reading the tags of every image once.
+
+        Args:
+            images (list): Full paths of the workspace images
+        """
+        with self._lock:
+            self.clear()
+            for image_path in images:
+                self.set_tags(image_path, self.tag_manager.load_tags(image_path))
+
+    def clear(self):
+        """Remove every image from the index."""
+        with self._lock:
+            self._vocabulary = TagVocabulary()
+            # Image path by position (None for a freed position) and position by path
+            self._paths = []
+            self._positions = {}
+            self._free = []
+            # Bitset of the freed positions
+            self._free_bits = 0
+            # Tag IDs of the image at each position, in file order
+            self._image_tags = []
+            # Tag ID to the set of positions of the images that have it
+            self._postings = {}
+            # Tag ID to bitset, and the bitset of every indexed image, built on demand
+            self._bits = {}
+            self._all_bits = None
+
+    def set_tags(self, image_path, tags):
+        """
+        Record the tags of an image, replacing any previous ones.
+
+        Args:
+            image_path (str): Full path to the image file
+            tags (str or list): Comma separated tag string or list of tags
+        """
+        tags_list = parse_tags(tags) if isinstance(tags, str) else list(tags)
+        with self._lock:
+            position = self._positions.get(image_path)
+            if position is None:
+                position = self._add_image(image_path)
+            else:
+                self._unlink(position)
+            tag_ids = array('I', (self._vocabulary.intern(tag) for tag in tags_list))
+            self._image_tags[position] = tag_ids
+            for tag_id in tag_ids:
+                self._postings.setdefault(tag_id, set()).add(position)
+                self._bits.pop(tag_id, None)
+
+    def remove_image(self, image_path):
+        """Remove an image (for example because its file was deleted)."""
+        with self._lock:
+            position = self._positions.pop(image_path, None)
+            if position is None:
+                return
+            self._unlink(position)
+            self._paths[position] = None
+            self._image_tags[position] = None
+            self._free.append(position)
+            self._free_bits |= 1 << position
+            self._all_bits = None
+
+    def _add_image(self, image_path):
+        """Give a new image a position, reusing the position of a removed image if possible."""
+        if self._free:
+            position = self._free.pop()
+            self._free_bits &= ~(1 << position)
+            self._paths[position] = image_path
+        else:
+            position = len(self._paths)
+            self._paths.append(image_path)
+            self._image_tags.append(None)
+        self._positions[image_path] = position
+        self._all_bits = None
+        return position
+
+    def _unlink(self, position):
+        """Remove an image from the postings of its current tags."""
+        for tag_id in self._image_tags[position] or ():
+            postings = self._postings.get(tag_id)
+            if postings is not None:
+                postings.discard(position)
+                self._bits.pop(tag_id, None)
+                if not postings:
+                    del self._postings[tag_id]
+
+    def get_tags(self, image_path):
+        """
+        Get the tags of an image.
+
+        Returns:
+            list: The image's tags in file order (empty if it has none)
+        """
+        with self._lock:
+            position = self._positions.get(image_path)
+            if position is None:
+                return []
+            tag_of = self._vocabulary.tag_of
+            return [tag_of(tag_id) for tag_id in self._image_tags[position]]
+
+    def _postings_of(self, tag):
+        tag_id = self._vocabulary.id_of(tag)
+        return self._postings.get(tag_id, ()) if tag_id is not None else ()
+
+    def has_tag(self, image_path, tag):
+        """Check whether an image has a tag."""
+        with self._lock:
+            return self._positions.get(image_path) in self._postings_of(tag)
+
+    def images_with(self, tag):
+        """
+        Get the images that have a tag.
+
+        Returns:
+            set: Full paths of the images with the tag
+        """
+        with self._lock:
+            paths = self._paths
+            return {paths[position] for position in self._postings_of(tag)}
+
+    def images_with_any(self, tags):
+        """
+        Get the images that have at least one of several tags.
+
+        Returns:
+            set: Full paths of the images with any of the tags
+        """
+        with self._lock:
+            bits = 0
+            for tag in tags:
+                bits |= self.tag_bits(tag)
+            paths = self._paths
+            return {paths[position] for position in bits_to_positions(bits)}
+
+    def images_without(self, tag, images=None):
+        """
+        Get the images that don't have a tag.
+
+        Args:
+            tag (str): The tag to test for
+            images (list): Images to filter, defaults to every indexed image
+
+        Returns:
+            list: Full paths of the images without the tag, in the given order
+        """
+        with self._lock:
+            tagged = self._postings_of(tag)
+            positions = self._positions
+            if images is None:
+                images = positions
+            return [image_path for image_path in images if positions.get(image_path) not in tagged]
+
+    def tag_count(self, tag):
+        """Get the number of images that have a tag."""
+        with self._lock:
+            return len(self._postings_of(tag))
+
+    def tag_counts(self):
+        """
+        Get the number of images for every tag in the workspace.
+
+        Returns:
+            dict: Tag to image count
+        """
+        with self._lock:
+            tag_of = self._vocabulary.tag_of
+            return {tag_of(tag_id): len(positions) for tag_id, positions in self._postings.items()}
+
+    def co_occurrence(self, tag, limit=None):
+        """
+        Count how often other tags appear on the images that have a tag.
+
+        Args:
+            tag (str): The tag to start from
+            limit (int): Return only this many of the most frequent tags
+
+        Returns:
+            list: (tag, image count) pairs, most frequent first
+        """
+        with self._lock:
+            tag_id = self._vocabulary.id_of(tag)
+            if tag_id is None or tag_id not in self._postings:
+                return []
+            bits = self._bits_of(tag_id)
+            counts = {}
+            for other in self._postings:
+                if other != tag_id:
+                    count = _popcount(bits & self._bits_of(other))
+                    if count:
+                        counts[other] = count
+            tag_of = self._vocabulary.tag_of
+            ranked = sorted(((tag_of(other), count) for other, count in counts.items()),
+                            key=lambda item: (-item[1], item[0]))
+            return ranked[:limit] if limit is not None else ranked
+
+    def tag_bits(self, tag):
+        """
+        Get the bitset of the images that have a tag.
+
+        Returns:
+            int: Bit N is set if the image at position N has the tag
+        """
+        with self._lock:
+            tag_id = self._vocabulary.id_of(tag)
+            if tag_id is None or tag_id not in self._postings:
+                return 0
+            return self._bits_of(tag_id)
+
+    def _bits_of(self, tag_id):
+        """Get (building it if needed) the bitset of a tag ID that has postings."""
+        bits = self._bits.get(tag_id)
+        if bits is None:
+            bits = self._bits[tag_id] = positions_to_bits(self._postings[tag_id], len(self._paths))
+        return bits
+
+    def all_bits(self):
+        """Get the bitset of every indexed image."""
+        with self._lock:
+            if self._all_bits is None:
+                self._all_bits = ((1 << len(self._paths)) - 1) & ~self._free_bits
+            return self._all_bits
+
+    def paths_of(self, bits, images=None):
+        """
+        Turn a bitset into image paths.
+
+        Args:
+            bits (int): Bitset of image positions
+            images (list): Return the matches in the order of this list instead
+                of position order, leaving out images that aren't in it
+
+        Returns:
+            list: Full paths of the images in the bitset
+        """
+        with self._lock:
+            matched = bits_to_positions(bits)
+            if images is None:
+                paths = self._paths
+                return [paths[position] for position in matched]
+            matched = set(matched)
+            positions = self._positions
+            return [image_path for image_path in images if positions.get(image_path) in matched]
+
+    def query_bits(self, expression):
+        """
+        Evaluate a boolean tag query to a bitset.
+
+        Tags are combined with AND, OR and NOT (upper case) and grouped with
+        parentheses; NOT binds tightest, then AND, then OR. Words between
+        operators form one tag, so "long hair AND NOT blue eyes" works, and a
+        tag can also be quoted. Tags that no image has match nothing.
+
+        Args:
+            expression (str): e.g. 'cat AND (dog OR "red hat") AND NOT sketch'
+
+        Returns:
+            int: Bitset of the matching images
+
+        Raises:
+            ValueError: If the query is empty or malformed
+        """
+        tokens = []
+        words = []
+        for token in _QUERY_TOKEN.findall(expression):
+            if token in QUERY_OPERATORS or token in "()":
+                if words:
+                    tokens.append(("tag", " ".join(words)))
+                    words = []
+                tokens.append((token, None))
+            elif token.startswith('"'):
+                if words:
+                    tokens.append(("tag", " ".join(words)))
+                    words = []
+                tokens.append(("tag", token.strip('"').strip()))
+            else:
+                words.append(token)
+        if words:
+            tokens.append(("tag", " ".join(words)))
+        if not tokens:
+            raise ValueError("Empty tag query")
+
+        with self._lock:
+            bits, end = self._parse_or(tokens, 0)
+        if end != len(tokens):
+            raise ValueError(f"Unexpected '{tokens[end][1] or tokens[end][0]}' in tag query")
+        return bits
+
+    def _parse_or(self, tokens, index):
+        bits, index = self._parse_and(tokens, index)
+        while index < len(tokens) and tokens[index][0] == "OR":
+            right, index = self._parse_and(tokens, index + 1)
+            bits |= right
+        return bits, index
+
+    def _parse_and(self, tokens, index):
+        bits, index = self._parse_not(tokens, index)
+        while index < len(tokens) and tokens[index][0] == "AND":
+            right, index = self._parse_not(tokens, index + 1)
+            bits &= right
+        return bits, index
+
+    def _parse_not(self, tokens, index):
+        if index < len(tokens) and tokens[index][0] == "NOT":
+            bits, index = self._parse_not(tokens, index + 1)
+            return self.all_bits() & ~bits, index
+        return self._parse_atom(tokens, index)
+
+    def _parse_atom(self, tokens, index):
+        if index >= len(tokens):
+            raise ValueError("Tag query ends unexpectedly")
+        kind, value = tokens[index]
+        if kind == "tag":
+            return self.tag_bits(value), index + 1
+        if kind == "(":
+            bits, index = self._parse_or(tokens, index + 1)
+            if index >= len(tokens) or tokens[index][0] != ")":
+                raise ValueError("Missing ')' in tag query")
+            return bits, index + 1
+        raise ValueError(f"Unexpected '{kind}' in tag query")
+
+    def query(self, expression, images=None):
+        """
+        Find the images that match a boolean tag query (see query_bits()).
+
+        Args:
+            expression (str): The query
+            images (list): Return the matches in the order of this list
+
+        Returns:
+            list: Full paths of the matching images
+
+        Raises:
+            ValueError: If the query is empty or malformed
+        """
+        return self.paths_of(self.query_bits(expression), images)
+
+    def query_count(self, expression):
+        """Count the images that match a boolean tag query (see query_bits())."""
+        return _popcount(self.query_bits(expression))
@@ -0,0 +1,250 @@
+import json
+import os
+import threading
+
+# Journal size after which it is truncated once everything is applied
+JOURNAL_TRUNCATE_BYTES = 4 * 1024 * 1024
+
+
+class JournaledBackend:
+    """
+    Write-behind layer in front of another tag storage backend.
+
+    Tag changes are appended to a journal file and acknowledged immediately;
+    reads see them at once. A background thread then commits them in groups:
+    one fsync of the journal makes the whole group durable, after which the
+    changes are applied to the wrapped backend (for tag files that is a temp
+    file + os.replace per image, so no file is ever left half-written).
+
+    Replaying the journal is idempotent, so it is only truncated once it grows
+    large and the applied tag files have been synced to disk. On startup any
+    changes left in the journal by a crash are replayed.
+    """
+
+    def __init__(self, inner, journal_path, batch_size=256, flush_interval=0.5):
+        """
+        Open the journal, replaying changes a previous session didn't apply.
+
+        Args:
+            inner: The tag storage backend the changes are applied to
+            journal_path (str): Path of the journal file
+            batch_size (int): Number of pending changes that triggers a commit
+            flush_interval (float): Maximum seconds a change waits before it is committed
+        """
+        self.inner = inner
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # image_path -> tags, or None for a delete
+        self._pending = {}
+        self._applying = {}
+        self._errors = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # Reentrant so write_batch() can commit while holding it
+        self._commit_lock = threading.RLock()
+        self._closed = False
+
+        self._replay()
+        self._journal = open(journal_path, 'a', encoding='utf-8')
+
+        self._thread = threading.Thread(target=self._commit_loop, name="amalthea-tag-journal", daemon=True)
+        self._thread.start()
+
+    def _replay(self):
+        """Apply changes left in the journal by a previous session."""
+        if not os.path.exists(self.journal_path):
+            return
+
+        changes = {}
+        with open(self.journal_path, 'r', encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A crash can leave the last line incomplete
+                    break
+                if entry.get("forget"):
+                    # The image was removed from the workspace after these changes
+                    changes.pop(entry["path"], None)
+                else:
+                    changes[entry["path"]] = entry["tags"]
+
+        if changes:
+            print(f"Replaying {len(changes)} journaled tag changes")
+            self._apply(changes)
+            _sync_filesystem()
+
+        if self._errors:
+            # Keep only the failed changes so they are retried next time
+            print(f"Error replaying tag journal: {self._errors[0][1]}")
+            temp_path = self.journal_path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as journal:
+                for image_path, _ in self._errors:
+                    journal.write(json.dumps({"path": image_path, "tags": changes[image_path]}) + "\n")
+            os.replace(temp_path, self.journal_path)
+            self._errors = []
+        else:
+            os.remove(self.journal_path)
+
+    def _append(self, items):
+        """Journal a group of changes and make them visible to readers."""
+        with self._lock:
+            if self._closed:
+                raise IOError("tag journal is closed")
+            for image_path, tags in items:
+                self._journal.write(json.dumps({"path": image_path, "tags": tags}) + "\n")
+                self._pending[image_path] = tags
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+
+    def read(self, image_path):
+        """Return the tags of an image, including changes not committed yet."""
+        with self._lock:
+            for changes in (self._pending, self._applying):
+                if image_path in changes:
+                    return changes[image_path] or ""
+        return self.inner.read(image_path)
+
+    def write(self, image_path, tags):
+        """Journal new tags for an image."""
+        self._append([(image_path, tags)])
+
+    def write_many(self, items):
+        """Journal new tags for several images."""
+        self._append(items)
+
+    def write_batch(self, items):
+        """
+        Store the tags of several images as one unit.
+
+        Changes already journaled are committed first, then the batch is
+        written straight to the wrapped backend, which changes every image
+        of the batch or none of them. Once it succeeded the batch is added to
+        the journal too: older journal entries of the same images would
+        otherwise undo it when the journal is replayed after a crash.
+
+        The commit lock is held throughout, so the background commit can't
+        apply another change of the same images halfway through the batch.
+        """
+        with self._commit_lock:
+            self._commit()
+            self.inner.write_batch(items)
+            with self._lock:
+                if self._closed:
+                    # close() empties the journal, nothing left to supersede
+                    return
+                for image_path, tags in items:
+                    # A change made while the batch was written is newer and stays last
+                    if image_path not in self._pending:
+                        self._journal.write(json.dumps({"path": image_path, "tags": tags}) + "\n")
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+
+    def delete(self, image_path):
+        """Journal the removal of an image's tags."""
+        self._append([(image_path, None)])
+
+    def forget(self, image_paths):
+        """
+        Drop pending changes and stored state of removed images.
+
+        A tombstone is journaled for every image, so replaying the journal
+        after a crash doesn't recreate the tag files of removed images.
+        """
+        with self._lock:
+            for image_path in image_paths:
+                self._pending.pop(image_path, None)
+                if not self._closed:
+                    self._journal.write(json.dumps({"path": image_path, "forget": True}) + "\n")
+            if not self._closed:
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+        self.inner.forget(image_paths)
+
+    def _apply(self, changes):
+        """Apply committed changes to the wrapped backend."""
+        for image_path, tags in changes.items():
+            try:
+                if tags is None:
+                    self.inner.delete(image_path)
+                else:
+                    self.inner.write(image_path, tags)
+            except Exception as e:
+                print(f"Error applying tag change for {os.path.basename(image_path)}: {str(e)}")
+                self._errors.append((image_path, str(e)))
+
+    def _commit(self):
+        """Commit every pending change as one group."""
+        with self._commit_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                self._applying, self._pending = self._pending, {}
+
+            try:
+                with self._lock:
+                    self._journal.flush()
+                # One fsync makes the whole group durable
+                os.fsync(self._journal.fileno())
+                self._apply(self._applying)
+            except Exception:
+                with self._lock:
+                    # Retry the group with the next commit; changes made meanwhile are newer
+                    self._applying.update(self._pending)
+                    self._pending, self._applying = self._applying, {}
+                raise
+
+            with self._lock:
+                self._applying = {}
+                if (not self._pending and not self._errors
+                        and self._journal.tell() > JOURNAL_TRUNCATE_BYTES):
+                    _sync_filesystem()
+                    self._journal.seek(0)
+                    self._journal.truncate()
+
+    def _commit_loop(self):
+        """Background thread: commit pending changes in groups."""
+        while True:
+            with self._lock:
+                if not self._closed and len(self._pending) < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self._commit()
+            except Exception as e:
+                print(f"Error committing tag changes: {str(e)}")
+
+    def flush(self):
+        """Commit every pending change and bring the tag files up to date."""
+        self._commit()
+        self.inner.flush()
+        if self._errors:
+            errors, self._errors = self._errors, []
+            raise IOError(f"{len(errors)} tag changes could not be applied "
+                          f"({os.path.basename(errors[0][0])}: {errors[0][1]})")
+
+    def close(self):
+        """Commit pending changes, clear the journal and close the wrapped backend."""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        self._thread.join()
+
+        try:
+            self._commit()
+            if not self._errors:
+                _sync_filesystem()
+                self._journal.seek(0)
+                self._journal.truncate()
+        finally:
+            self._journal.close()
+            self.inner.close()
+
+
+def _sync_filesystem():
+    """Flush written files to disk where the platform allows it."""
+    if hasattr(os, 'sync'):
+        os.sync()
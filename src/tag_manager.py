@@ -1,18 +1,217 @@
 import os
+import stat
+import tempfile
+
+from src.instrumentation import tracer
+
+# Permissions of new tag files (rw-r--r--)
+NEW_TAG_FILE_MODE = 0o644
+
+
+def parse_tags(tags):
+    """
+    Split a comma separated tag string into a list of tags.
+
+    Args:
+        tags (str): String containing comma separated tags
+
+    Returns:
+        list: The non-empty tags, stripped of surrounding whitespace
+    """
+    return [t.strip() for t in tags.split(',') if t.strip()]
+
+
+def join_tags(tags_list):
+    """
+    Join a list of tags into the comma separated form used in tag files.
+
+    Args:
+        tags_list (list): List of tags
+
+    Returns:
+        str: The tags separated by ", "
+    """
+    return ', '.join(tags_list)
+
+
+def get_tag_file_path(image_path):
+    """
+    Get the path of the text file that holds an image's tags.
+
+    Args:
+        image_path (str): Full path to the image file
+
+    Returns:
+        str: Full path to the .txt file next to the image
+    """
+    # Get the directory and filename without extension
+    dir_name = os.path.dirname(image_path)
+    base_name = os.path.basename(image_path)
+    file_name, _ = os.path.splitext(base_name)
+
+    # Create the path for the tag file
+    return os.path.join(dir_name, f"{file_name}.txt")
+
+
+class SidecarBackend:
+    """
+    Tag storage backend that keeps the tags of each image in a .txt file
+    with the same name as the image.
+
+    Backends raise exceptions on failure; TagManager turns them into return values.
+    """
+
+    def read(self, image_path):
+        """Return the tags of an image, or an empty string if it has none."""
+        tag_file_path = get_tag_file_path(image_path)
+
+        # Check if the tag file exists
+        if not os.path.exists(tag_file_path):
+            return ""
+
+        with open(tag_file_path, 'r', encoding='utf-8') as tag_file:
+            return tag_file.read()
+
+    def write(self, image_path, tags):
+        """
+        Store the tags of an image.
+
+        The tags are written to a temporary file that then replaces the tag
+        file, so a crash never leaves a half-written tag file behind. Every
+        write gets its own temporary file, as images with the same name
+        (a.png, a.jpg) share a tag file and may be written at the same time.
+        """
+        tag_file_path = get_tag_file_path(image_path)
+        temp_path = self._write_temp(tag_file_path, tags)
+        try:
+            os.replace(temp_path, tag_file_path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def write_many(self, items):
+        """Store the tags of several images, given as (image_path, tags) pairs."""
+        for image_path, tags in items:
+            self.write(image_path, tags)
+
+    def write_batch(self, items):
+        """
+        Store the tags of several images as one unit.
+
+        Every new tag file is written to a temporary file first, and only when
+        all of them were written are they moved into place. If anything fails
+        the temporary files are removed and tag files that were already
+        replaced get their previous contents back, so either every image of
+        the batch is changed or none is. Images that share a tag file (same
+        name, different extension) get the tags of the last of them.
+
+        Args:
+            items (list): (image_path, tags) pairs
+        """
+        # tag file path -> tags, the last item for a tag file wins
+        batch = {}
+        for image_path, tags in items:
+            batch[get_tag_file_path(image_path)] = tags
+
+        # tag file path -> previous contents, or None if there was no tag file
+        originals = {}
+        # (temp path, tag file path) for every written temporary file
+        temp_paths = []
+        replaced = []
+        try:
+            for tag_file_path, tags in batch.items():
+                if os.path.exists(tag_file_path):
+                    with open(tag_file_path, 'r', encoding='utf-8') as tag_file:
+                        originals[tag_file_path] = tag_file.read()
+                else:
+                    originals[tag_file_path] = None
+                temp_paths.append((self._write_temp(tag_file_path, tags), tag_file_path))
+
+            for temp_path, tag_file_path in temp_paths:
+                os.replace(temp_path, tag_file_path)
+                replaced.append(tag_file_path)
+        except Exception:
+            for temp_path, _ in temp_paths[len(replaced):]:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            for tag_file_path in replaced:
+                try:
+                    if originals[tag_file_path] is None:
+                        os.remove(tag_file_path)
+                    else:
+                        os.replace(self._write_temp(tag_file_path, originals[tag_file_path]), tag_file_path)
+                except OSError as e:
+                    print(f"Error rolling back {os.path.basename(tag_file_path)}: {str(e)}")
+            raise
+
+    def _write_temp(self, tag_file_path, contents):
+        """
+        Write the contents of a tag file to a new temporary file next to it.
+
+        Args:
+            tag_file_path (str): The tag file the contents are meant for
+            contents (str): Tag string to write
+
+        Returns:
+            str: Path of the temporary file, unique even when several writers
+                target the same tag file
+        """
+        directory, name = os.path.split(tag_file_path)
+        fd, temp_path = tempfile.mkstemp(dir=directory or None, prefix=name + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as tag_file:
+                tag_file.write(contents)
+            # mkstemp creates the file private to the user, keep the usual tag file mode
+            try:
+                mode = stat.S_IMODE(os.stat(tag_file_path).st_mode)
+            except FileNotFoundError:
+                mode = NEW_TAG_FILE_MODE
+            os.chmod(temp_path, mode)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        return temp_path
+
+    def delete(self, image_path):
+        """Remove the tags of an image."""
+        tag_file_path = get_tag_file_path(image_path)
+        if os.path.exists(tag_file_path):
+            os.remove(tag_file_path)
+
+    def forget(self, image_paths):
+        """Drop any state kept for images whose files were removed."""
+        pass
+
+    def flush(self):
+        """Make sure every tag file on disk is up to date (always true here)."""
+        pass
+
+    def close(self):
+        """Release any resources held by the backend."""
+        pass
+
 
 class TagManager:
     """
     Manages saving and loading tags for images.
-    Tags are stored in text files with the same name as the image but with a .txt extension.
+    By default tags are stored in text files with the same name as the image but with a .txt extension.
+    Other storage backends (see SQLiteTagBackend) can be plugged in without changing this API.
     """
     
-    def __init__(self):
-        """Initialize the TagManager."""
-        pass
+    def __init__(self, backend=None):
+        """
+        Initialize the TagManager.
+        
+        Args:
+            backend: Tag storage backend, defaults to a SidecarBackend
+        """
+        self.backend = backend if backend is not None else SidecarBackend()
         
     def save_tags(self, image_path, tags):
         """
-        Save tags for an image to a corresponding text file.
+        Save tags for an image.
         
         Args:
             image_path (str): Full path to the image file
@@ -22,18 +221,29 @@ class TagManager:
             bool: True if tags were saved successfully, False otherwise
         """
         try:
-            # Get the directory and filename without extension
-            dir_name = os.path.dirname(image_path)
-            base_name = os.path.basename(image_path)
-            file_name, _ = os.path.splitext(base_name)
+            with tracer.span("tags.save"):
+                self.backend.write(image_path, tags)
+            return True
             
-            # Create the path for the tag file
-            tag_file_path = os.path.join(dir_name, f"{file_name}.txt")
+        except Exception as e:
+            print(f"Error saving tags: {str(e)}")
+            return False
             
-            # Save the tags
-            with open(tag_file_path, 'w', encoding='utf-8') as tag_file:
-                tag_file.write(tags)
-                
+    def save_many(self, items):
+        """
+        Save tags for several images at once.
+        
+        Backends that support it store the whole batch in a single transaction.
+        
+        Args:
+            items (list): List of (image_path, tags) pairs
+            
+        Returns:
+            bool: True if all tags were saved successfully, False otherwise
+        """
+        try:
+            with tracer.span("tags.save_many", images=len(items)):
+                self.backend.write_many(items)
             return True
             
         except Exception as e:
@@ -42,7 +252,7 @@ class TagManager:
             
     def load_tags(self, image_path):
         """
-        Load tags for an image from a corresponding text file.
+        Load tags for an image.
         
         Args:
             image_path (str): Full path to the image file
@@ -51,21 +261,8 @@ class TagManager:
             str: String containing the tags, or empty string if no tags found
         """
         try:
-            # Get the directory and filename without extension
-            dir_name = os.path.dirname(image_path)
-            base_name = os.path.basename(image_path)
-            file_name, _ = os.path.splitext(base_name)
-            
-            # Create the path for the tag file
-            tag_file_path = os.path.join(dir_name, f"{file_name}.txt")
-            
-            # Check if the tag file exists
-            if not os.path.exists(tag_file_path):
-                return ""
-                
-            # Load the tags
-            with open(tag_file_path, 'r', encoding='utf-8') as tag_file:
-                return tag_file.read()
+            with tracer.span("tags.load"):
+                return self.backend.read(image_path)
                 
         except Exception as e:
             print(f"Error loading tags: {str(e)}")
@@ -73,7 +270,7 @@ class TagManager:
             
     def delete_tags(self, image_path):
         """
-        Delete tags for an image by removing the corresponding text file.
+        Delete tags for an image.
         
         Args:
             image_path (str): Full path to the image file
@@ -82,22 +279,47 @@ class TagManager:
             bool: True if tags were deleted successfully, False otherwise
         """
         try:
-            # Get the directory and filename without extension
-            dir_name = os.path.dirname(image_path)
-            base_name = os.path.basename(image_path)
-            file_name, _ = os.path.splitext(base_name)
+            with tracer.span("tags.delete"):
+                self.backend.delete(image_path)
+            return True
             
-            # Create the path for the tag file
-            tag_file_path = os.path.join(dir_name, f"{file_name}.txt")
+        except Exception as e:
+            print(f"Error deleting tags: {str(e)}")
+            return False
             
-            # Check if the tag file exists
-            if not os.path.exists(tag_file_path):
-                return True
-                
-            # Delete the tag file
-            os.remove(tag_file_path)
+    def forget_images(self, image_paths):
+        """
+        Drop stored tags of images that were removed from the workspace.
+        
+        Tag files on disk are not touched.
+        
+        Args:
+            image_paths (list): Full paths of the removed images
+        """
+        try:
+            self.backend.forget(image_paths)
+        except Exception as e:
+            print(f"Error forgetting tags: {str(e)}")
+            
+    def flush(self):
+        """
+        Bring the .txt tag files on disk up to date with the backend.
+        
+        Returns:
+            bool: True if the tag files were written successfully, False otherwise
+        """
+        try:
+            with tracer.span("tags.flush"):
+                self.backend.flush()
             return True
             
         except Exception as e:
-            print(f"Error deleting tags: {str(e)}")
-            return False
\ No newline at end of file
+            print(f"Error writing tag files: {str(e)}")
+            return False
+            
+    def close(self):
+        """Flush pending tag files and release the storage backend."""
+        try:
+            self.backend.close()
+        except Exception as e:
+            print(f"Error closing tag storage: {str(e)}")
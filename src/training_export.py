@@ -0,0 +1,319 @@
+import json
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+from src.shard_export import sample_keys
+from src.instrumentation import traced
+
+# Output formats: PIL format name and file extension
+TRAINING_FORMATS = {"jpeg": ("JPEG", ".jpg"), "webp": ("WEBP", ".webp")}
+
+EXIF_ORIENTATION = 0x0112
+
+
+def make_buckets(resolution=1024, step=64, max_ratio=2.0):
+    """
+    Build the aspect-ratio buckets for a training resolution.
+
+    Every bucket has sides that are multiples of step and an area of at most
+    resolution x resolution, from square up to max_ratio:1 in both
+    orientations.
+
+    Args:
+        resolution (int): Side of the square bucket
+        step (int): Bucket sides are multiples of this
+        max_ratio (float): Largest long side / short side ratio
+
+    Returns:
+        list: Sorted (width, height) tuples
+    """
+    area = resolution * resolution
+    buckets = set()
+    width = resolution
+    while True:
+        height = (area // width) // step * step
+        if height <= 0 or width / height > max_ratio:
+            break
+        buckets.add((width, height))
+        buckets.add((height, width))
+        width += step
+    return sorted(buckets)
+
+
+def choose_bucket(size, buckets):
+    """
+    Pick the bucket whose aspect ratio is closest to an image's.
+
+    Args:
+        size (tuple): Image (width, height)
+        buckets (list): (width, height) tuples from make_buckets()
+
+    Returns:
+        tuple: The chosen (width, height)
+    """
+    aspect = math.log(size[0] / size[1])
+    return min(buckets, key=lambda bucket: abs(math.log(bucket[0] / bucket[1]) - aspect))
+
+
+def export_training_image(task):
+    """
+    Worker process: resize, crop and transcode one image into its bucket folder.
+
+    The image is scaled to cover the bucket and center-cropped in a single
+    resize. JPEGs are decoded at a reduced DCT scale when they are much
+    larger than the bucket. Transparent images are flattened onto white.
+
+    Args:
+        task (tuple): (image_path, dest_dir, key, caption, buckets, image_format, quality)
+
+    Returns:
+        tuple: (key, bucket name or None, error message or None)
+    """
+    image_path, dest_dir, key, caption, buckets, image_format, quality = task
+    try:
+        with Image.open(image_path) as pil_image:
+            # Choose by the displayed shape, but decode before rotating it
+            rotated = pil_image.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8)
+            size = pil_image.size[::-1] if rotated else pil_image.size
+            bucket = choose_bucket(size, buckets)
+
+            if pil_image.format == 'JPEG':
+                # Smallest DCT scale that still covers the bucket
+                pil_image.draft('RGB', bucket[::-1] if rotated else bucket)
+            pil_image = _to_rgb(ImageOps.exif_transpose(pil_image))
+
+            width, height = pil_image.size
+            scale = max(bucket[0] / width, bucket[1] / height)
+            crop_width, crop_height = min(width, bucket[0] / scale), min(height, bucket[1] / scale)
+            left, top = (width - crop_width) / 2, (height - crop_height) / 2
+            output = pil_image.resize(bucket, Image.LANCZOS,
+                                      box=(left, top, left + crop_width, top + crop_height),
+                                      reducing_gap=3.0)
+
+        bucket_name = f"{bucket[0]}x{bucket[1]}"
+        bucket_dir = os.path.join(dest_dir, bucket_name)
+        os.makedirs(bucket_dir, exist_ok=True)
+
+        pil_format, ext = TRAINING_FORMATS[image_format]
+        image_out = os.path.join(bucket_dir, key + ext)
+        output.save(image_out + ".tmp", pil_format, quality=quality)
+        os.replace(image_out + ".tmp", image_out)
+
+        caption_out = os.path.join(bucket_dir, key + ".txt")
+        with open(caption_out + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(caption)
+        os.replace(caption_out + ".tmp", caption_out)
+        return key, bucket_name, None
+    except Exception as e:
+        return key, None, str(e)
+
+
+def _to_rgb(pil_image):
+    """Convert an image to RGB, flattening any transparency onto white."""
+    if pil_image.mode == 'RGB':
+        return pil_image
+    if pil_image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in pil_image.info:
+        pil_image = pil_image.convert('RGBA')
+        background = Image.new('RGB', pil_image.size, (255, 255, 255))
+        background.paste(pil_image, mask=pil_image.getchannel('A'))
+        return background
+    return pil_image.convert('RGB')
+
+
+class TrainingExportJob:
+    """
+    Exports the workspace as a training-ready dataset in one pass.
+
+    Every image is resized and center-cropped to the aspect-ratio bucket
+    closest to its shape, converted to RGB JPEG or WebP and written with its
+    caption into a folder per bucket ("1024x768/<key>.jpg" and
+    "1024x768/<key>.txt"). The decoding and encoding are CPU bound, so they
+    run on a process pool across all cores rather than on threads. A
+    buckets.json in the destination lists the samples of every bucket.
+
+    Exporting into a folder that already holds a training set adds to it:
+    new samples get keys that aren't in its buckets.json yet and are merged
+    into it, so batches can be exported one after another into one folder.
+
+    Like BulkTagJob the job runs in the background; callers poll done/total
+    and finished and can cancel it at any time.
+    """
+
+    def __init__(self, image_paths, dest_dir, read_tags, resolution=1024, image_format="jpeg",
+                 quality=90, max_workers=None, max_in_flight=None):
+        """
+        Initialize the job.
+
+        Args:
+            image_paths (list): Full paths of the images to export
+            dest_dir (str): Folder the bucket folders are written to
+            read_tags (function): Returns the tag string of an image
+            resolution (int): Side of the square bucket; other buckets have the same area
+            image_format (str): "jpeg" or "webp"
+            quality (int): Encoder quality
+            max_workers (int): Number of worker processes, defaults to the number of CPUs
+            max_in_flight (int): Maximum number of images queued for the workers
+        """
+        if image_format not in TRAINING_FORMATS:
+            raise ValueError(f"Unknown training image format: {image_format}")
+        self.image_paths = list(image_paths)
+        self.dest_dir = dest_dir
+        self.read_tags = read_tags
+        self.resolution = resolution
+        self.image_format = image_format
+        self.quality = quality
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or self.max_workers * 4
+
+        self.total = len(self.image_paths)
+        self.done = 0
+        # Bucket name -> keys of the samples in it, from this run
+        self.buckets = {}
+        # (image_path, error message) for every image that failed
+        self.errors = []
+        self.finished = False
+
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def exported(self):
+        return sum(len(keys) for keys in self.buckets.values())
+
+    def start(self):
+        """Start exporting in the background and return immediately."""
+        self._thread = threading.Thread(target=self._run, name="amalthea-training-export", daemon=True)
+        self._thread.start()
+        return self
+
+    def run(self):
+        """Export every image and return when done (or cancelled)."""
+        self._run()
+        return self
+
+    def cancel(self):
+        """Stop after the images that are already queued."""
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """Wait for a job started with start() to finish."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.finished
+
+    @traced("training_export.run")
+    def _run(self):
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        try:
+            os.makedirs(self.dest_dir, exist_ok=True)
+            buckets = make_buckets(self.resolution)
+            manifest = self._load_manifest()
+            # Samples of earlier exports keep their files
+            taken = [key for bucket in manifest["buckets"].values() for key in bucket["keys"]]
+            keys = sample_keys(self.image_paths, taken)
+
+            # Spawned workers don't inherit the UI's threads and locks
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context) as executor:
+                for image_path, key in zip(self.image_paths, keys):
+                    in_flight.acquire()
+                    if self._cancel.is_set():
+                        in_flight.release()
+                        break
+                    task = (image_path, self.dest_dir, key, self.read_tags(image_path),
+                            buckets, self.image_format, self.quality)
+                    future = executor.submit(export_training_image, task)
+                    future.add_done_callback(lambda future, image_path=image_path:
+                                             self._finished_one(future, image_path, in_flight))
+
+            # Also after a cancel, so the samples that were written are listed
+            self._write_manifest(manifest)
+        except Exception as e:
+            self.errors.append((self.dest_dir, str(e)))
+        finally:
+            self.finished = True
+
+    def _finished_one(self, future, image_path, in_flight):
+        """Record the result of one worker task."""
+        try:
+            key, bucket_name, error = future.result()
+        except Exception as e:
+            key, bucket_name, error = None, None, str(e)
+        with self._lock:
+            if error is not None:
+                self.errors.append((image_path, error))
+            else:
+                self.buckets.setdefault(bucket_name, []).append(key)
+            self.done += 1
+        in_flight.release()
+
+    def _load_manifest(self):
+        """Load buckets.json of an earlier export to the folder, or an empty one."""
+        manifest_path = os.path.join(self.dest_dir, "buckets.json")
+        if not os.path.exists(manifest_path):
+            return {"resolution": self.resolution, "format": self.image_format, "samples": 0, "buckets": {}}
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("resolution") != self.resolution or manifest.get("format") != self.image_format:
+            raise ValueError(f"The folder already holds a {manifest.get('resolution')} "
+                             f"{manifest.get('format')} training set, export to another folder")
+        return manifest
+
+    def _write_manifest(self, manifest):
+        """
+        Add the samples of this run to buckets.json.
+
+        Args:
+            manifest (dict): buckets.json of earlier exports (see _load_manifest())
+        """
+        merged = {name: list(bucket["keys"]) for name, bucket in manifest["buckets"].items()}
+        for name, keys in self.buckets.items():
+            merged.setdefault(name, []).extend(keys)
+        manifest = {
+            "resolution": self.resolution,
+            "format": self.image_format,
+            "samples": sum(len(keys) for keys in merged.values()),
+            "buckets": {
+                name: {"count": len(keys), "keys": sorted(keys)}
+                for name, keys in sorted(merged.items())
+            },
+        }
+        manifest_path = os.path.join(self.dest_dir, "buckets.json")
+        with open(manifest_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def summary(self, max_errors=10):
+        """
+        Build a human readable summary of the job.
+
+        Args:
+            max_errors (int): Maximum number of individual errors to list
+
+        Returns:
+            str: Summary text
+        """
+        lines = [f"Exported {self.exported} of {self.total} images into {len(self.buckets)} "
+                 f"aspect-ratio buckets, {len(self.errors)} failed."]
+        for name, keys in sorted(self.buckets.items()):
+            lines.append(f"{name}: {len(keys)} images")
+        if self.cancelled:
+            lines.append("The export was cancelled.")
+        if self.errors:
+            lines.append("")
+            lines.append("Errors:")
+            for image_path, message in self.errors[:max_errors]:
+                lines.append(f"{os.path.basename(image_path)}: {message}")
+            if len(self.errors) > max_errors:
+                lines.append(f"... and {len(self.errors) - max_errors} more")
+        return "\n".join(lines)
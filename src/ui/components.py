@@ -129,6 +129,61 @@ class AutoTagField(Frame):
                 # Don't clear the tag field if there was an error
 
 
+class SearchField(Frame):
+    """Search box that narrows the workspace to matching images"""
+
+    def __init__(self, master=None, command=None, width=40, delay=250, **kwargs):
+        super().__init__(master, **kwargs)
+
+        # Label
+        self.label = Label(self, text="Search:", padx=5)
+        self.label.pack(side=tk.LEFT)
+
+        # Entry field, searched again shortly after the user stops typing
+        self.query_var = tk.StringVar()
+        self.entry = Entry(self, textvariable=self.query_var,
+                          width=width, font=("Arial", 10))
+        self.entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.entry.bind("<Return>", lambda event: self._search())
+        self.entry.bind("<Escape>", lambda event: self.clear())
+        self.entry.bind("<KeyRelease>", self._on_key)
+
+        # Clear button
+        self.clear_button = Button(self, text="Clear", command=self.clear,
+                                 font=("Arial", 8), padx=5)
+        self.clear_button.pack(side=tk.RIGHT, padx=5)
+
+        # Store the callback function, called with the query string
+        self.command = command
+        self.delay = delay
+        self._after_id = None
+        self._last_query = ""
+
+    def _on_key(self, event):
+        """Search once typing pauses instead of on every key"""
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+        self._after_id = self.after(self.delay, self._search)
+
+    def _search(self):
+        """Execute the command callback if the query changed"""
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+            self._after_id = None
+        query = self.query_var.get().strip()
+        if query != self._last_query and self.command:
+            self._last_query = query
+            try:
+                self.command(query)
+            except Exception as e:
+                print(f"Error searching: {str(e)}")
+
+    def clear(self):
+        """Clear the query and show every image again"""
+        self.query_var.set("")
+        self._search()
+
+
 class NavigationButton(Button):
     """Enhanced navigation button with styling"""
     
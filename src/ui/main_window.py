@@ -1,17 +1,32 @@
 import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import Label, StringVar, Frame, messagebox, filedialog, Toplevel, Text, Scrollbar
-from PIL import Image, ImageTk, PngImagePlugin
-import shutil
 
 # Change relative imports to absolute imports
-from src.image_loader import ImageLoader
-from src.tag_manager import TagManager
-from src.ui.components import TagInputField, NavigationButton, SaveButton, AutoTagField
+# PIL, the image pipeline and the bulk job modules are imported where they
+# are first used, so the window can be shown before they are loaded
+from src.image_loader import ImageLoader, ImageNavigator, CompactPathList, VALID_EXTENSIONS
+from src.tag_manager import SidecarBackend, parse_tags, join_tags
+from src.tag_index import TagIndex, is_tag_query
+from src.image_metadata import MetadataCache
+from src.search_index import SearchIndex
+from src.workspace import get_state_dir, open_tag_manager, next_workspace_generation
+from src.instrumentation import tracer, format_breakdown, trace_requested
+from src.ui.components import TagInputField, NavigationButton, SaveButton, AutoTagField, SearchField
 
 class MainWindow:
-    def __init__(self, master):
+    def __init__(self, master, startup_timer=None):
+        """
+        Build the window; the workspace is loaded once the window is shown.
+        
+        Args:
+            master (tk.Tk): The root window
+            startup_timer (StartupTimer): Optional, reports the startup phases when loading finished
+        """
         self.master = master
+        self.startup_timer = startup_timer
         self.master.title("Amalthea - Image Tagging Software")
         self.master.geometry("900x700")  # Increased window size
         self.master.minsize(800, 650)    # Set minimum window size
@@ -30,18 +45,35 @@ class MainWindow:
 
         # Initialize image loader and tag manager
         self.image_loader = ImageLoader()
-        self.tag_manager = TagManager()
+        self.tag_manager = self.create_tag_manager()
+        self.tag_index = TagIndex(self.tag_manager)
+        
+        # Caches, prefetcher and folder watcher are created by start_services()
+        self.preview_store = None
+        self.metadata_cache = None
+        self.search_index = None
+        self.prefetcher = None
+        self.folder_watcher = None
+        self.watch_id = None
+        self.master.protocol("WM_DELETE_WINDOW", self.on_close)
 
-        # Image tracking variables
-        self.current_image_index = 0
-        self.images = []
+        # Image tracking variables - the navigator owns the image list and position
+        self.navigator = ImageNavigator()
         self.current_image_path = None
         self.photo = None
         self.app_icon_photo = None  # Store app icon photo
+        self.thumbnail_window = None
+        self.thumbnail_grid = None
+        self.scan_stop = None
+        self.scan_id = None
         
         # Load the application icon for display when no images are loaded
         self.load_app_icon()
 
+        # Search box, narrows navigation to images whose metadata or tags match
+        self.search_field = SearchField(self.frame, command=self.search_images)
+        self.search_field.pack(fill=tk.X)
+        
         # Image display area
         self.image_frame = Frame(self.frame)
         self.image_frame.pack(fill=tk.BOTH, expand=True, pady=10)
@@ -110,6 +142,21 @@ class MainWindow:
         self.clear_folder_button = NavigationButton(self.button_frame, text="Clear Folder", 
                                                   command=self.clear_folder, bg="#C62828", fg="white")
         self.clear_folder_button.grid(row=1, column=1, padx=5, pady=5, sticky="w")
+        
+        # Thumbnails button opens a scrollable grid of the whole workspace
+        self.thumbnails_button = NavigationButton(self.button_frame, text="Thumbnails", 
+                                                 command=self.show_thumbnails)
+        self.thumbnails_button.grid(row=1, column=2, padx=5, pady=5, sticky="w")
+        
+        # Turns the prompts embedded in generated images into their tags
+        self.prompt_tags_button = NavigationButton(self.button_frame, text="Prompts to Tags", 
+                                                  command=self.prompts_to_tags)
+        self.prompt_tags_button.grid(row=1, column=3, padx=5, pady=5, sticky="w")
+        
+        # Renames, merges, removes or replaces a tag across the whole workspace
+        self.edit_tags_button = NavigationButton(self.button_frame, text="Edit Tags", 
+                                                command=self.edit_tags)
+        self.edit_tags_button.grid(row=1, column=4, padx=5, pady=5, sticky="w")
 
         # PNG Info area - new
         self.png_info_frame = Frame(self.frame, bd=1, relief=tk.GROOVE)
@@ -139,9 +186,23 @@ class MainWindow:
         self.status_var = StringVar()
         self.status_label = Label(self.frame, textvariable=self.status_var, font=("Arial", 9))
         self.status_label.pack(pady=5)
+        
+        # Time breakdown of the last displayed image, toggled with F12 (Shift+F12 saves a trace)
+        self.timings_var = StringVar()
+        self.timings_label = Label(self.frame, textvariable=self.timings_var, font=("Consolas", 8), fg="#555555")
+        self.show_timings = False
+        if tracer.enabled:
+            self.toggle_timings()
+        self.master.bind("<F12>", lambda event: self.toggle_timings())
+        self.master.bind("<Shift-F12>", lambda event: self.save_trace())
+        
+        # Cancel button, only shown while a bulk operation is running
+        self.bulk_job = None
+        self.cancel_button = NavigationButton(self.frame, text="Cancel", command=self.cancel_bulk_job)
 
-        # Load images and display the first one (or app icon if none)
-        self.load_images()
+        # Show the app icon until the first images are loaded
+        self.show_app_icon()
+        self.status_var.set("Loading images...")
 
         # After all UI elements are created, update the window size
         self.master.update_idletasks()  # Force geometry calculation
@@ -150,9 +211,101 @@ class MainWindow:
         required_height = self.frame.winfo_reqheight() + 40  # Add some extra padding
         required_width = self.frame.winfo_reqwidth() + 40    # Add some extra padding
         self.master.geometry(f"{max(required_width, 800)}x{max(required_height, 650)}")
+        
+        # Load the workspace once the window has been drawn
+        self.master.after_idle(lambda: self.master.after(0, self.start_services))
+
+    def start_services(self):
+        """Open the workspace caches, start loading the images and watch the folder."""
+        if self.startup_timer is not None:
+            self.startup_timer.mark("window shown")
+            
+        from src.folder_watcher import FolderWatcher
+        from src.prefetch import PrefetchEngine
+        from src.preview_store import PreviewStore
+        
+        # Decodes neighbouring images ahead of time for fast navigation,
+        # keeping the scaled previews on disk for the next session
+        state_dir = get_state_dir(self.image_loader.image_folder)
+        self.preview_store = PreviewStore(state_dir, root=self.image_loader.image_folder)
+        # Text metadata is read from the file headers once and cached by file identity
+        self.metadata_cache = MetadataCache(state_dir)
+        # Full-text index of the metadata, searched together with the tag index
+        self.search_index = SearchIndex(state_dir, self.metadata_cache, self.tag_index)
+        self.prefetcher = PrefetchEngine(self.tag_manager, preview_store=self.preview_store,
+                                         metadata_cache=self.metadata_cache)
+        
+        # Load images and display the first one (or app icon if none)
+        self.load_images()
+        
+        # Pick up images that other programs add to or remove from the folder
+        self.folder_watcher = FolderWatcher(self.image_loader.image_folder, VALID_EXTENSIONS)
+        try:
+            self.folder_watcher.start()
+        except Exception as e:
+            print(f"Error watching images folder: {str(e)}")
+        self.watch_id = self.master.after(500, self.watch_images)
+        
+        if self.startup_timer is not None:
+            self.startup_timer.mark("services started")
+
+    @property
+    def images(self):
+        """Ordered list of the image paths being navigated (the search results while searching)."""
+        return self.navigator.images
+
+    @property
+    def workspace_images(self):
+        """Ordered list of every workspace image path, whatever is being searched."""
+        return self.navigator.all_images
+
+    @property
+    def current_image_index(self):
+        """Position of the current image in the workspace."""
+        return self.navigator.index
+
+    def create_tag_manager(self):
+        """
+        Create the tag manager with the storage backend selected by the
+        AMALTHEA_TAG_BACKEND environment variable ("sidecar" or "sqlite").
+        
+        Tag files are written behind a crash-safe journal.
+        """
+        return open_tag_manager(self.image_loader.image_folder)
+
+    def on_close(self):
+        """Stop background work and close the application window."""
+        if self.bulk_job is not None:
+            self.bulk_job.cancel()
+            self.bulk_job.wait()
+        self.stop_scan()
+        self.close_thumbnails()
+        # The services don't exist if the window is closed before they started
+        if self.watch_id is not None:
+            self.master.after_cancel(self.watch_id)
+        if self.folder_watcher is not None:
+            self.folder_watcher.stop()
+        if self.prefetcher is not None:
+            self.prefetcher.shutdown()
+            self.preview_store.close()
+            self.search_index.close()
+            self.metadata_cache.close()
+        self.tag_manager.close()
+        trace_path = os.environ.get("AMALTHEA_TRACE_FILE")
+        if trace_path:
+            try:
+                tracer.export_chrome_trace(trace_path)
+            except OSError as e:
+                print(f"Error writing trace: {str(e)}")
+        self.master.destroy()
 
     def load_app_icon(self):
-        """Load the application icon for display when no images are present."""
+        """
+        Load the application icon for display when no images are present.
+        
+        The icon is scaled once and the result is cached as a PNG next to the
+        workspace state, which Tk loads directly without going through PIL.
+        """
         try:
             # Path to the application icon - adjust as needed for your project structure
             icon_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
@@ -165,72 +318,227 @@ class MainWindow:
             
             # If icon still not found, use a placeholder
             if not os.path.exists(icon_path):
-                # Create a placeholder image with proper dimensions
-                img = Image.new('RGB', (512, 512), color=(240, 240, 245))
-                self.app_icon_photo = ImageTk.PhotoImage(img)
+                self.app_icon_photo = self._placeholder_icon()
                 return
                 
-            # Load the icon
-            icon_img = Image.open(icon_path)
-            
-            # Calculate dimensions while preserving aspect ratio
-            # Target size is 512x512, but maintain aspect ratio
-            max_size = 512
-            original_width, original_height = icon_img.size
-            
-            # Calculate new dimensions preserving aspect ratio
-            if original_width >= original_height:
-                new_width = max_size
-                new_height = int(original_height * (max_size / original_width))
-            else:
-                new_height = max_size
-                new_width = int(original_width * (max_size / original_height))
-            
-            # Resize with proper aspect ratio
-            icon_img = icon_img.resize((new_width, new_height), Image.LANCZOS)
-            
-            # If needed, create a square backdrop for the icon
-            if new_width != new_height:
-                # Create a square backdrop
-                backdrop = Image.new('RGBA', (max_size, max_size), (240, 240, 245, 0))
-                # Calculate position to center the icon
-                paste_x = (max_size - new_width) // 2
-                paste_y = (max_size - new_height) // 2
-                # Paste the icon centered on the backdrop
-                backdrop.paste(icon_img, (paste_x, paste_y), icon_img if icon_img.mode == 'RGBA' else None)
-                icon_img = backdrop
-            
+            # Use the scaled icon from an earlier start unless the icon changed since
+            cache_path = os.path.join(os.path.dirname(get_state_dir(self.image_loader.image_folder)),
+                                      "app_icon.png")
+            if (os.path.exists(cache_path)
+                    and os.path.getmtime(cache_path) >= os.path.getmtime(icon_path)):
+                self.app_icon_photo = tk.PhotoImage(file=cache_path)
+                return
+                
+            icon_img = self._scale_app_icon(icon_path)
+            try:
+                icon_img.save(cache_path + ".tmp", "PNG")
+                os.replace(cache_path + ".tmp", cache_path)
+            except Exception as e:
+                print(f"Error caching application icon: {str(e)}")
+                
+            from PIL import ImageTk
             self.app_icon_photo = ImageTk.PhotoImage(icon_img)
             
         except Exception as e:
             print(f"Error loading application icon: {str(e)}")
             # Create a fallback image with proper dimensions
-            img = Image.new('RGB', (512, 512), color=(240, 240, 245))
-            self.app_icon_photo = ImageTk.PhotoImage(img)
+            self.app_icon_photo = self._placeholder_icon()
+
+    def _scale_app_icon(self, icon_path, max_size=512):
+        """Scale the icon to fit max_size x max_size, centered on a square backdrop."""
+        from PIL import Image
+        
+        # Load the icon
+        icon_img = Image.open(icon_path)
+        
+        # Calculate dimensions while preserving aspect ratio
+        original_width, original_height = icon_img.size
+        if original_width >= original_height:
+            new_width = max_size
+            new_height = int(original_height * (max_size / original_width))
+        else:
+            new_height = max_size
+            new_width = int(original_width * (max_size / original_height))
+        
+        # Resize with proper aspect ratio
+        icon_img = icon_img.resize((new_width, new_height), Image.LANCZOS)
+        
+        # If needed, create a square backdrop for the icon
+        if new_width != new_height:
+            # Create a square backdrop
+            backdrop = Image.new('RGBA', (max_size, max_size), (240, 240, 245, 0))
+            # Calculate position to center the icon
+            paste_x = (max_size - new_width) // 2
+            paste_y = (max_size - new_height) // 2
+            # Paste the icon centered on the backdrop
+            backdrop.paste(icon_img, (paste_x, paste_y), icon_img if icon_img.mode == 'RGBA' else None)
+            icon_img = backdrop
+        return icon_img
+
+    def _placeholder_icon(self, size=512):
+        """Create a plain placeholder shown when the icon can't be loaded."""
+        photo = tk.PhotoImage(width=size, height=size)
+        photo.put("#f0f0f5", to=(0, 0, size, size))
+        return photo
 
     def load_images(self):
-        """Load all images from the images directory."""
+        """
+        Load all images from the images directory.
+        
+        The images are listed and their tags read on a background thread,
+        and added to the workspace a page at a time, so the window stays
+        responsive while a big folder loads. With AMALTHEA_RECURSIVE_SCAN=1
+        the whole folder tree is walked.
+        """
         # Store current window size before loading images
         current_width = self.master.winfo_width()
         current_height = self.master.winfo_height()
         
-        self.images = self.image_loader.load_images()
-        if self.images:
-            self.show_image()
-        else:
-            self.status_var.set("No images found in the images directory")
-            self.show_app_icon()  # Show app icon when no images are available
+        self.stop_scan()
+        recursive = os.environ.get("AMALTHEA_RECURSIVE_SCAN", "").lower() in ("1", "true", "yes")
+        self.navigator.set_images(CompactPathList() if recursive else [], keep_current=False)
+        self.tag_index.clear()
+        self.start_scan(recursive)
+        self.prefetcher.cache.invalidate()
+        if self.thumbnail_grid is not None:
+            self.thumbnail_grid.set_images(self.images)
             
-            # Clear PNG info area
-            self.png_info_text.config(state=tk.NORMAL)
-            self.png_info_text.delete(1.0, tk.END)
-            self.png_info_text.insert(tk.END, "No image loaded - PNG metadata will appear here")
-            self.png_info_text.config(state=tk.DISABLED)
+        self.status_var.set("Loading images...")
+        self.show_app_icon()  # Shown until the first page of images arrives
+        
+        # Clear PNG info area
+        self.png_info_text.config(state=tk.NORMAL)
+        self.png_info_text.delete(1.0, tk.END)
+        self.png_info_text.insert(tk.END, "No image loaded - PNG metadata will appear here")
+        self.png_info_text.config(state=tk.DISABLED)
             
         # Ensure window size doesn't change when reloading images
         if current_width > 100 and current_height > 100:  # Only if window was already sized
             self.master.geometry(f"{current_width}x{current_height}")
 
+    def start_scan(self, recursive=False):
+        """
+        List the images in the background, a page of images at a time.
+        
+        Args:
+            recursive (bool): Walk the whole folder tree instead of only the images folder
+        """
+        self.scan_stop = threading.Event()
+        self.scan_pages = queue.Queue()
+        thread = threading.Thread(target=self._scan_worker, args=(self.scan_pages, self.scan_stop, recursive),
+                                  name="amalthea-scan", daemon=True)
+        thread.start()
+        self.scan_id = self.master.after(50, self._poll_scan)
+
+    def _scan_worker(self, pages, stop, recursive, page_size=1000):
+        """Background thread: list the images page by page and read their tags."""
+        try:
+            if recursive:
+                source = self.image_loader.iter_pages(page_size)
+            else:
+                # The folder manifest makes listing a flat folder cheap; reading the tags isn't
+                images = self.image_loader.load_images()
+                source = (images[start:start + page_size] for start in range(0, len(images), page_size))
+            for page in source:
+                if stop.is_set():
+                    return
+                pages.put((page, [self.tag_manager.load_tags(image_path) for image_path in page]))
+        except Exception as e:
+            print(f"Error scanning images: {str(e)}")
+        finally:
+            pages.put(None)
+
+    def _poll_scan(self, max_pages=20):
+        """Add the pages the scan has produced so far to the workspace."""
+        self.scan_id = None
+        new_images = CompactPathList()
+        finished = False
+        try:
+            for _ in range(max_pages):
+                item = self.scan_pages.get_nowait()
+                if item is None:
+                    finished = True
+                    break
+                page, tags = item
+                new_images.extend(page)
+                for image_path, image_tags in zip(page, tags):
+                    self.tag_index.set_tags(image_path, image_tags)
+        except queue.Empty:
+            pass
+            
+        if len(new_images):
+            # Pages arrive in sorted order, so they only ever extend the list
+            first_page = not self.images
+            self.navigator.extend(new_images)
+            if self.thumbnail_grid is not None:
+                self.thumbnail_grid.extend_images(self.images)
+            if first_page:
+                self.show_image()
+                
+        if finished:
+            self.scan_stop = None
+            self.index_workspace()
+            if not self.images:
+                self.status_var.set("No images found in the images directory")
+            if self.startup_timer is not None:
+                self.startup_timer.mark(f"workspace loaded ({len(self.workspace_images)} images)")
+                self.startup_timer.stop_import_profile()
+                print(self.startup_timer.report())
+                self.startup_timer = None
+        else:
+            self.scan_id = self.master.after(50, self._poll_scan)
+
+    def index_workspace(self, images=None):
+        """
+        Fill the metadata cache and the search index in the background.
+        
+        Args:
+            images (list): Images to index, defaults to the whole workspace
+                (which also drops images that are gone from the index)
+        """
+        prune = images is None
+        # The workspace list keeps changing while the worker reads it
+        images = self.navigator.snapshot() if images is None else images
+        
+        def work():
+            self.metadata_cache.extract_all(images)
+            self.search_index.update(images, prune=prune)
+            
+        thread = threading.Thread(target=work, name="amalthea-metadata-scan", daemon=True)
+        thread.start()
+
+    def search_images(self, query):
+        """
+        Navigate only through the images that match a search query.
+        
+        Args:
+            query (str): Words to find in the metadata or tags, or a boolean tag
+                query such as "cat AND NOT dog"; empty to show every image
+        """
+        if is_tag_query(query):
+            try:
+                matches = set(self.tag_index.query(query))
+            except ValueError as e:
+                self.status_var.set(str(e))
+                return
+        else:
+            matches = self.search_index.search(query, self.workspace_images)
+        self.navigator.set_filter(matches)
+        if self.thumbnail_grid is not None:
+            self.thumbnail_grid.set_images(self.images)
+        self.show_image()
+        if matches is not None:
+            self.status_var.set(f"{len(self.images)} of {len(self.workspace_images)} images match '{query}'")
+
+    def stop_scan(self):
+        """Stop a background scan that is still running."""
+        if self.scan_id is not None:
+            self.master.after_cancel(self.scan_id)
+            self.scan_id = None
+        if self.scan_stop is not None:
+            self.scan_stop.set()
+            self.scan_stop = None
+
     def show_app_icon(self):
         """Display the application icon when no images are loaded."""
         if self.app_icon_photo:
@@ -251,64 +559,37 @@ class MainWindow:
             self.png_info_text.config(state=tk.DISABLED)
             return
             
-        self.current_image_path = self.images[self.current_image_index]
+        self.current_image_path = self.navigator.current
+        frame_start = tracer.now()
         
         # Update filename display
         self.filename_var.set(os.path.basename(self.current_image_path))
         
         try:
-            # Load and resize image to fit display
-            pil_image = Image.open(self.current_image_path)
-            
-            # Extract PNG metadata if it's a PNG file
-            self.png_info_text.config(state=tk.NORMAL)
-            self.png_info_text.delete(1.0, tk.END)
+            # Use the prefetched frame if it is ready, otherwise decode it now
+            with tracer.span("show_image.get_frame"):
+                frame = self.prefetcher.get_frame(self.current_image_path)
             
-            if self.current_image_path.lower().endswith('.png'):
-                # Get PNG metadata
-                try:
-                    png_info = ""
-                    if hasattr(pil_image, 'info') and pil_image.info:
-                        for key, value in pil_image.info.items():
-                            if key != 'text' and isinstance(value, (str, int, float)):
-                                png_info += f"{key}: {value}\n"
-                    
-                    # Check for text chunks (commonly used for metadata)
-                    if 'text' in pil_image.info:
-                        png_info += "\nText Chunks:\n"
-                        for key, value in pil_image.info['text'].items():
-                            png_info += f"{key}: {value}\n"
-                            
-                    if not png_info:
-                        png_info = "No PNG metadata found."
-                        
-                    self.png_info_text.insert(tk.END, png_info)
-                except Exception as e:
-                    self.png_info_text.insert(tk.END, f"Error reading PNG metadata: {str(e)}")
-            else:
-                self.png_info_text.insert(tk.END, "Not a PNG file or no metadata available.")
-                
-            self.png_info_text.config(state=tk.DISABLED)
-            
-            # Calculate resize dimensions to fit in display area (max 700x400)
-            width, height = pil_image.size
-            max_width, max_height = 700, 400
-            
-            if width > max_width or height > max_height:
-                ratio = min(max_width/width, max_height/height)
-                width = int(width * ratio)
-                height = int(height * ratio)
-                pil_image = pil_image.resize((width, height), Image.LANCZOS)
+            # Show the PNG metadata
+            with tracer.span("show_image.metadata"):
+                self.png_info_text.config(state=tk.NORMAL)
+                self.png_info_text.delete(1.0, tk.END)
+                self.png_info_text.insert(tk.END, frame.metadata)
+                self.png_info_text.config(state=tk.DISABLED)
                 
             # Convert PIL image to Tkinter PhotoImage
-            self.photo = ImageTk.PhotoImage(pil_image)
-            self.image_label.config(image=self.photo)
+            from PIL import ImageTk
+            with tracer.span("show_image.photo"):
+                self.photo = ImageTk.PhotoImage(frame.image)
+                self.image_label.config(image=self.photo)
             
-            # Load existing tags for this image
-            existing_tags = self.tag_manager.load_tags(self.current_image_path)
-            self.tag_var.set(existing_tags)
+            # Show existing tags for this image
+            self.tag_var.set(frame.tags)
             
-            self.status_var.set(f"Image {self.current_image_index + 1} of {len(self.images)}")
+            status = f"Image {self.current_image_index + 1} of {len(self.images)}"
+            if self.navigator.filtered:
+                status += f" (search results, {len(self.workspace_images)} in the workspace)"
+            self.status_var.set(status)
             
         except Exception as e:
             self.status_var.set(f"Error loading image: {str(e)}")
@@ -319,13 +600,92 @@ class MainWindow:
             self.png_info_text.delete(1.0, tk.END)
             self.png_info_text.insert(tk.END, "Error loading image metadata.")
             self.png_info_text.config(state=tk.DISABLED)
+            
+        # Keep the thumbnail grid selection in sync
+        if self.thumbnail_grid is not None:
+            self.thumbnail_grid.set_current(self.current_image_index)
+            
+        # Start decoding the neighbouring images in the background
+        with tracer.span("show_image.prefetch"):
+            self.prefetcher.prefetch(self.images, self.current_image_index)
+        
+        if tracer.enabled:
+            tracer.record("show_image", frame_start, tracer.now())
+            if self.show_timings:
+                self.show_frame_timings(frame_start)
+
+    def show_frame_timings(self, frame_start):
+        """Show how long displaying the current image took, split by span."""
+        spans = tracer.spans_since(frame_start)
+        total = [duration for name, duration, _ in spans if name == "show_image"]
+        parts = [span for span in spans if span[0] != "show_image"]
+        text = f"Last frame {total[-1]:.1f} ms: " if total else "Last frame: "
+        self.timings_var.set(text + format_breakdown(parts))
+
+    def toggle_timings(self):
+        """Turn tracing and the frame timings readout on or off."""
+        self.show_timings = not self.show_timings
+        if self.show_timings:
+            tracer.enable()
+            self.timings_var.set("Frame timings on - navigate to measure")
+            self.timings_label.pack(after=self.status_label)
+        else:
+            # Keep recording when a trace file was asked for at startup
+            if not trace_requested():
+                tracer.disable()
+            self.timings_label.pack_forget()
+
+    def save_trace(self):
+        """Write the recorded spans to a Chrome trace-event JSON file."""
+        path = filedialog.asksaveasfilename(title="Save trace", defaultextension=".json",
+                                            initialfile="amalthea-trace.json",
+                                            filetypes=[("Chrome trace", "*.json")])
+        if not path:
+            return
+        try:
+            count = tracer.export_chrome_trace(path)
+            self.status_var.set(f"Saved {count} spans to {os.path.basename(path)}")
+        except OSError as e:
+            self.status_var.set(f"Error saving trace: {str(e)}")
+
+    def show_thumbnails(self):
+        """Open (or focus) the thumbnail grid of all workspace images."""
+        if self.thumbnail_window is not None:
+            self.thumbnail_window.lift()
+            return
+            
+        from src.ui.thumbnail_grid import ThumbnailGrid
+        
+        self.thumbnail_window = Toplevel(self.master)
+        self.thumbnail_window.title("Amalthea - Thumbnails")
+        self.thumbnail_window.geometry("760x600")
+        self.thumbnail_window.protocol("WM_DELETE_WINDOW", self.close_thumbnails)
+        
+        self.thumbnail_grid = ThumbnailGrid(self.thumbnail_window, self.images,
+                                            on_select=self.jump_to_image,
+                                            preview_store=self.preview_store)
+        self.thumbnail_grid.pack(fill=tk.BOTH, expand=True)
+        if self.images:
+            self.thumbnail_grid.set_current(self.current_image_index)
+
+    def close_thumbnails(self):
+        """Close the thumbnail grid window."""
+        if self.thumbnail_window is not None:
+            self.thumbnail_window.destroy()
+        self.thumbnail_window = None
+        self.thumbnail_grid = None
+
+    def jump_to_image(self, index):
+        """Show the image at the given position in the workspace."""
+        if self.navigator.jump(index):
+            self.show_image()
 
     def next_image(self):
         """Navigate to the next image."""
         if not self.images:
             return
         
-        self.current_image_index = (self.current_image_index + 1) % len(self.images)
+        self.navigator.next()
         self.show_image()
 
     def previous_image(self):
@@ -333,7 +693,7 @@ class MainWindow:
         if not self.images:
             return
         
-        self.current_image_index = (self.current_image_index - 1) % len(self.images)
+        self.navigator.prev()
         self.show_image()
 
     def save_tags(self):
@@ -343,6 +703,8 @@ class MainWindow:
             tags = self.tag_input.get_tags()
             success = self.tag_manager.save_tags(self.current_image_path, tags)
             if success:
+                self.tag_index.set_tags(self.current_image_path, tags)
+                self.prefetcher.cache.update_tags(self.current_image_path, tags)
                 self.status_var.set(f"Tags saved for {os.path.basename(self.current_image_path)}")
             else:
                 self.status_var.set("Error saving tags")
@@ -353,44 +715,320 @@ class MainWindow:
             if messagebox.askyesno("Confirm Delete", "Are you sure you want to delete the tags for this image?"):
                 success = self.tag_manager.delete_tags(self.current_image_path)
                 if success:
+                    self.tag_index.set_tags(self.current_image_path, [])
+                    self.prefetcher.cache.update_tags(self.current_image_path, "")
                     self.tag_var.set("")  # Clear the tag input field
                     self.status_var.set(f"Tags deleted for {os.path.basename(self.current_image_path)}")
                 else:
                     self.status_var.set("Error deleting tags")
     
+    def run_bulk_job(self, job, description, on_done):
+        """
+        Start a background job and report its progress in the status bar.
+        
+        Args:
+            job (BulkTagJob or ImportJob): The job to run
+            description (str): Short description shown while the job runs
+            on_done (function): Called with the job on the Tk thread once it finished
+        """
+        self.bulk_job = job
+        self.cancel_button.pack(pady=2)
+        job.start()
+        self._poll_bulk_job(description, on_done)
+
+    def _poll_bulk_job(self, description, on_done):
+        """Update the progress display until the running bulk job finishes."""
+        job = self.bulk_job
+        if not job.finished:
+            self.status_var.set(f"{description}... {job.done} of {job.total} images")
+            self.master.after(100, self._poll_bulk_job, description, on_done)
+            return
+            
+        self.bulk_job = None
+        self.cancel_button.pack_forget()
+        on_done(job)
+
+    def cancel_bulk_job(self):
+        """Cancel the running bulk job."""
+        if self.bulk_job is not None:
+            self.bulk_job.cancel()
+            self.status_var.set("Cancelling...")
+
     def apply_auto_tag(self, tag):
         """Apply the specified tag to all images."""
-        if not self.images or not tag:
+        if not self.workspace_images or not tag:
             self.status_var.set("No images to tag or no tag specified")
             return False
+            
+        if self.bulk_job is not None:
+            self.status_var.set("Another tagging operation is still running")
+            return False
+        
+        from src.bulk_tagger import BulkTagJob, add_tag
         
-        success_count = 0
-        current_image_tags = None  # Store tags for current image to update UI
+        # Only images that don't have the tag yet need to be rewritten; their
+        # tags are read from the backend so edits made outside Amalthea are kept
+        job = BulkTagJob(self.tag_index.images_without(tag, self.workspace_images), add_tag(tag),
+                         self.tag_manager.backend)
+        total_images = len(self.workspace_images)
         
-        for image_path in self.images:
-            # Get existing tags
-            existing_tags = self.tag_manager.load_tags(image_path)
+        def on_done(job):
+            for image_path, new_tags in job.changes:
+                self.tag_index.set_tags(image_path, new_tags)
+                
+                # Update the current image's tags in the UI without disturbing navigation state
+                if image_path == self.current_image_path:
+                    self.tag_var.set(new_tags)
             
-            # Add the new tag if it's not already present
-            tags_list = [t.strip() for t in existing_tags.split(',') if t.strip()]
-            if tag not in tags_list:
-                tags_list.append(tag)
+            # Cached frames now hold outdated tags
+            if job.changed > 0:
+                self.prefetcher.cache.invalidate()
                 
-                # Save the updated tags
-                new_tags = ', '.join(tags_list)
-                if self.tag_manager.save_tags(image_path, new_tags):
-                    success_count += 1
+            self.status_var.set(f"Tag '{tag}' applied to {job.changed} of {total_images} images")
+            if job.errors or job.cancelled:
+                messagebox.showinfo("Apply to All Results", job.summary())
+        
+        self.run_bulk_job(job, f"Applying '{tag}'", on_done)
+        return True
+
+    def prompts_to_tags(self):
+        """Parse the embedded generation prompts of all images into their tags."""
+        if not self.workspace_images:
+            messagebox.showinfo("Prompts to Tags", "No images to tag.")
+            return
+            
+        if self.bulk_job is not None:
+            self.status_var.set("Another tagging operation is still running")
+            return
+            
+        options = self.ask_prompt_options()
+        if options is None:
+            return
+        merge_rule, ignore = options
+        
+        from src.prompt_tags import PromptTagJob
+        
+        # Prompts are parsed on a process pool, then all tags are written in one batch
+        job = PromptTagJob(self.workspace_images, self.tag_manager.backend,
+                           read_tags=lambda image_path: join_tags(self.tag_index.get_tags(image_path)),
+                           merge_rule=merge_rule, ignore=ignore)
+        
+        def on_done(job):
+            for image_path, new_tags in job.changes:
+                self.tag_index.set_tags(image_path, new_tags)
+                if image_path == self.current_image_path:
+                    self.tag_var.set(new_tags)
                     
-                    # If this is the current image, store its tags
-                    if image_path == self.current_image_path:
-                        current_image_tags = new_tags
+            # Cached frames now hold outdated tags
+            if job.changed > 0:
+                self.prefetcher.cache.invalidate()
+                
+            self.status_var.set(f"Tags from prompts written for {job.changed} of {job.total} images")
+            messagebox.showinfo("Prompts to Tags Results", job.summary())
+            
+        self.run_bulk_job(job, "Reading prompts", on_done)
+
+    def ask_prompt_options(self):
+        """
+        Ask how prompt tags should be merged with the existing tags.
+        
+        Returns:
+            tuple: (merge rule, list of tags to ignore), or None if the user cancelled
+        """
+        from src.prompt_tags import MERGE_RULES
+        
+        dialog = Toplevel(self.master)
+        dialog.title("Prompts to Tags")
+        dialog.transient(self.master)
+        dialog.resizable(False, False)
+        
+        choice = StringVar(value="append")
+        ignore_var = StringVar(value="masterpiece, best quality, high quality")
+        result = []
+        Label(dialog, text="Tags parsed from the prompts:", font=("Arial", 10, "bold")).pack(anchor=tk.W, padx=10, pady=(10, 5))
+        for value, text in MERGE_RULES.items():
+            tk.Radiobutton(dialog, text=text, variable=choice, value=value).pack(anchor=tk.W, padx=20)
+            
+        Label(dialog, text="Never add these tags:").pack(anchor=tk.W, padx=10, pady=(10, 0))
+        tk.Entry(dialog, textvariable=ignore_var, width=50).pack(fill=tk.X, padx=10)
+        
+        def accept():
+            result.append((choice.get(), parse_tags(ignore_var.get())))
+            dialog.destroy()
+            
+        buttons = Frame(dialog)
+        buttons.pack(pady=10)
+        NavigationButton(buttons, text="Convert", command=accept).pack(side=tk.LEFT, padx=5)
+        NavigationButton(buttons, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+        
+        dialog.grab_set()
+        self.master.wait_window(dialog)
+        return result[0] if result else None
+
+    def edit_tags(self):
+        """Rename, merge, remove or replace tags in every workspace image that has them."""
+        if not self.workspace_images:
+            messagebox.showinfo("Edit Tags", "No images to edit.")
+            return
+            
+        if self.bulk_job is not None:
+            self.status_var.set("Another tagging operation is still running")
+            return
+            
+        edit = self.ask_tag_edit()
+        if edit is None:
+            return
+        mutate, tags, description = edit
         
-        # Update the current image's tags in the UI without disturbing navigation state
-        if current_image_tags is not None:
-            self.tag_var.set(current_image_tags)
+        from src.tag_edit import TagEditJob
         
-        self.status_var.set(f"Tag '{tag}' applied to {success_count} of {len(self.images)} images")
-        return success_count > 0
+        # Only the images that have one of the tags are read and rewritten
+        with_tags = self.tag_index.images_with_any(tags)
+        affected = [image_path for image_path in self.workspace_images if image_path in with_tags]
+        if not affected:
+            self.status_var.set(f"No image has {', '.join(repr(tag) for tag in tags)}")
+            return
+        if not messagebox.askyesno("Edit Tags", f"{description} in {len(affected)} images?"):
+            return
+            
+        job = TagEditJob(affected, mutate, self.tag_manager.backend,
+                         read_tags=lambda image_path: join_tags(self.tag_index.get_tags(image_path)))
+        
+        def on_done(job):
+            for image_path, new_tags in job.changes:
+                self.tag_index.set_tags(image_path, new_tags)
+                if image_path == self.current_image_path:
+                    self.tag_var.set(new_tags)
+                    
+            # Cached frames now hold outdated tags
+            if job.changed > 0:
+                self.prefetcher.cache.invalidate()
+                
+            self.status_var.set(f"Tags changed in {job.changed} of {job.total} images")
+            messagebox.showinfo("Edit Tags Results", job.summary(max_changes=10))
+            
+        self.run_bulk_job(job, "Editing tags", on_done)
+
+    def ask_tag_edit(self):
+        """
+        Ask which tag edit to make.
+        
+        Returns:
+            tuple: (mutation, list of edited tags, description), or None if the user cancelled
+        """
+        from src.tag_edit import TAG_EDITS, build_tag_edit
+        
+        dialog = Toplevel(self.master)
+        dialog.title("Edit Tags")
+        dialog.transient(self.master)
+        dialog.resizable(False, False)
+        
+        choice = StringVar(value="rename")
+        tags_var = StringVar()
+        new_tags_var = StringVar()
+        count_var = StringVar()
+        result = []
+        Label(dialog, text="Change in every image:", font=("Arial", 10, "bold")).pack(anchor=tk.W, padx=10, pady=(10, 5))
+        for value, text in TAG_EDITS.items():
+            tk.Radiobutton(dialog, text=text, variable=choice, value=value).pack(anchor=tk.W, padx=20)
+            
+        Label(dialog, text="Tags to change (comma separated):").pack(anchor=tk.W, padx=10, pady=(10, 0))
+        tk.Entry(dialog, textvariable=tags_var, width=50).pack(fill=tk.X, padx=10)
+        Label(dialog, textvariable=count_var, fg="#555555").pack(anchor=tk.W, padx=10)
+        Label(dialog, text="New tag (or tags, for replace):").pack(anchor=tk.W, padx=10, pady=(5, 0))
+        tk.Entry(dialog, textvariable=new_tags_var, width=50).pack(fill=tk.X, padx=10)
+        
+        def update_count(*args):
+            tags = parse_tags(tags_var.get())
+            count_var.set(f"{len(self.tag_index.images_with_any(tags))} images have these tags" if tags else "")
+        tags_var.trace_add("write", update_count)
+        
+        def accept():
+            tags = parse_tags(tags_var.get())
+            new_tags = parse_tags(new_tags_var.get())
+            try:
+                mutate = build_tag_edit(choice.get(), tags, new_tags)
+            except ValueError as e:
+                messagebox.showerror("Edit Tags", str(e), parent=dialog)
+                return
+            description = f"{TAG_EDITS[choice.get()]} ({', '.join(tags)}"
+            description += f" -> {', '.join(new_tags)})" if new_tags else ")"
+            result.append((mutate, tags, description))
+            dialog.destroy()
+            
+        buttons = Frame(dialog)
+        buttons.pack(pady=10)
+        NavigationButton(buttons, text="Apply", command=accept).pack(side=tk.LEFT, padx=5)
+        NavigationButton(buttons, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+        
+        dialog.grab_set()
+        self.master.wait_window(dialog)
+        return result[0] if result else None
+
+    def add_images(self, new_paths, folder_mtime_ns=None):
+        """
+        Merge new image files into the workspace, keeping the current image selected.
+        
+        Args:
+            new_paths (list): Full paths of the new image files
+            folder_mtime_ns (int): mtime of the images folder before the files were
+                added, if these are all the files added since (see update_manifest())
+        """
+        # The navigator keeps the list sorted and the current image selected
+        new_paths = self.navigator.insert(new_paths)
+        if not new_paths:
+            return
+            
+        self.image_loader.update_manifest(added=new_paths, folder_mtime_ns=folder_mtime_ns)
+        for image_path in new_paths:
+            self.tag_index.set_tags(image_path, self.tag_manager.load_tags(image_path))
+        self.index_workspace(new_paths)
+            
+        if self.thumbnail_grid is not None:
+            self.thumbnail_grid.set_images(self.images)
+        self.show_image()
+
+    def remove_images(self, removed_paths):
+        """Drop deleted image files from the workspace, keeping the selection stable."""
+        # The navigator stays on the current image, or on the one that took its place
+        removed_paths = self.navigator.remove(removed_paths)
+        if not removed_paths:
+            return
+            
+        self.image_loader.update_manifest(removed=removed_paths)
+        for image_path in removed_paths:
+            self.tag_index.remove_image(image_path)
+            self.prefetcher.cache.discard(image_path)
+        self.tag_manager.forget_images(removed_paths)
+        self.metadata_cache.forget(removed_paths)
+        self.search_index.remove(removed_paths)
+        
+        if not self.images:
+            self.current_image_path = None
+            self.tag_var.set("")
+            
+        if self.thumbnail_grid is not None:
+            self.thumbnail_grid.set_images(self.images)
+        self.show_image()
+
+    def watch_images(self):
+        """Apply changes other programs make to the images folder."""
+        changes = self.folder_watcher.get_changes()
+        if changes is not None:
+            added, removed, modified = changes
+            self.remove_images(removed)
+            self.add_images(added)
+            
+            # Rewritten files need to be decoded and indexed again
+            self.image_loader.update_manifest(modified=modified)
+            for image_path in modified:
+                self.prefetcher.cache.discard(image_path)
+            if modified:
+                self.index_workspace(list(modified))
+            if self.current_image_path in modified:
+                self.show_image()
+                
+        self.watch_id = self.master.after(500, self.watch_images)
 
     def add_folder(self):
         """Add images from a selected folder to the current workspace."""
@@ -400,60 +1038,31 @@ class MainWindow:
         if not source_folder:
             return  # User cancelled
             
-        # Count imported files for status update
-        imported_images = 0
-        imported_tags = 0
-        
-        # Get list of valid image extensions
-        valid_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
-        
-        # Get the destination images folder
-        dest_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
-                      os.path.abspath(__file__)))), "images")
+        if self.bulk_job is not None:
+            self.status_var.set("Another operation is still running")
+            return
+            
+        from src.importer import ImportJob, ContentHashCache
         
-        # Ensure the destination folder exists
-        if not os.path.exists(dest_folder):
-            os.makedirs(dest_folder)
+        # Copies run in the background; content already in the workspace is skipped
+        dest_folder = self.image_loader.image_folder
+        hash_cache = ContentHashCache(os.path.join(get_state_dir(dest_folder), "hashes.json"))
+        job = ImportJob(source_folder, dest_folder, VALID_EXTENSIONS, hash_cache)
+        folder_mtime = self.image_loader.folder_mtime()
         
-        # Process all files in the source folder
-        for filename in os.listdir(source_folder):
-            source_path = os.path.join(source_folder, filename)
-            
-            # Skip directories
-            if os.path.isdir(source_path):
-                continue
+        def on_done(job):
+            # Merge the imported images into the workspace without rescanning it
+            self.add_images(job.imported, folder_mtime_ns=folder_mtime)
+            if job.errors or job.renamed or job.cancelled:
+                messagebox.showinfo("Import Results", job.summary())
                 
-            # Get file name and extension
-            file_name, file_ext = os.path.splitext(filename)
-            file_ext = file_ext.lower()
+            # Show status message
+            status = f"Imported {len(job.imported)} images and {job.imported_tags} tag files"
+            if job.duplicates:
+                status += f", skipped {len(job.duplicates)} duplicates"
+            self.status_var.set(status)
             
-            # Process image files
-            if file_ext in valid_extensions:
-                dest_path = os.path.join(dest_folder, filename)
-                
-                # Skip if file already exists in destination
-                if os.path.exists(dest_path):
-                    continue
-                    
-                try:
-                    # Copy the image file
-                    shutil.copy2(source_path, dest_path)
-                    imported_images += 1
-                    
-                    # Look for corresponding tag file
-                    tag_file = os.path.join(source_folder, f"{file_name}.txt")
-                    if os.path.exists(tag_file):
-                        # Copy the tag file
-                        shutil.copy2(tag_file, os.path.join(dest_folder, f"{file_name}.txt"))
-                        imported_tags += 1
-                except Exception as e:
-                    messagebox.showerror("Import Error", f"Error importing {filename}: {str(e)}")
-        
-        # Reload images after import
-        self.load_images()
-        
-        # Show status message
-        self.status_var.set(f"Imported {imported_images} images and {imported_tags} tag files")
+        self.run_bulk_job(job, "Importing", on_done)
         
     def export_dataset(self):
         """Export all images and tag files to a dataset folder."""
@@ -461,7 +1070,7 @@ class MainWindow:
         current_width = self.master.winfo_width()
         current_height = self.master.winfo_height()
         
-        if not self.images:
+        if not self.workspace_images:
             messagebox.showinfo("Export", "No images to export.")
             return
             
@@ -476,6 +1085,24 @@ class MainWindow:
         if not dest_dir:
             return  # User cancelled
             
+        if self.bulk_job is not None:
+            self.status_var.set("Another operation is still running")
+            return
+            
+        export_format = self.ask_export_format()
+        if export_format is None:
+            return
+        if export_format == "mirror" and not messagebox.askyesno(
+                "Confirm Mirror Export",
+                "Images exported to this folder earlier that are not in the current workspace "
+                "will be deleted from it, together with their tag files.\n\nContinue?",
+                icon="warning"):
+            return
+            
+        from src.folder_export import FolderExportJob
+        from src.shard_export import ShardExportJob
+        from src.training_export import TrainingExportJob
+        
         # Create dataset directory
         dataset_dir = os.path.join(dest_dir, "dataset")
         try:
@@ -484,46 +1111,117 @@ class MainWindow:
         except Exception as e:
             messagebox.showerror("Export Error", f"Failed to create dataset directory: {str(e)}")
             return
+            
+        if export_format == "training":
+            def on_done(job):
+                messagebox.showinfo("Export Results", job.summary())
+                if job.cancelled:
+                    self.status_var.set("Export cancelled")
+                    return
+                self.finish_export(f"Export complete: {job.exported} images in {len(job.buckets)} buckets.",
+                                   current_width, current_height)
+                
+            # Resizing and encoding run on a process pool across all cores
+            job = TrainingExportJob(self.workspace_images, dataset_dir,
+                                    lambda image_path: join_tags(self.tag_index.get_tags(image_path)))
+            self.run_bulk_job(job, "Exporting", on_done)
+            return
+            
+        if export_format == "shards":
+            def on_done(job):
+                if job.errors or job.cancelled:
+                    messagebox.showinfo("Export Results", job.summary())
+                if job.cancelled:
+                    self.status_var.set("Export cancelled")
+                    return
+                self.finish_export(f"Export complete: {job.exported} images in {len(job.shards)} shards.",
+                                   current_width, current_height)
+                
+            job = ShardExportJob(self.workspace_images, dataset_dir,
+                                 lambda image_path: join_tags(self.tag_index.get_tags(image_path)))
+            self.run_bulk_job(job, "Exporting", on_done)
+            return
         
-        # Count exported files for status update
-        exported_images = 0
-        exported_tags = 0
+        # Only new or changed files are copied; an interrupted export resumes
+        def on_done(job):
+            if job.errors or job.cancelled or job.resumed:
+                messagebox.showinfo("Export Results", job.summary())
+            if job.cancelled:
+                self.status_var.set("Export cancelled")
+                return
+            self.finish_export(f"Export complete: {job.copied} images copied, {job.unchanged} unchanged, "
+                               f"{job.removed} removed.", current_width, current_height)
+            
+        job = FolderExportJob(self.workspace_images, self.image_loader.image_folder, dataset_dir,
+                              lambda image_path: join_tags(self.tag_index.get_tags(image_path)),
+                              mirror=export_format == "mirror")
+        self.run_bulk_job(job, "Exporting", on_done)
+
+    def ask_export_format(self):
+        """
+        Ask how the dataset should be exported.
         
-        # Get source images folder
-        source_folder = os.path.dirname(self.images[0])
+        Returns:
+            str: "folder", "mirror", "shards" or "training", or None if the user cancelled
+        """
+        dialog = Toplevel(self.master)
+        dialog.title("Export Format")
+        dialog.transient(self.master)
+        dialog.resizable(False, False)
+        
+        choice = StringVar(value="folder")
+        result = []
+        options = [
+            ("folder", "Folder of image and .txt files (only changes are copied)"),
+            ("mirror", "Folder mirroring the workspace (deletes exported images no longer in it)"),
+            ("shards", "Tar shards of image and tag pairs with an index.json"),
+            ("training", "Training-ready: resized JPEGs in aspect-ratio bucket folders"),
+        ]
+        Label(dialog, text="Export the dataset as:", font=("Arial", 10, "bold")).pack(anchor=tk.W, padx=10, pady=(10, 5))
+        for value, text in options:
+            tk.Radiobutton(dialog, text=text, variable=choice, value=value).pack(anchor=tk.W, padx=20)
+            
+        def accept():
+            result.append(choice.get())
+            dialog.destroy()
+            
+        buttons = Frame(dialog)
+        buttons.pack(pady=10)
+        NavigationButton(buttons, text="Export", command=accept).pack(side=tk.LEFT, padx=5)
+        NavigationButton(buttons, text="Cancel", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+        
+        dialog.grab_set()
+        self.master.wait_window(dialog)
+        return result[0] if result else None
+
+    def finish_export(self, message, current_width, current_height):
+        """Report a finished export and offer to clear the workspace."""
+        source_folder = self.image_loader.image_folder
         
-        # Export all images and tag files
-        for image_path in self.images:
-            try:
-                # Get file name
-                filename = os.path.basename(image_path)
-                file_name, file_ext = os.path.splitext(filename)
-                
-                # Copy image file
-                shutil.copy2(image_path, os.path.join(dataset_dir, filename))
-                exported_images += 1
-                
-                # Check for tag file
-                tag_file = os.path.join(source_folder, f"{file_name}.txt")
-                if os.path.exists(tag_file):
-                    shutil.copy2(tag_file, os.path.join(dataset_dir, f"{file_name}.txt"))
-                    exported_tags += 1
-            except Exception as e:
-                messagebox.showerror("Export Error", f"Error exporting {filename}: {str(e)}")
-                
         # When resetting the UI after clearing workspace
-        if messagebox.askyesno("Clear Workspace", 
-                             f"Export complete: {exported_images} images and {exported_tags} tag files exported.\n\nClear current workspace?"):
+        if messagebox.askyesno("Clear Workspace", f"{message}\n\nClear current workspace?"):
+            # Write pending tag changes now so they can't recreate files afterwards
+            if not self.tag_manager.flush():
+                messagebox.showerror("Clear Error", "Pending tag changes could not be written, "
+                                     "the workspace was not cleared.")
+                self.status_var.set(message)
+                self.master.geometry(f"{current_width}x{current_height}")
+                return
             try:
-                # Clear all files from the images folder
-                for file_path in os.listdir(source_folder):
-                    full_path = os.path.join(source_folder, file_path)
-                    if os.path.isfile(full_path) and not file_path == '.gitkeep':
-                        os.remove(full_path)
+                # Clear all images and tags, including those in sub-folders
+                self.image_loader.clear_images()
+                # Images added from now on are a new batch for exports
+                next_workspace_generation(source_folder)
                 
                 # Reset the UI
-                self.images = []
-                self.current_image_index = 0
+                self.stop_scan()
+                self.tag_manager.forget_images(self.workspace_images)
+                self.navigator.set_images([])
+                self.search_field.clear()
+                self.tag_index.clear()
+                self.prefetcher.cache.invalidate()
+                if self.thumbnail_grid is not None:
+                    self.thumbnail_grid.set_images(self.images)
                 self.current_image_path = None
                 self.tag_var.set("")
                 self.image_label.config(image=None)
@@ -535,7 +1233,7 @@ class MainWindow:
             except Exception as e:
                 messagebox.showerror("Clear Error", f"Error clearing workspace: {str(e)}")
         else:
-            self.status_var.set(f"Exported {exported_images} images and {exported_tags} tag files")
+            self.status_var.set(message)
             
         # Ensure buttons remain visible by maintaining window size
         self.master.geometry(f"{current_width}x{current_height}")
@@ -555,71 +1253,42 @@ class MainWindow:
         if not folder_path:
             return  # User cancelled
             
-        # Get list of valid image extensions
-        valid_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
-        
-        # Count for status update
-        tagged_count = 0
-        already_tagged = 0
-        
-        # Process all files in the folder
-        for filename in os.listdir(folder_path):
-            # Skip directories and non-image files
-            file_path = os.path.join(folder_path, filename)
-            if os.path.isdir(file_path):
-                continue
-                
-            # Check if it's an image
-            file_name, file_ext = os.path.splitext(filename)
-            if file_ext.lower() not in valid_extensions:
-                continue
-                
-            # Check for existing tag file
-            tag_file_path = os.path.join(folder_path, f"{file_name}.txt")
+        if self.bulk_job is not None:
+            self.status_var.set("Another tagging operation is still running")
+            return
             
-            try:
-                existing_tags = ""
-                # Read existing tags if the file exists
-                if os.path.exists(tag_file_path):
-                    with open(tag_file_path, 'r', encoding='utf-8') as f:
-                        existing_tags = f.read().strip()
-                        
-                # Process the tags
-                tags_list = [t.strip() for t in existing_tags.split(',') if t.strip()]
-                
-                # Skip if tag already exists
-                if tag in tags_list:
-                    already_tagged += 1
-                    continue
-                    
-                # Add the new tag and save
-                tags_list.append(tag)
-                new_tags = ', '.join(tags_list)
+        # Collect the image files in the folder
+        try:
+            image_paths = [entry.path for entry in os.scandir(folder_path)
+                           if entry.is_file() and os.path.splitext(entry.name)[1].lower() in VALID_EXTENSIONS]
+        except Exception as e:
+            messagebox.showerror("Tag Error", f"Error reading {folder_path}: {str(e)}")
+            return
+            
+        if not image_paths:
+            messagebox.showinfo("Tag Folder Results", "No images found in the selected folder.")
+            return
+        
+        def on_done(job):
+            # Show results
+            result_message = f"Tagged {job.changed} images with '{tag}'\n"
+            if job.unchanged > 0:
+                result_message += f"{job.unchanged} images already had this tag\n"
+            if job.errors or job.cancelled:
+                result_message += "\n" + job.summary()
                 
-                # Write updated tags
-                with open(tag_file_path, 'w', encoding='utf-8') as f:
-                    f.write(new_tags)
-                    
-                tagged_count += 1
-                    
-            except Exception as e:
-                messagebox.showerror("Tag Error", f"Error tagging {filename}: {str(e)}")
+            messagebox.showinfo("Tag Folder Results", result_message)
+            self.status_var.set(f"Tagged {job.changed} external images with '{tag}'")
         
-        # Show results
-        total_images = tagged_count + already_tagged
-        result_message = f"Tagged {tagged_count} images with '{tag}'\n"
-        if already_tagged > 0:
-            result_message += f"{already_tagged} images already had this tag"
-            
-        if total_images == 0:
-            result_message = f"No images found in the selected folder."
-            
-        messagebox.showinfo("Tag Folder Results", result_message)
-        self.status_var.set(f"Tagged {tagged_count} external images with '{tag}'")
+        from src.bulk_tagger import BulkTagJob, add_tag
+        
+        # External folders always use .txt tag files, whatever the workspace backend
+        job = BulkTagJob(image_paths, add_tag(tag), SidecarBackend())
+        self.run_bulk_job(job, f"Tagging folder with '{tag}'", on_done)
 
     def clear_folder(self):
         """Clear all images and tags from the images folder."""
-        if not self.images:
+        if not self.workspace_images:
             messagebox.showinfo("Clear Folder", "No images to clear.")
             return
             
@@ -641,23 +1310,27 @@ class MainWindow:
         current_width = self.master.winfo_width()
         current_height = self.master.winfo_height()
         
-        # Get source images folder
-        source_folder = os.path.dirname(self.images[0])
+        # Write pending tag changes now so they can't recreate files afterwards
+        self.tag_manager.flush()
         
-        # Count deleted files
-        deleted_count = 0
+        # Get source images folder
+        source_folder = self.image_loader.image_folder
         
         try:
-            # Clear all files from the images folder
-            for file_path in os.listdir(source_folder):
-                full_path = os.path.join(source_folder, file_path)
-                if os.path.isfile(full_path) and not file_path == '.gitkeep':
-                    os.remove(full_path)
-                    deleted_count += 1
+            # Clear all images and tags, including those in sub-folders
+            deleted_count = self.image_loader.clear_images()
+            # Images added from now on are a new batch for exports
+            next_workspace_generation(source_folder)
             
             # Reset the UI
-            self.images = []
-            self.current_image_index = 0
+            self.stop_scan()
+            self.tag_manager.forget_images(self.workspace_images)
+            self.navigator.set_images([])
+            self.search_field.clear()
+            self.tag_index.clear()
+            self.prefetcher.cache.invalidate()
+            if self.thumbnail_grid is not None:
+                self.thumbnail_grid.set_images(self.images)
             self.current_image_path = None
             self.tag_var.set("")
             
@@ -0,0 +1,254 @@
+import math
+import os
+import queue
+import threading
+import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import Canvas, Frame, Scrollbar
+from PIL import ImageTk
+
+from src.preview import load_preview, fit_size
+
+
+class ThumbnailGrid(Frame):
+    """
+    Scrollable, virtualized grid of image thumbnails.
+
+    Only the cells that fit in the visible area exist as canvas items. When
+    scrolling, the same cells are reused for the newly visible images, so the
+    cost of drawing and the number of PhotoImage objects don't depend on the
+    size of the workspace. Thumbnails are decoded on worker threads and handed
+    to the Tk thread through a queue that is polled with after().
+    """
+
+    def __init__(self, master=None, images=None, on_select=None, preview_store=None,
+                 thumb_size=128, max_workers=2, **kwargs):
+        super().__init__(master, **kwargs)
+
+        self.images = images if images is not None else []
+        self.on_select = on_select
+        self.preview_store = preview_store
+        self.thumb_size = thumb_size
+        self.current_index = None
+
+        # Cell geometry: thumbnail plus a line of text for the filename
+        self.cell_width = thumb_size + 16
+        self.cell_height = thumb_size + 36
+        self.columns = 1
+        self.visible_rows = 1
+        self.first_row = 0
+
+        # Canvas items of the recycled cells: (outline, image, text)
+        self.cells = []
+
+        # Bounded LRU of thumbnails that were converted to PhotoImage
+        self.photos = OrderedDict()
+        self.max_photos = 64
+
+        # Background decoding
+        self._results = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="amalthea-thumbnails")
+        self._wanted = set()
+        self._pending = set()
+        self._lock = threading.Lock()
+
+        # Canvas and scrollbar
+        self.canvas = Canvas(self, bg="#f5f5f5", highlightthickness=0)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.scrollbar = Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.canvas.bind("<Configure>", self._layout)
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind("<Button-4>", lambda event: self.scroll_rows(-1))
+        self.canvas.bind("<Button-5>", lambda event: self.scroll_rows(1))
+
+        self._poll_id = self.after(30, self._poll_results)
+
+    @property
+    def total_rows(self):
+        return max(1, math.ceil(len(self.images) / self.columns))
+
+    def set_images(self, images):
+        """Replace the list of images shown in the grid."""
+        self.images = images
+        self.photos.clear()
+        self.first_row = 0
+        self._render()
+
+    def extend_images(self, images):
+        """Show a longer version of the same image list, keeping the scroll position."""
+        self.images = images
+        self._render()
+
+    def set_current(self, index):
+        """Highlight the image at index and scroll it into view."""
+        self.current_index = index
+        if index is not None:
+            row = index // self.columns
+            if row < self.first_row:
+                self.first_row = row
+            elif row >= self.first_row + self.visible_rows:
+                self.first_row = row - self.visible_rows + 1
+        self._render()
+
+    def scroll_rows(self, rows):
+        """Scroll the grid by a number of rows."""
+        self._scroll_to(self.first_row + rows)
+
+    def _scroll_to(self, row):
+        max_first_row = max(0, self.total_rows - self.visible_rows)
+        row = min(max(0, row), max_first_row)
+        if row != self.first_row:
+            self.first_row = row
+            self._render()
+
+    def _layout(self, event=None):
+        """Resize the cell pool to fit the canvas and redraw."""
+        width = max(self.canvas.winfo_width(), self.cell_width)
+        height = max(self.canvas.winfo_height(), self.cell_height)
+        self.columns = max(1, width // self.cell_width)
+        self.visible_rows = max(1, math.ceil(height / self.cell_height))
+
+        pool_size = self.columns * self.visible_rows
+        # Keep enough thumbnails around to scroll back a screen without reloading
+        self.max_photos = max(64, pool_size * 3)
+
+        while len(self.cells) < pool_size:
+            outline = self.canvas.create_rectangle(0, 0, 0, 0, outline="", width=3)
+            image = self.canvas.create_image(0, 0, anchor=tk.CENTER)
+            text = self.canvas.create_text(0, 0, anchor=tk.N, font=("Arial", 8))
+            self.cells.append((outline, image, text))
+        while len(self.cells) > pool_size:
+            for item in self.cells.pop():
+                self.canvas.delete(item)
+
+        self._render()
+
+    def _render(self):
+        """Point every cell at the image it currently shows."""
+        first_index = self.first_row * self.columns
+        visible_paths = []
+
+        for slot, (outline, image_item, text_item) in enumerate(self.cells):
+            index = first_index + slot
+            if index >= len(self.images):
+                for item in (outline, image_item, text_item):
+                    self.canvas.itemconfig(item, state=tk.HIDDEN)
+                continue
+
+            path = self.images[index]
+            visible_paths.append(path)
+
+            row, column = divmod(slot, self.columns)
+            x = column * self.cell_width
+            y = row * self.cell_height
+            center_x = x + self.cell_width // 2
+
+            self.canvas.coords(outline, x + 2, y + 2, x + self.cell_width - 2, y + self.cell_height - 2)
+            self.canvas.itemconfig(outline, state=tk.NORMAL,
+                                   outline="#4285F4" if index == self.current_index else "")
+
+            photo = self.photos.get(path)
+            if photo is not None:
+                self.photos.move_to_end(path)
+            self.canvas.coords(image_item, center_x, y + 8 + self.thumb_size // 2)
+            self.canvas.itemconfig(image_item, state=tk.NORMAL, image=photo if photo is not None else "")
+
+            name = os.path.basename(path)
+            if len(name) > 22:
+                name = name[:19] + "..."
+            self.canvas.coords(text_item, center_x, y + self.thumb_size + 14)
+            self.canvas.itemconfig(text_item, state=tk.NORMAL, text=name)
+
+        self._request(visible_paths)
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        total_rows = self.total_rows
+        first = self.first_row / total_rows
+        last = min(1.0, (self.first_row + self.visible_rows) / total_rows)
+        self.scrollbar.set(first, last)
+
+    def _request(self, paths):
+        """Queue decoding of the visible thumbnails that aren't loaded yet."""
+        with self._lock:
+            self._wanted = set(paths)
+            for path in paths:
+                if path in self.photos or path in self._pending:
+                    continue
+                self._pending.add(path)
+                self._executor.submit(self._load_thumbnail, path)
+
+    def _load_thumbnail(self, path):
+        """Worker: decode and scale a single thumbnail."""
+        try:
+            with self._lock:
+                # Skip cells that were scrolled away before we got to them
+                if path not in self._wanted:
+                    return
+
+            stored = self.preview_store.get(path) if self.preview_store else None
+            if stored is not None:
+                image = stored[0]
+                target = fit_size(image.size, (self.thumb_size, self.thumb_size))
+                if target is not None:
+                    image = image.resize(target)
+            else:
+                image, _ = load_preview(path, (self.thumb_size, self.thumb_size))
+            self._results.put((path, image))
+        except Exception as e:
+            print(f"Error loading thumbnail for {os.path.basename(path)}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+
+    def _poll_results(self):
+        """Move decoded thumbnails into the grid on the Tk thread."""
+        updated = False
+        try:
+            while True:
+                path, image = self._results.get_nowait()
+                self.photos[path] = ImageTk.PhotoImage(image)
+                self.photos.move_to_end(path)
+                updated = True
+        except queue.Empty:
+            pass
+
+        if updated:
+            while len(self.photos) > self.max_photos:
+                self.photos.popitem(last=False)
+            self._render()
+
+        self._poll_id = self.after(30, self._poll_results)
+
+    def _on_scrollbar(self, action, value, units=None):
+        if action == tk.MOVETO:
+            self._scroll_to(int(float(value) * self.total_rows))
+        elif action == tk.SCROLL:
+            step = 1 if units == tk.UNITS else self.visible_rows
+            self.scroll_rows(int(value) * step)
+
+    def _on_mousewheel(self, event):
+        self.scroll_rows(-1 if event.delta > 0 else 1)
+
+    def _on_click(self, event):
+        column = event.x // self.cell_width
+        row = event.y // self.cell_height
+        if column >= self.columns:
+            return
+        index = (self.first_row + row) * self.columns + column
+        if index < len(self.images) and self.on_select:
+            self.on_select(index)
+
+    def destroy(self):
+        """Stop background decoding before the widget goes away."""
+        self.after_cancel(self._poll_id)
+        with self._lock:
+            self._wanted = set()
+        self._executor.shutdown(wait=False)
+        super().destroy()
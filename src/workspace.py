@@ -0,0 +1,116 @@
+import os
+
+from src.tag_manager import TagManager, SidecarBackend
+from src.sqlite_tag_backend import SQLiteTagBackend
+from src.tag_journal import JournaledBackend
+
+
+def get_state_dir(image_folder):
+    """
+    Get the directory where Amalthea keeps caches and indexes for a workspace.
+
+    The state directory lives next to the image folder (for the default
+    workspace that is the project root) in a hidden ".amalthea" folder, with
+    one sub-folder per workspace.
+
+    Args:
+        image_folder (str): Full path to the workspace image folder
+
+    Returns:
+        str: Full path to the (existing) state directory
+    """
+    image_folder = os.path.abspath(image_folder)
+    state_dir = os.path.join(os.path.dirname(image_folder), ".amalthea",
+                             os.path.basename(image_folder))
+    os.makedirs(state_dir, exist_ok=True)
+    return state_dir
+
+
+def file_identity(path):
+    """
+    Get the (size, mtime) identity of a file, used to detect changed files.
+
+    Returns:
+        tuple: (size in bytes, modification time in nanoseconds), or None if
+            the file can't be accessed
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def workspace_generation(image_folder):
+    """
+    Get the generation of a workspace, which goes up every time it is cleared.
+
+    Exports use it to tell a changed image from a new image of a later batch
+    that happens to have the same name.
+
+    Args:
+        image_folder (str): Full path to the workspace image folder
+
+    Returns:
+        int: The generation, 0 for a workspace that was never cleared
+    """
+    try:
+        with open(os.path.join(get_state_dir(image_folder), "generation"), 'r', encoding='utf-8') as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+    except Exception as e:
+        print(f"Error reading workspace generation: {str(e)}")
+        return 0
+
+
+def next_workspace_generation(image_folder):
+    """
+    Start a new generation of a workspace, after it was cleared.
+
+    Args:
+        image_folder (str): Full path to the workspace image folder
+
+    Returns:
+        int: The new generation
+    """
+    generation = workspace_generation(image_folder) + 1
+    path = os.path.join(get_state_dir(image_folder), "generation")
+    try:
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(str(generation))
+        os.replace(path + ".tmp", path)
+    except Exception as e:
+        print(f"Error saving workspace generation: {str(e)}")
+    return generation
+
+
+def open_tag_manager(image_folder, backend=None):
+    """
+    Create the tag manager of a workspace.
+
+    Tags go into a SQLite database in the state folder when the backend is
+    "sqlite", and into .txt files (behind a crash-safe journal) otherwise.
+
+    Args:
+        image_folder (str): Full path to the workspace image folder
+        backend (str): "sidecar" or "sqlite", defaults to the
+            AMALTHEA_TAG_BACKEND environment variable
+
+    Returns:
+        TagManager: The tag manager
+    """
+    state_dir = get_state_dir(image_folder)
+    if backend is None:
+        backend = os.environ.get("AMALTHEA_TAG_BACKEND", "sidecar")
+    if backend.lower() == "sqlite":
+        try:
+            db_path = os.path.join(state_dir, "tags.db")
+            return TagManager(SQLiteTagBackend(db_path, sync_interval=30))
+        except Exception as e:
+            print(f"Error opening tag database, using tag files: {str(e)}")
+    try:
+        return TagManager(JournaledBackend(SidecarBackend(), os.path.join(state_dir, "tags.journal")))
+    except Exception as e:
+        print(f"Error opening tag journal, writing tag files directly: {str(e)}")
+        return TagManager()
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+# The modules are imported as "src.<module>" from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def make_image(tmp_path):
+    """Create a small image file, optionally with a tag file next to it."""
+    def make(name, tags=None, color="red", folder=None):
+        folder = folder if folder is not None else tmp_path
+        os.makedirs(folder, exist_ok=True)
+        image_path = os.path.join(str(folder), name)
+        Image.new("RGB", (8, 8), color).save(image_path)
+        if tags is not None:
+            with open(os.path.splitext(image_path)[0] + ".txt", "w", encoding="utf-8") as tag_file:
+                tag_file.write(tags)
+        return image_path
+    return make
+
+
+def read_tag_file(image_path):
+    """Return the contents of an image's tag file, or None if it has none."""
+    tag_file_path = os.path.splitext(image_path)[0] + ".txt"
+    if not os.path.exists(tag_file_path):
+        return None
+    with open(tag_file_path, "r", encoding="utf-8") as tag_file:
+        return tag_file.read()
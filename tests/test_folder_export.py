@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+
+from src.folder_export import FolderExportJob
+from src.tag_manager import SidecarBackend
+from src.workspace import next_workspace_generation
+
+
+def export(images, source, dest, mirror=False):
+    job = FolderExportJob(images, str(source), str(dest), SidecarBackend().read, max_workers=2,
+                          mirror=mirror).run()
+    assert not job.errors, job.summary()
+    return job
+
+
+def exported_files(dest):
+    return sorted(name for name in os.listdir(dest) if not name.startswith("."))
+
+
+def test_export_again_only_writes_changes(tmp_path, make_image):
+    source, dest = tmp_path / "images", tmp_path / "dataset"
+    images = [make_image("a.png", tags="cat", folder=source), make_image("b.png", tags="dog", folder=source)]
+    job = export(images, source, dest)
+    assert job.copied == 2
+    assert exported_files(dest) == ["a.png", "a.txt", "b.png", "b.txt"]
+
+    job = export(images, source, dest)
+    assert (job.copied, job.unchanged, job.tags_written) == (0, 2, 0)
+
+    with open(source / "b.txt", "w", encoding="utf-8") as tag_file:
+        tag_file.write("dog, cat")
+    job = export(images, source, dest)
+    assert (job.copied, job.unchanged, job.tags_written) == (0, 1, 1)
+    with open(dest / "b.txt", encoding="utf-8") as tag_file:
+        assert tag_file.read() == "dog, cat"
+
+
+def test_changed_image_replaces_its_export(tmp_path, make_image):
+    source, dest = tmp_path / "images", tmp_path / "dataset"
+    image_path = make_image("a.png", tags="cat", folder=source)
+    export([image_path], source, dest)
+
+    make_image("a.png", color="blue", folder=source)
+    os.utime(image_path, ns=(1, 1))
+    job = export([image_path], source, dest)
+
+    assert (job.copied, job.unchanged) == (1, 0)
+    assert exported_files(dest) == ["a.png", "a.txt"]
+    with open(image_path, "rb") as source_file, open(dest / "a.png", "rb") as exported_file:
+        assert source_file.read() == exported_file.read()
+
+
+def test_next_batch_keeps_earlier_exports(tmp_path, make_image):
+    source, dest = tmp_path / "images", tmp_path / "dataset"
+    export([make_image("a.png", tags="first", folder=source)], source, dest)
+
+    # Clear the workspace and export a new image with the same name
+    shutil.rmtree(source)
+    next_workspace_generation(str(source))
+    job = export([make_image("a.png", tags="second", color="blue", folder=source)], source, dest)
+
+    assert job.copied == 1
+    assert job.removed == 0
+    assert exported_files(dest) == ["a.png", "a.txt", "a_1.png", "a_1.txt"]
+    with open(dest / "a.txt", encoding="utf-8") as tag_file:
+        assert tag_file.read() == "first"
+    with open(dest / "a_1.txt", encoding="utf-8") as tag_file:
+        assert tag_file.read() == "second"
+
+
+def test_mirror_removes_images_that_left_the_workspace(tmp_path, make_image):
+    source, dest = tmp_path / "images", tmp_path / "dataset"
+    images = [make_image("a.png", tags="cat", folder=source), make_image("b.png", tags="dog", folder=source)]
+    export(images, source, dest, mirror=True)
+
+    os.remove(images[1])
+    job = export(images[:1], source, dest, mirror=True)
+
+    assert job.removed == 1
+    assert exported_files(dest) == ["a.png", "a.txt"]
+
+
+def test_interrupted_export_resumes_from_the_log(tmp_path, make_image):
+    source, dest = tmp_path / "images", tmp_path / "dataset"
+    images = [make_image("a.png", tags="cat", folder=source), make_image("b.png", tags="dog", folder=source)]
+    export(images[:1], source, dest)
+
+    # An export of both images that stopped after a.png: only the log has it
+    manifest_path = dest / ".amalthea-export.json"
+    with open(manifest_path, encoding="utf-8") as manifest_file:
+        entry = json.load(manifest_file)["files"]["a.png"]
+    os.remove(manifest_path)
+    with open(dest / ".amalthea-export.log", "w", encoding="utf-8") as log:
+        log.write(json.dumps(["a.png", entry]) + "\n")
+
+    job = export(images, source, dest)
+    assert job.resumed == 1
+    assert (job.copied, job.unchanged) == (1, 1)
+    assert exported_files(dest) == ["a.png", "a.txt", "b.png", "b.txt"]
+    assert os.path.exists(manifest_path)
+    assert not os.path.exists(dest / ".amalthea-export.log")
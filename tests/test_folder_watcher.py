@@ -0,0 +1,31 @@
+import os
+import time
+
+from src.folder_watcher import FolderWatcher
+
+
+def wait_for_changes(watcher, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        changes = watcher.get_changes()
+        if changes is not None:
+            return changes
+        time.sleep(0.02)
+    return None
+
+
+def test_polling_reports_files_rewritten_in_place(tmp_path, make_image, monkeypatch):
+    monkeypatch.setattr("src.folder_watcher._open_inotify", lambda folder: None)
+    image_path = make_image("a.png", folder=tmp_path)
+    watcher = FolderWatcher(str(tmp_path), (".png",), debounce=0.05, poll_interval=0.05).start()
+    try:
+        assert watcher.mode == "polling"
+
+        # A rewrite keeps the name and often the size
+        make_image("a.png", color="blue", folder=tmp_path)
+        os.utime(image_path, ns=(1, 1))
+        make_image("b.png", folder=tmp_path)
+
+        assert wait_for_changes(watcher) == ({str(tmp_path / "b.png")}, set(), {image_path})
+    finally:
+        watcher.stop()
@@ -0,0 +1,122 @@
+import json
+import os
+
+import pytest
+
+from src.image_loader import ImageLoader
+
+
+@pytest.fixture
+def loader(tmp_path):
+    return ImageLoader(str(tmp_path / "images"))
+
+
+def write_file(path, data=b"x"):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def manifest_entries(loader):
+    with open(loader.manifest_path, encoding="utf-8") as f:
+        return {entry[0]: entry[1:] for entry in json.load(f)["entries"]}
+
+
+def age_manifest(loader):
+    """Pretend the last scan happened long ago, so the folder mtime can be trusted."""
+    with open(loader.manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest["scanned_at_ns"] = manifest["folder_mtime_ns"] + 10 ** 10
+    with open(loader.manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+
+def test_rescan_merges_added_and_removed_files(loader):
+    folder = loader.image_folder
+    loader.load_images()
+    write_file(os.path.join(folder, "b.png"))
+    write_file(os.path.join(folder, "a.jpg"))
+    write_file(os.path.join(folder, "notes.txt"))
+    assert loader.load_images() == [os.path.join(folder, "a.jpg"), os.path.join(folder, "b.png")]
+
+    os.remove(os.path.join(folder, "a.jpg"))
+    write_file(os.path.join(folder, "c.gif"), b"xyz")
+    assert loader.load_images() == [os.path.join(folder, "b.png"), os.path.join(folder, "c.gif")]
+    assert manifest_entries(loader)["c.gif"][0] == 3
+
+
+def test_unchanged_folder_uses_the_manifest(loader):
+    folder = loader.image_folder
+    loader.load_images()
+    path = write_file(os.path.join(folder, "a.png"))
+    loader.load_images()
+    age_manifest(loader)
+
+    # An entry the folder doesn't have proves the folder wasn't listed again
+    with open(loader.manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest["entries"].append(["ghost.png", 1, 1])
+    with open(loader.manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    assert loader.load_images() == [path, os.path.join(folder, "ghost.png")]
+
+
+def test_update_manifest_records_modified_files(loader):
+    folder = loader.image_folder
+    loader.load_images()
+    path = write_file(os.path.join(folder, "a.png"))
+    loader.load_images()
+
+    write_file(path, b"longer")
+    loader.update_manifest(modified=[path])
+    assert manifest_entries(loader)["a.png"][0] == 6
+
+
+def set_folder_mtime(loader, seconds):
+    os.utime(loader.image_folder, ns=(seconds * 10 ** 9, seconds * 10 ** 9))
+
+
+def test_update_manifest_takes_the_new_folder_mtime(loader):
+    loader.load_images()
+    set_folder_mtime(loader, 1000)
+    loader.load_images()
+    before = loader.folder_mtime()
+
+    imported = write_file(os.path.join(loader.image_folder, "imported.png"))
+    set_folder_mtime(loader, 2000)
+    loader.update_manifest(added=[imported], folder_mtime_ns=before)
+
+    with open(loader.manifest_path, encoding="utf-8") as f:
+        assert json.load(f)["folder_mtime_ns"] == loader.folder_mtime()
+
+
+def test_update_manifest_keeps_unknown_changes_visible(loader):
+    loader.load_images()
+    set_folder_mtime(loader, 1000)
+    loader.load_images()
+
+    # Another program adds a file, then an import adds its own
+    other = write_file(os.path.join(loader.image_folder, "other.png"))
+    set_folder_mtime(loader, 2000)
+    before = loader.folder_mtime()
+    imported = write_file(os.path.join(loader.image_folder, "imported.png"))
+    set_folder_mtime(loader, 3000)
+    loader.update_manifest(added=[imported], folder_mtime_ns=before)
+
+    assert loader.load_images() == [imported, other]
+
+
+def test_clear_images_includes_sub_folders(loader, make_image):
+    folder = loader.image_folder
+    make_image("a.png", tags="cat", folder=folder)
+    make_image("b.jpg", tags="dog", folder=os.path.join(folder, "sub", "deeper"))
+    write_file(os.path.join(folder, ".gitkeep"))
+    write_file(os.path.join(folder, "sub", "notes.md"))
+    hidden = make_image("c.png", folder=os.path.join(folder, ".hidden"))
+
+    assert loader.clear_images() == 4
+    assert sorted(os.listdir(folder)) == [".gitkeep", ".hidden", "sub"]
+    assert sorted(os.listdir(os.path.join(folder, "sub"))) == ["deeper", "notes.md"]
+    assert os.listdir(os.path.join(folder, "sub", "deeper")) == []
+    assert os.path.exists(hidden)
+    assert list(loader.iter_images()) == []
@@ -0,0 +1,79 @@
+import pytest
+
+from src.image_loader import ImageNavigator, CompactPathList
+
+
+@pytest.fixture(params=[list, CompactPathList])
+def navigator(request):
+    return ImageNavigator(request.param([f"/w/{name}.png" for name in "bdfh"]))
+
+
+def test_navigation_wraps_around(navigator):
+    assert navigator.current == "/w/b.png"
+    assert navigator.prev() == "/w/h.png"
+    assert navigator.next() == "/w/b.png"
+    assert navigator.jump_to("f.png")
+    assert navigator.index == 2
+    assert navigator.jump_to("/w/d.png")
+    assert not navigator.jump_to("/w/x.png")
+    assert not navigator.jump(4)
+
+
+def test_insert_keeps_order_and_current_image(navigator):
+    navigator.jump_to("/w/d.png")
+    images = navigator.images
+    assert navigator.insert(["/w/a.png", "/w/e.png", "/w/d.png"]) == ["/w/a.png", "/w/e.png"]
+
+    assert list(navigator.images) == ["/w/a.png", "/w/b.png", "/w/d.png", "/w/e.png", "/w/f.png", "/w/h.png"]
+    # A few inserts update the list in place instead of copying it
+    assert navigator.images is images
+    assert navigator.current == "/w/d.png"
+    assert navigator.position("/w/e.png") == 3
+
+
+def test_many_inserts_are_merged(navigator):
+    added = [f"/w/c{number:02d}.png" for number in range(40)]
+    navigator.jump_to("/w/d.png")
+    navigator.insert(added)
+
+    assert list(navigator.images) == sorted(["/w/b.png", "/w/d.png", "/w/f.png", "/w/h.png"] + added)
+    assert navigator.current == "/w/d.png"
+
+
+def test_remove_selects_the_successor(navigator):
+    navigator.jump_to("/w/d.png")
+    assert sorted(navigator.remove(["/w/b.png", "/w/d.png", "/w/x.png"])) == ["/w/b.png", "/w/d.png"]
+
+    assert list(navigator.images) == ["/w/f.png", "/w/h.png"]
+    assert navigator.current == "/w/f.png"
+
+
+def test_extend_appends_pages(navigator):
+    navigator.jump_to("/w/f.png")
+    navigator.extend(["/w/i.png", "/w/j.png"])
+    # A page that doesn't sort after the last image is inserted instead
+    navigator.extend(["/w/c.png"])
+
+    assert list(navigator.images) == ["/w/b.png", "/w/c.png", "/w/d.png", "/w/f.png", "/w/h.png",
+                                      "/w/i.png", "/w/j.png"]
+    assert navigator.current == "/w/f.png"
+
+
+def test_filter_follows_changes(navigator):
+    navigator.set_filter(["/w/d.png", "/w/h.png"])
+    assert list(navigator.images) == ["/w/d.png", "/w/h.png"]
+
+    navigator.insert(["/w/c.png"])
+    navigator.remove(["/w/h.png"])
+    assert list(navigator.images) == ["/w/d.png"]
+    assert len(navigator.all_images) == 4
+
+    navigator.set_filter(None)
+    assert list(navigator.images) == ["/w/b.png", "/w/c.png", "/w/d.png", "/w/f.png"]
+    assert navigator.current == "/w/d.png"
+
+
+def test_snapshot_is_not_affected_by_changes(navigator):
+    snapshot = navigator.snapshot()
+    navigator.insert(["/w/a.png"])
+    assert len(snapshot) == 4
@@ -0,0 +1,67 @@
+import os
+
+from src.image_loader import VALID_EXTENSIONS
+from src.importer import ContentHashCache, ImportJob, fast_copy
+
+from conftest import read_tag_file
+
+
+def import_folder(source, dest, hash_cache=None, link=False):
+    job = ImportJob(str(source), str(dest), VALID_EXTENSIONS, hash_cache, link=link, max_workers=2).run()
+    assert not job.errors, job.summary()
+    return job
+
+
+def test_duplicates_are_skipped_and_collisions_renamed(tmp_path, make_image):
+    source, dest = tmp_path / "source", tmp_path / "images"
+    existing = make_image("a.png", color="red", folder=dest)
+    make_image("copy_of_a.png", color="red", folder=source)
+    make_image("b.png", color="green", tags="grass", folder=source)
+    make_image("b_again.png", color="green", folder=source)
+    make_image("a.png", color="blue", tags="sky", folder=source)
+
+    job = import_folder(source, dest)
+
+    assert sorted(os.path.basename(path) for path in job.imported) == ["a_1.png", "b.png"]
+    assert sorted((os.path.basename(path), existing_path) for path, existing_path in job.duplicates) == [
+        ("b_again.png", str(source / "b.png")),
+        ("copy_of_a.png", existing),
+    ]
+    assert job.renamed == {"a.png": "a_1.png"}
+    assert job.imported_tags == 2
+    assert read_tag_file(str(dest / "a_1.png")) == "sky"
+    assert read_tag_file(str(dest / "b.png")) == "grass"
+    assert read_tag_file(existing) is None
+    assert not [name for name in os.listdir(dest) if name.endswith(".importing")]
+
+
+def test_importing_again_only_finds_duplicates(tmp_path, make_image):
+    source, dest = tmp_path / "source", tmp_path / "images"
+    make_image("a.png", folder=source)
+    make_image("b.png", color="blue", folder=source)
+    cache_path = str(tmp_path / "hashes.json")
+    import_folder(source, dest, ContentHashCache(cache_path))
+
+    job = import_folder(source, dest, ContentHashCache(cache_path))
+
+    assert job.imported == []
+    assert len(job.duplicates) == 2
+    assert sorted(os.listdir(dest)) == ["a.png", "b.png"]
+    # The workspace hashes were remembered for the next import
+    cache = ContentHashCache(cache_path)
+    stat = os.stat(dest / "a.png")
+    assert cache.get(str(dest / "a.png"), stat.st_size, stat.st_mtime_ns) is not None
+
+
+def test_fast_copy_keeps_content_and_timestamps(tmp_path, make_image):
+    source_path = make_image("a.png")
+    os.utime(source_path, ns=(10 ** 18, 10 ** 18))
+
+    method = fast_copy(source_path, str(tmp_path / "copy.png"))
+    assert method in ("reflink", "copy_file_range", "copy")
+    with open(source_path, "rb") as source_file, open(tmp_path / "copy.png", "rb") as copy_file:
+        assert source_file.read() == copy_file.read()
+    assert os.stat(tmp_path / "copy.png").st_mtime_ns == 10 ** 18
+
+    assert fast_copy(source_path, str(tmp_path / "link.png"), link=True) == "link"
+    assert os.path.samefile(source_path, tmp_path / "link.png")
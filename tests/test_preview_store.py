@@ -0,0 +1,53 @@
+import itertools
+import os
+
+from PIL import Image
+
+from src import preview_store
+from src.preview_store import PreviewStore
+
+# An 8x8 RGB preview takes 192 bytes in the pack
+COLORS = ["red", "green", "blue", "yellow", "white", "black"]
+
+
+def previews(make_image, folder):
+    return {color: make_image(f"{color}.png", color=color, folder=folder) for color in COLORS}
+
+
+def test_compaction_keeps_the_recently_used_previews(tmp_path, make_image, monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr(preview_store.time, "time", lambda: next(clock))
+    images = previews(make_image, tmp_path / "images")
+    state_dir = str(tmp_path)
+    store = PreviewStore(state_dir, root=str(tmp_path / "images"), max_bytes=1000)
+
+    for color in COLORS[:4]:
+        store.put(images[color], Image.new("RGB", (8, 8), color), color)
+    # Reading red makes it more recent than green, blue and yellow
+    assert store.get(images["red"]) is not None
+    for color in COLORS[4:]:
+        store.put(images[color], Image.new("RGB", (8, 8), color), color)
+
+    # Over the cap, the pack was compacted to the three most recently used previews
+    assert os.path.getsize(store.pack_path) < 1000
+    store.close()
+    store = PreviewStore(state_dir, root=str(tmp_path / "images"), max_bytes=1000)
+    kept = [color for color in COLORS if store.get(images[color]) is not None]
+    assert kept == ["red", "white", "black"]
+    image, metadata = store.get(images["red"])
+    assert metadata == "red"
+    assert image.tobytes() == Image.new("RGB", (8, 8), "red").tobytes()
+    store.close()
+
+
+def test_replaced_previews_are_compacted_away(tmp_path, make_image):
+    image_path = make_image("a.png")
+    store = PreviewStore(str(tmp_path), max_bytes=100000)
+
+    for _ in range(300):
+        store.put(image_path, Image.new("RGB", (8, 8), "red"), "")
+
+    # Only one preview is live, so the dead space is dropped long before the cap
+    assert os.path.getsize(store.pack_path) < 100000 // 2
+    assert store.get(image_path)[0].tobytes() == Image.new("RGB", (8, 8), "red").tobytes()
+    store.close()
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+
+from src.image_metadata import MetadataCache
+from src.search_index import SearchIndex
+from src.tag_index import TagIndex
+
+
+def make_generated_image(path, prompt):
+    """Save a PNG with an A1111 style "parameters" text chunk."""
+    info = PngInfo()
+    info.add_text("parameters", prompt)
+    Image.new("RGB", (8, 8), "red").save(path, pnginfo=info)
+    return str(path)
+
+
+@pytest.fixture
+def workspace(tmp_path, make_image):
+    state_dir = tmp_path / "state"
+    state_dir.mkdir()
+    images = [
+        make_generated_image(tmp_path / "a.png", "a castle on a hill, masterpiece"),
+        make_generated_image(tmp_path / "b.png", "a dog in a field"),
+        make_image("c.png"),
+    ]
+    tag_index = TagIndex(None)
+    tag_index.set_tags(images[1], "sketch")
+    tag_index.set_tags(images[2], "castle ruins")
+    metadata_cache = MetadataCache(str(state_dir))
+    index = SearchIndex(str(state_dir), metadata_cache, tag_index)
+    yield images, index, tag_index
+    index.close()
+    metadata_cache.close()
+
+
+def test_search_matches_metadata_and_tags(workspace):
+    (a, b, c), index, _ = workspace
+    assert index.update([a, b, c]) == 3
+
+    assert index.search("cas") == {a, c}
+    assert index.search("castle -ruins") == {a}
+    assert index.search("DOG field") == {b}
+    assert index.search("dog castle") == set()
+    assert index.search("-sketch", [a, b, c]) == {a, c}
+    assert index.search("  ") is None
+
+
+def test_update_only_reads_changed_images(workspace):
+    (a, b, c), index, _ = workspace
+    index.update([a, b, c])
+    assert index.update([a, b, c]) == 0
+
+    make_generated_image(a, "a lighthouse by the sea")
+    os.utime(a, ns=(1, 1))
+    assert index.update([a, b, c]) == 1
+    assert index.search("castle") == {c}
+    assert index.search("lighthouse") == {a}
+
+
+def test_removed_images_leave_the_index(workspace):
+    (a, b, c), index, tag_index = workspace
+    index.update([a, b, c])
+
+    index.remove([b])
+    tag_index.remove_image(b)
+    assert index.search("dog") == set()
+
+    # Pruning drops every image that isn't passed in
+    index.update([a])
+    assert len(index) == 1
+    assert index.search("-anything") == {a}
@@ -0,0 +1,68 @@
+import json
+import os
+import tarfile
+
+from src.shard_export import ShardExportJob, sample_keys, plan_shards
+from src.tag_manager import SidecarBackend
+
+
+def export(images, dest, archive_format="tar"):
+    return ShardExportJob(images, str(dest), SidecarBackend().read, archive_format=archive_format).run()
+
+
+def load_index(dest):
+    with open(dest / "index.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_sample_keys_are_unique():
+    assert sample_keys(["/a/cat.png", "/b/cat.jpg", "/a/my cat.v2.png"]) == ["cat", "cat_1", "my_cat_v2"]
+
+
+def test_plan_shards():
+    assert plan_shards([4, 4, 4, 10, 1], 8) == [(0, 2), (2, 3), (3, 4), (4, 5)]
+    assert plan_shards([], 8) == []
+
+
+def test_tar_shard_members_match_the_index(tmp_path, make_image):
+    images = [make_image("a.png", tags="cat"), make_image("b.png")]
+    dest = tmp_path / "dataset"
+    job = export(images, dest)
+    assert not job.errors
+    assert job.exported == 2
+
+    index = load_index(dest)
+    shard = index["shards"][0]
+    with open(dest / shard["name"], "rb") as f:
+        offset, size = shard["samples"][0]["members"]["a.txt"]
+        f.seek(offset)
+        assert f.read(size) == b"cat"
+    with tarfile.open(dest / shard["name"]) as archive:
+        assert archive.getnames() == ["a.png", "a.txt", "b.png", "b.txt"]
+
+
+def test_next_batch_keeps_earlier_shards(tmp_path, make_image):
+    dest = tmp_path / "dataset"
+    first = export([make_image("one.png", tags="first", folder=tmp_path / "1")], dest)
+    second = export([make_image("one.png", tags="second", folder=tmp_path / "2"),
+                     make_image("two.png", folder=tmp_path / "2")], dest)
+
+    assert first.run_id != second.run_id
+    index = load_index(dest)
+    names = [shard["name"] for shard in index["shards"]]
+    assert names == [first.shards[0]["name"], second.shards[0]["name"]]
+    assert index["samples"] == 3
+    assert sorted(os.listdir(dest)) == sorted(names + ["index.json"])
+    with tarfile.open(dest / names[0]) as archive:
+        assert archive.extractfile("one.txt").read() == b"first"
+
+
+def test_other_format_is_refused(tmp_path, make_image):
+    images = [make_image("a.png")]
+    dest = tmp_path / "dataset"
+    export(images, dest)
+    job = export(images, dest, archive_format="zip")
+
+    assert job.errors
+    assert job.shards == []
+    assert len(load_index(dest)["shards"]) == 1
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from src.tag_edit import TagEditJob, build_tag_edit
+from src.tag_manager import SidecarBackend
+
+from conftest import read_tag_file
+
+
+def test_rename_changes_only_tagged_images(make_image):
+    images = [make_image("a.png", tags="cat, dog"), make_image("b.png", tags="dog"),
+              make_image("c.png", tags="kitten, cat")]
+    job = TagEditJob(images, build_tag_edit("rename", ["cat"], ["kitten"]), SidecarBackend()).run()
+
+    assert [read_tag_file(image_path) for image_path in images] == ["kitten, dog", "dog", "kitten"]
+    assert job.changed == 2
+    assert job.unchanged == 1
+    assert job.previous[images[0]] == "cat, dog"
+    assert not job.errors
+
+
+def test_dry_run_writes_nothing(make_image):
+    image_path = make_image("a.png", tags="cat")
+    job = TagEditJob([image_path], build_tag_edit("remove", ["cat"]), SidecarBackend(), dry_run=True).run()
+
+    assert job.changes == [(image_path, "")]
+    assert read_tag_file(image_path) == "cat"
+
+
+def test_failed_batch_is_rolled_back(tmp_path, make_image):
+    images = [make_image(f"{name}.png", tags="cat") for name in "abcd"]
+    # A directory where d.txt should be makes the write of the second batch fail
+    os.remove(tmp_path / "d.txt")
+    os.mkdir(tmp_path / "d.txt")
+    job = TagEditJob(images, build_tag_edit("rename", ["cat"], ["kitten"]), SidecarBackend(),
+                     read_tags=lambda image_path: "cat", batch_size=2, max_workers=1).run()
+
+    assert [read_tag_file(image_path) for image_path in images[:3]] == ["kitten", "kitten", "cat"]
+    assert job.rolled_back == 1
+    assert job.changed == 2
+    assert sorted(image_path for image_path, _ in job.errors) == images[2:]
+    assert sorted(os.listdir(tmp_path)) == ["a.png", "a.txt", "b.png", "b.txt", "c.png", "c.txt",
+                                            "d.png", "d.txt"]
+
+
+def test_write_batch_restores_replaced_files(tmp_path, make_image, monkeypatch):
+    images = [make_image("a.png", tags="cat"), make_image("b.png")]
+    replace = os.replace
+    calls = []
+
+    def failing_replace(source, dest):
+        calls.append(dest)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        replace(source, dest)
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        SidecarBackend().write_batch([(images[0], "dog"), (images[1], "dog")])
+    monkeypatch.undo()
+
+    assert read_tag_file(images[0]) == "cat"
+    assert read_tag_file(images[1]) is None
+    assert sorted(os.listdir(tmp_path)) == ["a.png", "a.txt", "b.png"]
+
+
+def test_build_tag_edit_checks_arguments():
+    with pytest.raises(ValueError):
+        build_tag_edit("rename", ["a", "b"], ["c"])
+    with pytest.raises(ValueError):
+        build_tag_edit("replace", ["a"], [])
+    with pytest.raises(ValueError):
+        build_tag_edit("shuffle", ["a"])
+
+
+def test_write_batch_gives_images_sharing_a_tag_file_the_last_tags(tmp_path, make_image):
+    png = make_image("a.png", tags="old")
+    jpg = os.path.join(str(tmp_path), "a.jpg")
+    SidecarBackend().write_batch([(png, "one"), (jpg, "two")])
+
+    assert read_tag_file(png) == "two"
+    assert sorted(os.listdir(tmp_path)) == ["a.png", "a.txt"]
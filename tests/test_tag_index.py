@@ -0,0 +1,94 @@
+import pytest
+
+from src.tag_index import TagIndex, bits_to_positions, positions_to_bits, is_tag_query
+from src.tag_manager import TagManager
+
+
+@pytest.fixture
+def index():
+    index = TagIndex(None)
+    index.set_tags("a.png", "cat, dog")
+    index.set_tags("b.png", "dog")
+    index.set_tags("c.png", "cat, red hat")
+    index.set_tags("d.png", "")
+    return index
+
+
+def test_lookups(index):
+    assert index.get_tags("a.png") == ["cat", "dog"]
+    assert index.get_tags("unknown.png") == []
+    assert index.has_tag("c.png", "red hat")
+    assert not index.has_tag("b.png", "cat")
+    assert index.images_with("cat") == {"a.png", "c.png"}
+    assert index.images_without("cat", ["d.png", "c.png", "b.png"]) == ["d.png", "b.png"]
+    assert index.tag_counts() == {"cat": 2, "dog": 2, "red hat": 1}
+
+
+def test_lookups_follow_changes(index):
+    index.set_tags("a.png", ["dog"])
+    index.remove_image("c.png")
+    assert len(index) == 3
+    assert "c.png" not in index
+    assert index.images_with("cat") == set()
+    assert index.tag_count("dog") == 2
+
+
+def test_build_reads_every_image(make_image):
+    images = [make_image("a.png", tags="cat"), make_image("b.png")]
+    index = TagIndex(TagManager())
+    index.build(images)
+    assert index.images_with("cat") == {images[0]}
+    assert len(index) == 2
+
+
+def test_bitset_round_trip():
+    positions = [0, 3, 64, 65, 1000]
+    bits = positions_to_bits(positions, 1001)
+    assert bits == sum(1 << position for position in positions)
+    assert list(bits_to_positions(bits)) == positions
+    assert list(bits_to_positions(0)) == []
+
+
+def test_images_with_any(index):
+    assert index.images_with_any(["dog", "red hat"]) == {"a.png", "b.png", "c.png"}
+    assert index.images_with_any(["unknown"]) == set()
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("cat", {"a.png", "c.png"}),
+    ("cat AND dog", {"a.png"}),
+    ("cat OR dog", {"a.png", "b.png", "c.png"}),
+    ("NOT cat", {"b.png", "d.png"}),
+    ('cat AND NOT "red hat"', {"a.png"}),
+    ("(dog OR \"red hat\") AND NOT (cat AND dog)", {"b.png", "c.png"}),
+    ("unknown", set()),
+])
+def test_query(index, expression, expected):
+    assert set(index.query(expression)) == expected
+    assert index.query_count(expression) == len(expected)
+
+
+def test_query_follows_changes(index):
+    index.set_tags("b.png", "cat")
+    index.remove_image("a.png")
+    assert set(index.query("cat")) == {"b.png", "c.png"}
+    assert set(index.query("NOT cat")) == {"d.png"}
+
+    # The freed position is reused by the next new image
+    index.set_tags("e.png", "dog")
+    assert len(index) == 4
+    assert set(index.query("NOT cat")) == {"d.png", "e.png"}
+    assert index.query_count("dog") == 1
+
+
+def test_co_occurrence(index):
+    index.set_tags("e.png", "cat, dog, sketch")
+    assert index.co_occurrence("cat") == [("dog", 2), ("red hat", 1), ("sketch", 1)]
+    assert index.co_occurrence("cat", limit=1) == [("dog", 2)]
+    assert index.co_occurrence("unknown") == []
+
+
+def test_is_tag_query():
+    assert is_tag_query("cat AND dog")
+    assert is_tag_query("(cat)")
+    assert not is_tag_query("cat -dog")
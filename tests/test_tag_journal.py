@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+from src.tag_journal import JournaledBackend
+from src.tag_manager import SidecarBackend
+
+from conftest import read_tag_file
+
+
+def open_backend(tmp_path):
+    # Nothing is committed in the background unless a test asks for it
+    return JournaledBackend(SidecarBackend(), str(tmp_path / "tags.journal"),
+                            batch_size=10000, flush_interval=3600)
+
+
+def crash(backend):
+    """Stop a backend like a crash would: the journal is on disk, nothing else is done."""
+    with backend._lock:
+        backend._journal.flush()
+        backend._closed = True
+        backend._wakeup.notify()
+    backend._thread.join()
+    backend._journal.close()
+
+
+def test_replay_applies_uncommitted_changes(tmp_path, make_image):
+    image_path = make_image("a.png", tags="old")
+    backend = open_backend(tmp_path)
+    backend.write(image_path, "cat, dog")
+    assert backend.read(image_path) == "cat, dog"
+    assert read_tag_file(image_path) == "old"
+    crash(backend)
+
+    backend = open_backend(tmp_path)
+    try:
+        assert read_tag_file(image_path) == "cat, dog"
+        assert backend.read(image_path) == "cat, dog"
+    finally:
+        backend.close()
+
+
+def test_replay_keeps_last_change_and_deletes(tmp_path, make_image):
+    first = make_image("a.png", tags="old")
+    second = make_image("b.png", tags="old")
+    backend = open_backend(tmp_path)
+    backend.write(first, "one")
+    backend.write(first, "two")
+    backend.delete(second)
+    crash(backend)
+
+    open_backend(tmp_path).close()
+    assert read_tag_file(first) == "two"
+    assert read_tag_file(second) is None
+
+
+def test_forget_keeps_replay_from_recreating_tag_files(tmp_path, make_image):
+    image_path = make_image("a.png")
+    backend = open_backend(tmp_path)
+    backend.write(image_path, "cat")
+    backend.forget([image_path])
+    crash(backend)
+
+    open_backend(tmp_path).close()
+    assert read_tag_file(image_path) is None
+
+
+def test_clean_close_empties_the_journal(tmp_path, make_image):
+    image_path = make_image("a.png")
+    backend = open_backend(tmp_path)
+    backend.write(image_path, "cat")
+    backend.close()
+
+    assert read_tag_file(image_path) == "cat"
+    assert os.path.getsize(tmp_path / "tags.journal") == 0
+
+
+def test_write_batch_is_not_undone_by_replay(tmp_path, make_image):
+    image_path = make_image("a.png", tags="old")
+    backend = open_backend(tmp_path)
+    backend.write(image_path, "cat")
+    backend.write_batch([(image_path, "cat, dog")])
+    assert read_tag_file(image_path) == "cat, dog"
+    crash(backend)
+
+    open_backend(tmp_path).close()
+    assert read_tag_file(image_path) == "cat, dog"
+
+
+def test_failed_commit_is_retried(tmp_path, make_image, monkeypatch):
+    image_path = make_image("a.png", tags="old")
+    backend = open_backend(tmp_path)
+    backend.write(image_path, "cat")
+
+    def failing_fsync(fd):
+        raise OSError("disk error")
+
+    monkeypatch.setattr(os, "fsync", failing_fsync)
+    with pytest.raises(OSError):
+        backend.flush()
+    monkeypatch.undo()
+
+    # The change is still pending, newer changes win, and the next commit applies it
+    assert backend.read(image_path) == "cat"
+    assert backend._applying == {}
+    backend.flush()
+    assert read_tag_file(image_path) == "cat"
+    backend.close()
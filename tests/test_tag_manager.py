@@ -0,0 +1,38 @@
+import os
+import threading
+
+from src.tag_manager import SidecarBackend, TagManager
+
+from conftest import read_tag_file
+
+
+def test_tags_round_trip(make_image):
+    image_path = make_image("a.png")
+    tag_manager = TagManager()
+    assert tag_manager.load_tags(image_path) == ""
+    tag_manager.save_tags(image_path, "cat, dog")
+    assert read_tag_file(image_path) == "cat, dog"
+    assert tag_manager.load_tags(image_path) == "cat, dog"
+
+
+def test_concurrent_writes_to_a_shared_tag_file(tmp_path, make_image):
+    images = [make_image("a.png"), make_image("a.jpg")]
+    backend = SidecarBackend()
+    errors = []
+
+    def write(image_path):
+        try:
+            for number in range(200):
+                backend.write(image_path, f"{os.path.basename(image_path)} {number}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(image_path,)) for image_path in images]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert read_tag_file(images[0]) in ("a.png 199", "a.jpg 199")
+    assert sorted(os.listdir(tmp_path)) == ["a.jpg", "a.png", "a.txt"]
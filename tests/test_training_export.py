@@ -0,0 +1,68 @@
+import json
+import os
+
+from PIL import Image
+
+from src.tag_manager import SidecarBackend
+from src.training_export import TrainingExportJob, make_buckets, choose_bucket
+
+
+def export(images, dest, resolution=256):
+    return TrainingExportJob(images, str(dest), SidecarBackend().read, resolution=resolution,
+                             max_workers=1).run()
+
+
+def load_manifest(dest):
+    with open(dest / "buckets.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_buckets_keep_the_area():
+    buckets = make_buckets(1024)
+    assert (1024, 1024) in buckets
+    assert all(width * height <= 1024 * 1024 for width, height in buckets)
+    assert all(max(width, height) / min(width, height) <= 2.0 for width, height in buckets)
+    assert choose_bucket((2000, 1000), buckets)[0] > choose_bucket((2000, 1000), buckets)[1]
+
+
+def test_images_are_cropped_into_their_bucket(tmp_path, make_image):
+    image_path = make_image("wide.png", tags="cat")
+    Image.new("RGBA", (600, 300), (255, 0, 0, 0)).save(image_path)
+    dest = tmp_path / "dataset"
+    job = export([image_path], dest)
+
+    assert not job.errors
+    (bucket_name, keys), = job.buckets.items()
+    width, height = map(int, bucket_name.split("x"))
+    assert width > height
+    with Image.open(dest / bucket_name / "wide.jpg") as exported:
+        assert exported.size == (width, height)
+        assert exported.mode == "RGB"
+    with open(dest / bucket_name / "wide.txt", encoding="utf-8") as f:
+        assert f.read() == "cat"
+
+
+def test_next_batch_keeps_earlier_samples(tmp_path, make_image):
+    dest = tmp_path / "dataset"
+    export([make_image("a.png", tags="first", folder=tmp_path / "1")], dest)
+    job = export([make_image("a.png", tags="second", folder=tmp_path / "2")], dest)
+
+    assert not job.errors
+    manifest = load_manifest(dest)
+    assert manifest["samples"] == 2
+    assert manifest["buckets"]["256x256"]["keys"] == ["a", "a_1"]
+    with open(dest / "256x256" / "a.txt", encoding="utf-8") as f:
+        assert f.read() == "first"
+    with open(dest / "256x256" / "a_1.txt", encoding="utf-8") as f:
+        assert f.read() == "second"
+
+
+def test_other_resolution_is_refused(tmp_path, make_image):
+    images = [make_image("a.png")]
+    dest = tmp_path / "dataset"
+    export(images, dest)
+    job = export(images, dest, resolution=512)
+
+    assert job.errors
+    assert load_manifest(dest)["resolution"] == 256
+    assert sorted(os.listdir(dest / "256x256")) == ["a.jpg", "a.txt"]